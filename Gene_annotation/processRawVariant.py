@@ -11,7 +11,27 @@
 import os
 import csv
 import re
+import json
+import time
+import gzip
+import zlib
+import struct
+import shutil
 import argparse
+import numpy as np
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# gzip member header with the FEXTRA flag set, as written by bgzip
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+
+# Genotype matrix codes: alternate allele count, hom-ref (0) is not stored
+MISSING_GENOTYPE = -1
+# Variant records whose GT strings are encoded together
+GENOTYPE_BATCH_SIZE = 1000
+
+HEADER = ['CHROM', 'POS', 'REF', 'ALT', 'GENE', 'REGION', 'VARIANT_TYPE',
+          'SIFT_SCORE', 'SIFT_PREDICTION', 'SAMPLES_GENOTYPES']
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Extract deleterious variants from SIFT annotation files.')
@@ -20,6 +40,12 @@ def parse_args():
     parser.add_argument('--sift-threshold', type=float, default=0.05, help='SIFT score threshold (default: 0.05)')
     parser.add_argument('--include-borderline', action='store_true', help='Include borderline variants (within 0.01 of threshold)')
     parser.add_argument('--gene-list', help='CSV file containing list of genes to filter by (one gene per line)')
+    parser.add_argument('--workers', type=int, default=1, help='Chromosomes processed in parallel (default: 1)')
+    parser.add_argument('--parts-dir', help='Directory for per-chromosome partial CSVs, kept for resuming '
+                                            'an interrupted run (default: <output>.parts)')
+    parser.add_argument('--genotype-matrix', metavar='PREFIX',
+                        help='Also write a sparse variants x samples genotype matrix: PREFIX.npz (CSR, int8 '
+                             'alternate allele counts, -1 = missing), PREFIX.variants.tsv and PREFIX.samples.txt')
     return parser.parse_args()
 
 def is_deleterious(sift_score, sift_prediction, threshold, include_borderline):
@@ -40,11 +66,120 @@ def is_deleterious(sift_score, sift_prediction, threshold, include_borderline):
     
     return False
 
+def is_gzipped(path):
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+def is_bgzf(path):
+    """bgzip files are gzip members whose extra field starts with a 'BC' block-size subfield."""
+    with open(path, 'rb') as f:
+        header = f.read(18)
+    return len(header) == 18 and header[:4] == BGZF_MAGIC and header[12:14] == b'BC'
+
+def open_text(path):
+    """Open a plain, gzip or bgzip text file for streaming reads."""
+    if is_gzipped(path):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+def read_bgzf_block(f):
+    """Read and inflate the BGZF block at the current file position; returns None at end of file."""
+    header = f.read(12)
+    if len(header) < 12:
+        return None
+    if header[:4] != BGZF_MAGIC:
+        raise ValueError(f"{f.name} is not a valid bgzip file")
+    xlen = struct.unpack('<H', header[10:12])[0]
+    extra = f.read(xlen)
+    
+    block_size = None
+    pos = 0
+    while pos + 4 <= xlen:
+        sub_len = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+        if extra[pos:pos + 2] == b'BC':
+            block_size = struct.unpack('<H', extra[pos + 4:pos + 6])[0] + 1
+        pos += 4 + sub_len
+    if block_size is None:
+        raise ValueError(f"{f.name} has a gzip block without BGZF block size")
+    
+    compressed = f.read(block_size - 12 - xlen - 8)
+    f.read(8)  # CRC32 and ISIZE
+    return zlib.decompress(compressed, -15)
+
+def iter_bgzf_lines(path):
+    """
+    Lines of a bgzip file with their virtual offsets
+    (block offset << 16 | offset of the line start within the inflated block).
+    """
+    with open(path, 'rb') as f:
+        pending, pending_offset = b'', None
+        while True:
+            block_offset = f.tell()
+            data = read_bgzf_block(f)
+            if data is None:
+                break
+            pos = 0
+            while True:
+                newline = data.find(b'\n', pos)
+                if newline < 0:
+                    break
+                line_offset = pending_offset if pending else (block_offset << 16) | pos
+                yield line_offset, pending + data[pos:newline + 1]
+                pending = b''
+                pos = newline + 1
+            # A line continuing into the next block keeps the offset of its start
+            if pos < len(data):
+                if not pending:
+                    pending_offset = (block_offset << 16) | pos
+                pending += data[pos:]
+        if pending:
+            yield pending_offset, pending
+
+def read_bgzf_line(f, virtual_offset):
+    """Read one line of a bgzip file starting at a virtual offset, inflating only the blocks it spans."""
+    f.seek(virtual_offset >> 16)
+    data = read_bgzf_block(f)[virtual_offset & 0xFFFF:]
+    line = b''
+    while data is not None:
+        newline = data.find(b'\n')
+        if newline >= 0:
+            return line + data[:newline + 1]
+        line += data
+        data = read_bgzf_block(f)
+    return line
+
+def iter_vcf_lines(vcf_file):
+    """
+    (offset, raw line) pairs of a VCF. Offsets are byte offsets for plain text and
+    virtual offsets for bgzip; plain gzip cannot seek, so its offsets are None.
+    """
+    if is_bgzf(vcf_file):
+        yield from iter_bgzf_lines(vcf_file)
+    elif is_gzipped(vcf_file):
+        with gzip.open(vcf_file, 'rb') as f:
+            for raw_line in f:
+                yield None, raw_line
+    else:
+        with open(vcf_file, 'rb') as f:
+            offset = 0
+            for raw_line in f:
+                yield offset, raw_line
+                offset += len(raw_line)
+
+def find_input(chrom_path, suffix):
+    """First file in a chromosome folder with the given suffix, plain or gzipped."""
+    names = os.listdir(chrom_path)
+    for candidate in (suffix, suffix + '.gz'):
+        matches = [f for f in names if f.endswith(candidate)]
+        if matches:
+            return os.path.join(chrom_path, matches[0])
+    return None
+
 def parse_xls_file(xls_file, threshold, include_borderline):
     """Parse XLS file and extract deleterious variants."""
     deleterious_variants = []
     
-    with open(xls_file, 'r') as f:
+    with open_text(xls_file) as f:
         # Skip header
         header = next(f).strip().split('\t')
         
@@ -93,63 +228,173 @@ def parse_xls_file(xls_file, threshold, include_borderline):
     
     return deleterious_variants
 
-def get_sample_genotypes(vcf_file, variant):
-    """Extract genotype information for a specific variant from VCF file."""
-    chrom = variant['chrom']
-    pos = variant['pos']
-    ref = variant['ref']
-    alt = variant['alt']
-    
+def extract_genotypes(fields, sample_names):
+    """Non-reference, non-missing genotypes of one VCF record."""
     genotypes = {}
+    format_field = fields[8].split(':')
+    gt_idx = format_field.index('GT') if 'GT' in format_field else -1
+    
+    if gt_idx >= 0:
+        for i, sample in enumerate(sample_names):
+            if i + 9 < len(fields):  # +9 to account for fixed VCF fields
+                sample_data = fields[i + 9].split(':')
+                if gt_idx < len(sample_data):
+                    genotype = sample_data[gt_idx]
+                    if genotype not in ['./.', '0/0']:  # Only include non-reference and non-missing
+                        genotypes[sample] = genotype
+    
+    return genotypes
+
+def build_vcf_index(vcf_file, wanted=None):
+    """
+    Index a VCF in one pass: sample names and (chrom, pos, ref, alt) -> offset of the
+    record (only for keys in wanted, if given). The first record of a duplicated key
+    wins, as in a top-down scan. Plain gzip is not seekable, so its records are kept.
+    """
+    sample_names = None
+    offsets = {}
     
-    with open(vcf_file, 'r') as f:
-        # Skip header lines
-        header_line = ""
-        sample_names = []
+    for offset, raw_line in iter_vcf_lines(vcf_file):
+        line = raw_line.decode()
         
-        for line in f:
-            if line.startswith('##'):
-                continue
-            elif line.startswith('#CHROM'):
-                header_line = line.strip()
-                sample_names = header_line.split('\t')[9:]  # Samples start at column 10
-                break
+        if sample_names is None:
+            if line.startswith('#CHROM'):
+                sample_names = line.strip().split('\t')[9:]  # Samples start at column 10
+            continue
         
-        if not header_line:
-            return genotypes
+        fields = line.strip().split('\t', 9)
+        # Need at least FORMAT field + 1 sample
+        if len(fields) < 10:
+            continue
         
-        # Search for the variant
-        for line in f:
-            fields = line.strip().split('\t')
-            
-            # Skip lines with insufficient fields
-            if len(fields) < 10:  # Need at least FORMAT field + 1 sample
-                continue
-            
-            vcf_chrom = fields[0]
-            vcf_pos = fields[1]
-            vcf_ref = fields[3]
-            vcf_alt = fields[4]
-            
-            # Match the variant
-            if (vcf_chrom == chrom and vcf_pos == pos and 
-                vcf_ref == ref and vcf_alt == alt):
-                
-                format_field = fields[8].split(':')
-                gt_idx = format_field.index('GT') if 'GT' in format_field else -1
-                
-                if gt_idx >= 0:
-                    for i, sample in enumerate(sample_names):
-                        if i + 9 < len(fields):  # +9 to account for fixed VCF fields
-                            sample_data = fields[i + 9].split(':')
-                            if gt_idx < len(sample_data):
-                                genotype = sample_data[gt_idx]
-                                if genotype not in ['./.', '0/0']:  # Only include non-reference and non-missing
-                                    genotypes[sample] = genotype
-                
-                break  # Found the variant, no need to continue
+        key = (fields[0], fields[1], fields[3], fields[4])
+        if key not in offsets and (wanted is None or key in wanted):
+            offsets[key] = raw_line if offset is None else offset
     
-    return genotypes
+    return {'samples': sample_names or [], 'offsets': offsets, 'bgzf': is_bgzf(vcf_file)}
+
+def read_vcf_record(vcf_file, variant, vcf_index, vcf_handle=None):
+    """Fields of the indexed VCF record of a variant, or None if it is not in the VCF."""
+    key = (variant['chrom'], variant['pos'], variant['ref'], variant['alt'])
+    offset = vcf_index['offsets'].get(key)
+    if offset is None:
+        return None
+    
+    if isinstance(offset, bytes):
+        line = offset
+    else:
+        f = vcf_handle or open(vcf_file, 'rb')
+        if vcf_index['bgzf']:
+            line = read_bgzf_line(f, offset)
+        else:
+            f.seek(offset)
+            line = f.readline()
+        if vcf_handle is None:
+            f.close()
+    
+    return line.decode().strip().split('\t')
+
+def get_sample_genotypes(vcf_file, variant, vcf_index=None, vcf_handle=None):
+    """
+    Extract genotype information for a specific variant from VCF file.
+    With an index from build_vcf_index the record is read by seeking to its offset.
+    """
+    if vcf_index is None:
+        vcf_index = build_vcf_index(vcf_file)
+    
+    fields = read_vcf_record(vcf_file, variant, vcf_index, vcf_handle)
+    if fields is None:
+        return {}
+    return extract_genotypes(fields, vcf_index['samples'])
+
+def gt_subfields(fields, n_samples):
+    """GT strings of the sample columns of a VCF record, without splitting the other subfields."""
+    format_field = fields[8].split(':')
+    if 'GT' not in format_field:
+        return []
+    gt_idx = format_field.index('GT')
+    columns = fields[9:9 + n_samples]
+    if gt_idx == 0:
+        # GT is the first subfield in practice, so only the text before the first ':' is needed
+        return [column.partition(':')[0] for column in columns]
+    gts = []
+    for column in columns:
+        sample_data = column.split(':')
+        gts.append(sample_data[gt_idx] if gt_idx < len(sample_data) else '.')
+    return gts
+
+def genotype_code(gt):
+    """Alternate allele count of a GT string, or MISSING_GENOTYPE if all alleles are missing."""
+    alleles = re.split(r'[/|]', gt)
+    if all(allele in ('.', '') for allele in alleles):
+        return MISSING_GENOTYPE
+    return sum(allele not in ('0', '.', '') for allele in alleles)
+
+def encode_genotype_batch(batch, row_offset):
+    """
+    Encode a batch of GT string lists (one per variant) into COO triplets of the
+    entries that are not hom-ref. Each distinct GT string is decoded only once.
+    """
+    lengths = np.array([len(gts) for gts in batch])
+    flat = [gt for gts in batch for gt in gts]
+    if not flat:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+    uniques, inverse = np.unique(np.array(flat), return_inverse=True)
+    codes = np.array([genotype_code(gt) for gt in uniques], dtype=np.int8)[inverse]
+    rows = np.repeat(np.arange(len(batch)) + row_offset, lengths)
+    cols = np.concatenate([np.arange(n) for n in lengths])
+    keep = codes != 0
+    return rows[keep], cols[keep], codes[keep]
+
+def save_genotype_part(part_file, triplets, n_variants, samples, found):
+    """Save one chromosome's genotype matrix with its sample names and found-in-VCF flags."""
+    if triplets:
+        rows, cols, codes = (np.concatenate(parts) for parts in zip(*triplets))
+    else:
+        rows = cols = np.zeros(0, dtype=np.int64)
+        codes = np.zeros(0, dtype=np.int8)
+    matrix = sparse.csr_matrix((codes, (rows, cols)), shape=(n_variants, len(samples)), dtype=np.int8)
+    with open(part_file, 'wb') as f:
+        np.savez(f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                 shape=np.array(matrix.shape), samples=np.array(samples, dtype=str),
+                 found=np.array(found, dtype=bool))
+
+def merge_genotype_parts(part_files, variant_files, prefix):
+    """Stack per-chromosome matrices over the union of their samples and write the final outputs."""
+    samples, matrices, found = {}, [], []
+    for part_file in part_files:
+        with np.load(part_file) as part:
+            matrix = sparse.csr_matrix((part['data'], part['indices'], part['indptr']),
+                                       shape=tuple(part['shape']))
+            for sample in part['samples']:
+                samples.setdefault(str(sample), len(samples))
+            column_map = np.array([samples[str(sample)] for sample in part['samples']], dtype=np.int64)
+            matrices.append((matrix, column_map))
+            found.append(part['found'])
+    
+    stacked = []
+    for matrix, column_map in matrices:
+        coo = matrix.tocoo()
+        stacked.append(sparse.csr_matrix((coo.data, (coo.row, column_map[coo.col])),
+                                         shape=(matrix.shape[0], len(samples)), dtype=np.int8))
+    genotypes = sparse.vstack(stacked, format='csr') if stacked else \
+        sparse.csr_matrix((0, len(samples)), dtype=np.int8)
+    sparse.save_npz(f"{prefix}.npz", genotypes)
+    
+    with open(f"{prefix}.samples.txt", 'w') as f:
+        f.writelines(sample + '\n' for sample in samples)
+    found = np.concatenate(found) if found else np.zeros(0, dtype=bool)
+    with open(f"{prefix}.variants.tsv", 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['CHROM', 'POS', 'REF', 'ALT', 'GENE', 'IN_VCF'])
+        i = 0
+        for variant_file in variant_files:
+            with open(variant_file, 'r', newline='') as part:
+                for row in csv.reader(part):
+                    writer.writerow(row[:5] + [int(found[i])])
+                    i += 1
+    print(f"Genotype matrix of {genotypes.shape[0]} variants x {genotypes.shape[1]} samples "
+          f"({genotypes.nnz} non hom-ref entries) written to {prefix}.npz")
 
 def load_gene_list(gene_list_file):
     """Load gene list from a CSV file."""
@@ -163,93 +408,204 @@ def load_gene_list(gene_list_file):
         print(f"Loaded {len(genes)} genes from {gene_list_file}")
     return genes
 
+def chrom_sort_key(chrom_dir):
+    """Natural chromosome order: chr1, chr2, ..., chr10, ..., chrX, chrY."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', chrom_dir)]
+
+def list_chrom_dirs(root_dir):
+    """Chromosome subfolders of the root directory, in natural order."""
+    return sorted((d for d in os.listdir(root_dir)
+                   if d.startswith('chr') and os.path.isdir(os.path.join(root_dir, d))),
+                  key=chrom_sort_key)
+
+def process_chromosome(chrom_path, part_file, threshold, include_borderline, gene_set,
+                       genotype_part_file=None):
+    """
+    Write the deleterious variants of one chromosome directory to a partial CSV (no header),
+    and optionally their genotype matrix. Returns the log messages, so parallel workers do
+    not interleave their output.
+    """
+    chrom_dir = os.path.basename(chrom_path)
+    start = time.time()
+    messages = [f"Processing {chrom_dir}..."]
+    
+    # Find XLS annotation file (plain or gzip/bgzip compressed)
+    xls_file = find_input(chrom_path, '_SIFTannotations.xls')
+    
+    if not xls_file:
+        messages.append(f"  No SIFT annotation file found in {chrom_dir}")
+        return messages
+    
+    # Find VCF prediction file (plain or gzip/bgzip compressed)
+    vcf_file = find_input(chrom_path, '_SIFTpredictions.vcf')
+    
+    if not vcf_file:
+        messages.append(f"  No SIFT prediction VCF file found in {chrom_dir}")
+        return messages
+    
+    # Parse the XLS file to find deleterious variants
+    deleterious_variants = parse_xls_file(xls_file, threshold, include_borderline)
+    
+    messages.append(f"  Found {len(deleterious_variants)} deleterious variants")
+    
+    # Skip variants if gene list is provided and gene is not in the list
+    if gene_set:
+        deleterious_variants = [v for v in deleterious_variants if v['gene'] in gene_set]
+    
+    # Index the VCF once per chromosome instead of rescanning it per variant
+    wanted = {(v['chrom'], v['pos'], v['ref'], v['alt']) for v in deleterious_variants}
+    vcf_index = build_vcf_index(vcf_file, wanted)
+    
+    n_samples = len(vcf_index['samples'])
+    gt_batch, triplets, found = [], [], []
+    
+    # Written under a temporary name so only finished chromosomes count as done on resume
+    tmp_file = part_file + '.tmp'
+    with open(tmp_file, 'w', newline='') as outfile, open(vcf_file, 'rb') as vcf_handle:
+        csv_writer = csv.writer(outfile)
+        
+        # Process each deleterious variant
+        for i, variant in enumerate(deleterious_variants):
+            # Get genotype information from VCF
+            fields = read_vcf_record(vcf_file, variant, vcf_index, vcf_handle)
+            genotypes = extract_genotypes(fields, vcf_index['samples']) if fields else {}
+            
+            if genotype_part_file:
+                found.append(fields is not None)
+                gt_batch.append(gt_subfields(fields, n_samples) if fields else [])
+                if len(gt_batch) == GENOTYPE_BATCH_SIZE:
+                    triplets.append(encode_genotype_batch(gt_batch, i + 1 - len(gt_batch)))
+                    gt_batch = []
+            
+            # Format all samples with genotypes as "sample:genotype;sample:genotype;..."
+            if genotypes:
+                genotype_str = ";".join([f"{sample}:{genotype}" for sample, genotype in genotypes.items()])
+            else:
+                genotype_str = "NA"
+            
+            # Write a single row for this variant with all samples
+            row = [
+                variant['chrom'],
+                variant['pos'],
+                variant['ref'],
+                variant['alt'],
+                variant['gene'],
+                variant['region'],
+                variant['variant_type'],
+                variant['sift_score'],
+                variant['sift_prediction'],
+                genotype_str
+            ]
+            csv_writer.writerow(row)
+    
+    if genotype_part_file:
+        if gt_batch:
+            triplets.append(encode_genotype_batch(gt_batch, len(deleterious_variants) - len(gt_batch)))
+        save_genotype_part(genotype_part_file, triplets, len(deleterious_variants),
+                           vcf_index['samples'], found)
+    
+    os.replace(tmp_file, part_file)
+    messages.append(f"  {chrom_dir} done in {time.time() - start:.1f} s")
+    return messages
+
+def part_file_paths(parts_dir, chrom_dirs):
+    """Every file this tool may write to the parts directory."""
+    paths = [os.path.join(parts_dir, 'settings.json')]
+    for chrom_dir in chrom_dirs:
+        base = os.path.join(parts_dir, chrom_dir)
+        paths += [f"{base}.csv", f"{base}.csv.tmp", f"{base}.genotypes.npz"]
+    return paths
+
+def remove_part_files(parts_dir, chrom_dirs):
+    """Delete only this tool's part files, and the directory if nothing else is left in it."""
+    for path in part_file_paths(parts_dir, chrom_dirs):
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.isdir(parts_dir) and not os.listdir(parts_dir):
+        os.rmdir(parts_dir)
+
+def prepare_parts_dir(parts_dir, settings, chrom_dirs):
+    """
+    Keep finished partial CSVs only if they were made with the same settings;
+    otherwise start over so a resumed run never mixes filters.
+    """
+    settings_file = os.path.join(parts_dir, 'settings.json')
+    if os.path.isdir(parts_dir):
+        if not os.path.exists(settings_file):
+            if os.listdir(parts_dir):
+                raise SystemExit(f"Error: {parts_dir} is not empty and has no settings.json; "
+                                 f"choose another --parts-dir")
+        else:
+            with open(settings_file, 'r') as f:
+                previous = json.load(f)
+            if previous != settings:
+                print(f"Settings changed since the last run, discarding partial results in {parts_dir}")
+                remove_part_files(parts_dir, chrom_dirs)
+    os.makedirs(parts_dir, exist_ok=True)
+    with open(settings_file, 'w') as f:
+        json.dump(settings, f, indent=2)
+
 def main():
     args = parse_args()
+    run_start = time.time()
     
     # Load gene list if provided
     gene_set = set()
     if args.gene_list:
         gene_set = load_gene_list(args.gene_list)
     
-    # Open output CSV file
+    chrom_dirs = list_chrom_dirs(args.root_dir)
+    parts_dir = args.parts_dir or args.output + '.parts'
+    prepare_parts_dir(parts_dir, {
+        'root_dir': os.path.abspath(args.root_dir),
+        'sift_threshold': args.sift_threshold,
+        'include_borderline': args.include_borderline,
+        'genes': sorted(gene_set),
+        'genotype_matrix': bool(args.genotype_matrix),
+    }, chrom_dirs)
+    
+    part_files = {d: os.path.join(parts_dir, f"{d}.csv") for d in chrom_dirs}
+    genotype_part_files = {d: os.path.join(parts_dir, f"{d}.genotypes.npz") if args.genotype_matrix else None
+                           for d in chrom_dirs}
+    
+    # Skip chromosomes finished by an earlier, interrupted run
+    pending = []
+    for chrom_dir in chrom_dirs:
+        if os.path.exists(part_files[chrom_dir]):
+            print(f"Skipping {chrom_dir} - already processed")
+        else:
+            pending.append(chrom_dir)
+    
+    task_args = [(os.path.join(args.root_dir, d), part_files[d], args.sift_threshold,
+                  args.include_borderline, gene_set, genotype_part_files[d]) for d in pending]
+    if args.workers > 1 and len(pending) > 1:
+        print(f"Processing {len(pending)} chromosomes with {args.workers} workers")
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(process_chromosome, *task) for task in task_args]
+            for future in as_completed(futures):
+                print('\n'.join(future.result()))
+    else:
+        for task in task_args:
+            print('\n'.join(process_chromosome(*task)))
+    
+    # Merge partial CSVs in natural chromosome order, so the output does not depend on scheduling
     with open(args.output, 'w', newline='') as outfile:
-        csv_writer = csv.writer(outfile)
-        
-        # Write header
-        header = ['CHROM', 'POS', 'REF', 'ALT', 'GENE', 'REGION', 'VARIANT_TYPE', 
-                 'SIFT_SCORE', 'SIFT_PREDICTION', 'SAMPLES_GENOTYPES']
-        csv_writer.writerow(header)
-        
-        # Process each chromosome directory
-        for chrom_dir in sorted(os.listdir(args.root_dir)):
-            chrom_path = os.path.join(args.root_dir, chrom_dir)
-            
-            # Skip if not a directory or not a chromosome directory
-            if not os.path.isdir(chrom_path) or not chrom_dir.startswith('chr'):
-                continue
-            
-            print(f"Processing {chrom_dir}...")
-            
-            # Find XLS annotation file
-            xls_files = [f for f in os.listdir(chrom_path) 
-                        if f.endswith('_SIFTannotations.xls')]
-            
-            if not xls_files:
-                print(f"  No SIFT annotation file found in {chrom_dir}")
-                continue
-            
-            xls_file = os.path.join(chrom_path, xls_files[0])
-            
-            # Find VCF prediction file
-            vcf_files = [f for f in os.listdir(chrom_path) 
-                        if f.endswith('_SIFTpredictions.vcf')]
-            
-            if not vcf_files:
-                print(f"  No SIFT prediction VCF file found in {chrom_dir}")
-                continue
-            
-            vcf_file = os.path.join(chrom_path, vcf_files[0])
-            
-            # Parse the XLS file to find deleterious variants
-            deleterious_variants = parse_xls_file(
-                xls_file, args.sift_threshold, args.include_borderline)
-            
-            print(f"  Found {len(deleterious_variants)} deleterious variants")
-            
-            # Process each deleterious variant
-            for variant in deleterious_variants:
-                # Skip variants if gene list is provided and gene is not in the list
-                if gene_set and variant['gene'] not in gene_set:
-                    continue
-                    
-                # Get genotype information from VCF
-                genotypes = get_sample_genotypes(vcf_file, variant)
-                
-                # Format all samples with genotypes as "sample:genotype;sample:genotype;..."
-                if genotypes:
-                    genotype_str = ";".join([f"{sample}:{genotype}" for sample, genotype in genotypes.items()])
-                else:
-                    genotype_str = "NA"
-                
-                # Write a single row for this variant with all samples
-                row = [
-                    variant['chrom'],
-                    variant['pos'],
-                    variant['ref'],
-                    variant['alt'],
-                    variant['gene'],
-                    variant['region'],
-                    variant['variant_type'],
-                    variant['sift_score'],
-                    variant['sift_prediction'],
-                    genotype_str
-                ]
-                csv_writer.writerow(row)
-    
-    print(f"Results written to {args.output}")
+        csv.writer(outfile).writerow(HEADER)
+        for chrom_dir in chrom_dirs:
+            if os.path.exists(part_files[chrom_dir]):
+                with open(part_files[chrom_dir], 'r', newline='') as part:
+                    shutil.copyfileobj(part, outfile)
+    
+    if args.genotype_matrix:
+        done = [d for d in chrom_dirs if os.path.exists(part_files[d])]
+        merge_genotype_parts([genotype_part_files[d] for d in done], [part_files[d] for d in done],
+                             args.genotype_matrix)
+    remove_part_files(parts_dir, chrom_dirs)
+    
+    print(f"Results written to {args.output} ({time.time() - run_start:.1f} s)")
     
     if args.gene_list:
         print(f"Results filtered to only include variants in genes from {args.gene_list}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
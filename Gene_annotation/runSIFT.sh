@@ -80,4 +80,11 @@ done
 # Running SIFT4G annotation on all chromosomes
 for chr in {1..22} X Y; do
     java -jar SIFT4G_Annotator.jar -c -i 2025-01-21/VCFs/chr${chr}/chr${chr}_filtered.vcf -d 2025-01-21/tmp/GRCh38.83.chr -r 2025-01-21/RESULTS/chr${chr} -t
-done
\ No newline at end of file
+done
+# Compressing SIFT4G outputs with bgzip; processRawVariant.py reads the .gz
+# files directly (block-level random access), so the plain copies can go
+for chr in {1..22} X Y; do
+    bgzip -f 2025-01-21/RESULTS/chr${chr}/*_SIFTpredictions.vcf
+    bgzip -f 2025-01-21/RESULTS/chr${chr}/*_SIFTannotations.xls
+    rm -f 2025-01-21/VCFs/chr${chr}/chr${chr}_filtered.vcf
+done
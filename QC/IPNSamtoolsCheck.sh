@@ -11,19 +11,37 @@
 
 ##############################################################################
 
-if [ "$#" -ne 2 ]; then
-    echo "Usage: $0 <input_file_list> <output_directory>"
+if [ "$#" -lt 2 ] || [ "$#" -gt 3 ]; then
+    echo "Usage: $0 <input_file_list> <output_directory> [roi_bed_or_eh_catalog]"
+    echo "With an ROI BED / EH catalog (.json), coverage is computed around the STR loci only"
+    echo "instead of a whole-genome samtools depth per sample (needs pysam)."
+    echo "CRAM input needs the reference FASTA in REF."
     exit 1
 fi
 
 input_list="$1"
 out_dir="$2"
+roi_file="$3" # optional
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+REF="${REF:-}"
 
 if [ ! -f "$input_list" ]; then
     echo "Error: Input file list '$input_list' does not exist"
     exit 1
 fi
 
+if grep -q '\.cram$' "$input_list" && [ -z "$REF" ]; then
+    echo "Error: CRAM input needs the reference FASTA, set REF=<reference.fa>"
+    exit 1
+fi
+ref_args=()
+[ -n "$REF" ] && ref_args=(--reference "$REF")
+
+if [ -n "$roi_file" ] && ! ${PYTHON} -c "import pysam" 2>/dev/null; then
+    echo "Error: Targeted STR locus coverage needs pysam in ${PYTHON}"
+    exit 1
+fi
+
 mkdir -p "$out_dir" "${out_dir}/stats" "${out_dir}/depths" 
 
 # Process each BAM file
@@ -42,21 +60,23 @@ while IFS= read -r input_bam; do
     stats_output="${out_dir}/stats/${sample_name}_samtools.stats.txt"
     depth_output="${out_dir}/depths/${sample_name}_samtools.depth.txt"
     
-    if [ -s "$stats_output" ] && [ -s "$depth_output" ]; then
+    if [ -s "$stats_output" ] && { [ -n "$roi_file" ] || [ -s "$depth_output" ]; }; then
         echo ">>>Both output files already exist and are non-empty for $sample_name."
         continue
     fi
     
     if [ ! -s "$stats_output" ]; then
         echo "Running samtools stats..."
-        samtools stats -@ 4 '${input_bam}' > '${stats_output}'
+        samtools stats -@ 4 "${ref_args[@]}" "${input_bam}" > "${stats_output}"
     else
         echo ">>>stats output already exists and is non-empty."
     fi
     
-    if [ ! -s "$depth_output" ]; then
+    if [ -n "$roi_file" ]; then
+        : # targeted coverage of all samples is computed below
+    elif [ ! -s "$depth_output" ]; then
         echo "Running samtools depth..."
-        bash tmp_Samtools.sh "${input_bam}" "${depth_output}"
+        bash tmp_Samtools.sh "${input_bam}" "${depth_output}" ${REF:+"$REF"}
     else
         echo ">>>depth output already exists and is non-empty."
     fi
@@ -66,4 +86,20 @@ while IFS= read -r input_bam; do
 
 done < "$input_list"
 
+if [ -n "$roi_file" ]; then
+    echo "Running targeted STR locus coverage..."
+    if [[ "$roi_file" == *.json ]]; then
+        roi_args=(--eh-catalog "$roi_file")
+    else
+        roi_args=(--roi-bed "$roi_file")
+    fi
+    # Also writes the per-sample depth files read by qc_aggregate_metrics.py
+    ${PYTHON} "$(dirname "$0")/str_locus_coverage.py" \
+        --bam-list "$input_list" \
+        "${roi_args[@]}" \
+        "${ref_args[@]}" \
+        --output-prefix "${out_dir}/str_coverage/STR_coverage" \
+        --depth-dir "${out_dir}/depths"
+fi
+
 echo "All processing complete!"
\ No newline at end of file
@@ -9,13 +9,20 @@
 ##############################################################################
 
 import os
+import sys
 import glob
+import argparse
 import pandas as pd
 import numpy as np
 import ast
+from concurrent.futures import ThreadPoolExecutor
+
+POPULATIONS = ['afr', 'amr', 'asj', 'eas', 'eur', 'sas']
+OUTPUT_NAME = 'ancestry_combined_gnomAD_continental.csv'
+ERROR_REPORT_NAME = 'ancestry_gnomAD_continental_errors.csv'
 
 def predict_ancestry(gnomad_continental_probs):
-    populations = ['afr', 'amr', 'asj', 'eas', 'eur', 'sas']
+    populations = POPULATIONS
     
     # Convert string representation of list to actual list
     if isinstance(gnomad_continental_probs, str):
@@ -81,23 +88,95 @@ def process_samples(parent_dir):
     # Create DataFrame and save to CSV in the parent directory
     if results:
         df = pd.DataFrame(results)
-        output_file = os.path.join(parent_dir, 'ancestry_combined_gnomAD_continental.csv')
+        output_file = os.path.join(parent_dir, OUTPUT_NAME)
         df.to_csv(output_file, index=False)
         print(f"\nResults saved to {output_file}")
         print(f"Processed {len(results)} samples successfully")
     else:
         print("No results found to save")
 
+def parse_probs(text):
+    """Parse a '[p1, p2, ...]' probability list without evaluating Python syntax."""
+    probs = np.array(text.strip().strip('[]').split(','), dtype=float)
+    if len(probs) != len(POPULATIONS):
+        raise ValueError(f"expected {len(POPULATIONS)} probabilities, found {len(probs)}")
+    return probs
+
+def read_sample_probs(sample_dir):
+    """Find one sample's CSV and read only the first gnomAD_continental cell. Returns (probs, error)."""
+    output_dir = os.path.join(sample_dir, 'output')
+    if not os.path.isdir(output_dir):
+        return None, 'no output directory'
+    
+    # First visible *.csv in directory order, as glob would return it
+    with os.scandir(output_dir) as entries:
+        csv_file = next((e.path for e in entries
+                         if e.name.endswith('.csv') and not e.name.startswith('.')), None)
+    if csv_file is None:
+        return None, 'no CSV file'
+    
+    try:
+        df = pd.read_csv(csv_file, usecols=['gnomAD_continental'], nrows=1, dtype=str)
+        if df.empty:
+            return None, f'no rows in {csv_file}'
+        return parse_probs(df['gnomAD_continental'].iloc[0]), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+def process_samples_batch(parent_dir, threads=8):
+    """
+    Read all samples' probabilities with a thread pool, then predict ancestry for the
+    whole cohort at once. Samples that could not be read go to an error report.
+    """
+    with os.scandir(parent_dir) as entries:
+        sample_dirs = [(e.name, e.path) for e in entries if e.is_dir()]
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        parsed = list(executor.map(lambda sample: read_sample_probs(sample[1]), sample_dirs))
+    
+    samples, probs, errors = [], [], []
+    for (base, _), (sample_probs, error) in zip(sample_dirs, parsed):
+        if error:
+            errors.append({'SampleID': base, 'Error': error})
+        else:
+            samples.append(base)
+            probs.append(sample_probs)
+    
+    if errors:
+        error_file = os.path.join(parent_dir, ERROR_REPORT_NAME)
+        pd.DataFrame(errors).to_csv(error_file, index=False)
+        print(f"Warning: {len(errors)} samples could not be processed, see {error_file}")
+    
+    if not samples:
+        print("No results found to save")
+        return
+    
+    probs = np.vstack(probs)
+    best = probs.argmax(axis=1)
+    df = pd.DataFrame({
+        'SampleID': samples,
+        'Ancestry': np.array(POPULATIONS)[best],
+        'Confidence': probs[np.arange(len(samples)), best]
+    })
+    output_file = os.path.join(parent_dir, OUTPUT_NAME)
+    df.to_csv(output_file, index=False)
+    print(f"\nResults saved to {output_file}")
+    print(f"Processed {len(samples)} samples successfully")
+    print(df['Ancestry'].value_counts().to_string())
+
 if __name__ == "__main__":
-    import sys
+    parser = argparse.ArgumentParser(description="Predict sample ancestry from gnomAD continental probabilities")
+    parser.add_argument('parent_dir', help='Directory with one SNVstory result folder per sample')
+    parser.add_argument('--batch', action='store_true',
+                        help='Read samples in parallel and predict all at once, with an error report')
+    parser.add_argument('--threads', type=int, default=8, help='Threads for --batch (default: 8)')
+    args = parser.parse_args()
     
-    if len(sys.argv) != 2:
-        print("Usage: python predict_ancestry.py /path/to/parent_dir")
-        sys.exit(1)
-        
-    parent_dir = sys.argv[1]
-    if not os.path.isdir(parent_dir):
-        print(f"Error: Directory {parent_dir} does not exist")
+    if not os.path.isdir(args.parent_dir):
+        print(f"Error: Directory {args.parent_dir} does not exist")
         sys.exit(1)
-        
-    process_samples(parent_dir)
\ No newline at end of file
+    
+    if args.batch:
+        process_samples_batch(args.parent_dir, args.threads)
+    else:
+        process_samples(args.parent_dir)
@@ -0,0 +1,197 @@
+
+##############################################################################
+
+# Combine samtools stats/depth QC metrics of all samples into one table.
+# Python version of ExtractInfo4Table.sh: each stats and depth file is read
+# once, samples are processed by a worker pool, and samples with missing or
+# malformed metrics are flagged.
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python qc_aggregate_metrics.py <working_directory> [--workers 8] [--parquet]
+
+working_directory should contain 'stats' and 'depths' subdirectories, as
+written by IPNSamtoolsCheck.sh.
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+STATS_SUFFIX = '_samtools.stats.txt'
+DEPTH_SUFFIX = '_samtools.depth.txt'
+
+# Same header as ExtractInfo4Table.sh (including its empty column)
+CSV_HEADER = ("Sample,Read Length,Number of reads (G),Mean_Coverage (X),Reads mapped and paired (%),"
+              "Reads duplicated (%),Bases mapped (%),Bases duplicated (%),Insert size,,Mean error rate (%)")
+
+# samtools stats SN fields used for the table
+SN_FIELDS = {
+    'read_length': 'average length',
+    'total_reads': 'raw total sequences',
+    'mapped_paired': 'reads mapped and paired',
+    'duplicated_reads': 'reads duplicated',
+    'total_length': 'total length',
+    'bases_mapped': 'bases mapped (cigar)',
+    'bases_duplicated': 'bases duplicated',
+    'error_rate': 'error rate',
+    'insert_size': 'insert size average',
+    'insert_std': 'insert size standard deviation',
+}
+
+def parse_stats(stats_file):
+    """Summary numbers (SN lines) of a samtools stats file, read in one pass: {field: text}."""
+    values = {}
+    with open(stats_file, 'r') as f:
+        for line in f:
+            if line.startswith('SN\t'):
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) >= 3:
+                    values[fields[1].rstrip(':')] = fields[2]
+    return values
+
+def parse_depth(depth_file):
+    """Mean coverage text of a tmp_Samtools.sh depth file, or None if it has none."""
+    with open(depth_file, 'r') as f:
+        for line in f:
+            if 'Average coverage' in line:
+                return line.split('=', 1)[1].replace(' ', '').strip()
+    return None
+
+def percent(numerator, denominator):
+    return f"{numerator / denominator * 100:.2f}"
+
+def sample_metrics(work_dir, sample):
+    """
+    QC metrics of one sample. Returns (row as CSV text fields, typed record, problems);
+    derived values that cannot be computed are written as NA.
+    """
+    problems = []
+    try:
+        sn = parse_stats(os.path.join(work_dir, 'stats', sample + STATS_SUFFIX))
+    except OSError as e:
+        sn = {}
+        problems.append(f"unreadable stats file ({e.strerror})")
+
+    text = {}
+    numbers = {}
+    for key, field in SN_FIELDS.items():
+        text[key] = sn.get(field)
+        if text[key] is None:
+            problems.append(f"missing '{field}'")
+            continue
+        try:
+            numbers[key] = float(text[key])
+        except ValueError:
+            problems.append(f"malformed '{field}': {text[key]}")
+
+    mean_coverage = None
+    depth_file = os.path.join(work_dir, 'depths', sample + DEPTH_SUFFIX)
+    if os.path.exists(depth_file):
+        mean_coverage = parse_depth(depth_file)
+        if mean_coverage is None:
+            problems.append('no average coverage in depth file')
+    else:
+        problems.append('missing depth file')
+
+    def derived(fn, *keys):
+        if all(key in numbers for key in keys) and all(numbers[key] for key in keys[1:]):
+            return fn(*(numbers[key] for key in keys))
+        return 'NA'
+
+    row = [
+        sample,
+        text['read_length'] or 'NA',
+        derived(lambda n: f"{n / 1e9:.2f}", 'total_reads'),
+        mean_coverage or 'NA',
+        derived(percent, 'mapped_paired', 'total_reads'),
+        derived(percent, 'duplicated_reads', 'total_reads'),
+        derived(percent, 'bases_mapped', 'total_length'),
+        derived(percent, 'bases_duplicated', 'total_length'),
+        f'"{text["insert_size"] or ""} ± {text["insert_std"] or ""}"',
+        derived(lambda e: f"{e * 100:.2f}", 'error_rate'),
+    ]
+
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    record = {
+        'sample': sample,
+        'read_length': number(row[1]),
+        'reads_g': number(row[2]),
+        'mean_coverage': number(row[3]),
+        'pct_reads_mapped_paired': number(row[4]),
+        'pct_reads_duplicated': number(row[5]),
+        'pct_bases_mapped': number(row[6]),
+        'pct_bases_duplicated': number(row[7]),
+        'insert_size_mean': numbers.get('insert_size'),
+        'insert_size_sd': numbers.get('insert_std'),
+        'pct_error_rate': number(row[9]),
+    }
+    return row, record, problems
+
+def list_samples(work_dir):
+    """Sample names of all stats files, sorted."""
+    stats_dir = os.path.join(work_dir, 'stats')
+    return sorted(name[:-len(STATS_SUFFIX)] for name in os.listdir(stats_dir) if name.endswith(STATS_SUFFIX))
+
+def aggregate(work_dir, workers=4, parquet=False):
+    samples = list_samples(work_dir)
+    print(f"Processing {len(samples)} samples with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(sample_metrics, [work_dir] * len(samples), samples,
+                                    chunksize=max(1, len(samples) // (workers * 4))))
+
+    output_csv = os.path.join(work_dir, 'QCmetricsCombined.csv')
+    with open(output_csv, 'w') as f:
+        f.write(CSV_HEADER + '\n')
+        for row, _, _ in results:
+            f.write(','.join(row) + '\n')
+    print(f"Processing complete! Results written to: {output_csv}")
+
+    flagged = [(row[0], problems) for row, _, problems in results if problems]
+    flagged_csv = os.path.join(work_dir, 'QCmetrics_flagged.csv')
+    if flagged:
+        with open(flagged_csv, 'w') as f:
+            f.write('Sample,Problems\n')
+            for sample, problems in flagged:
+                f.write(f'{sample},"{"; ".join(problems)}"\n')
+        print(f"Warning: {len(flagged)} samples have missing or malformed metrics, see {flagged_csv}")
+    elif os.path.exists(flagged_csv):
+        os.remove(flagged_csv)
+
+    if parquet:
+        import pandas as pd
+        output_parquet = os.path.join(work_dir, 'QCmetricsCombined.parquet')
+        table = pd.DataFrame([record for _, record, _ in results])
+        table['flagged'] = [bool(problems) for _, _, problems in results]
+        table.to_parquet(output_parquet, index=False)
+        print(f"Typed table written to: {output_parquet}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Combine samtools stats/depth QC metrics into one table')
+    parser.add_argument('work_dir', help="Directory with 'stats' and 'depths' subdirectories")
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (default: 4)')
+    parser.add_argument('--parquet', action='store_true',
+                        help='Also write QCmetricsCombined.parquet with typed columns (needs pandas + pyarrow)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.work_dir, 'stats')) or \
+            not os.path.isdir(os.path.join(args.work_dir, 'depths')):
+        print("Error: 'stats' and 'depths' subdirectories must exist in the working directory")
+        sys.exit(1)
+
+    aggregate(args.work_dir, args.workers, args.parquet)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+
+##############################################################################
+
+# Targeted coverage QC around STR loci. Instead of a whole-genome
+# `samtools depth`, only the reads of the ROI BED / EH catalog loci (plus
+# flanks) are fetched through the BAM index; nearby loci share one fetch and
+# depth is accumulated with NumPy. Writes samples x loci matrices of mean
+# locus depth and mean flank depth, and optionally per-sample depth files
+# for qc_aggregate_metrics.py. Requires pysam.
+# Called by IPNSamtoolsCheck.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python str_locus_coverage.py \
+  --bam-list bams.txt \
+  (--roi-bed roi.bed | --eh-catalog eh_catalog.json) \
+  --output-prefix out_dir/STR_coverage \
+  [--flank 1000] [--min-mapq 0] [--reference ref.fa] [--workers 4] [--depth-dir out_dir/depths]
+
+Writes <prefix>_locus_depth.tsv and <prefix>_flank_depth.tsv (one row per sample).
+With --depth-dir, also <sample>_samtools.depth.txt in the format of tmp_Samtools.sh,
+with the mean flank depth of all loci as the average coverage.
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+# Same flank length as ExpansionHunter's default
+DEFAULT_FLANK = 1000
+DEPTH_SUFFIX = '_samtools.depth.txt'
+DEPTH_SOURCE = 'Source = flanks of '
+
+def sample_name(bam_path):
+    """Sample name as in IPNSamtoolsCheck.sh."""
+    name = os.path.basename(bam_path)
+    for ext in ('.bam', '.cram'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name
+
+def parse_region(region):
+    """Split 'chr1:100-200' into ('chr1', 100, 200)."""
+    chrom, _, span = region.rpartition(':')
+    start, _, end = span.partition('-')
+    return chrom, int(start), int(end)
+
+def read_loci(roi_bed=None, eh_catalog=None):
+    """
+    Loci as (name, chrom, start, end) with 0-based half-open coordinates. BED loci are
+    named gene_motif (columns 4-5), catalog loci by LocusId; repeated names get their region appended.
+    """
+    loci = []
+    if roi_bed:
+        with open(roi_bed, 'r') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 3 or line.startswith(('#', 'track')):
+                    continue
+                chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+                name = f"{fields[3]}_{fields[4]}" if len(fields) >= 5 else f"{chrom}:{start}-{end}"
+                loci.append((name, chrom, start, end))
+    else:
+        with open(eh_catalog, 'r') as f:
+            for entry in json.load(f):
+                regions = entry['ReferenceRegion']
+                regions = [regions] if isinstance(regions, str) else regions
+                spans = [parse_region(region) for region in regions]
+                loci.append((entry['LocusId'], spans[0][0],
+                             min(s for _, s, _ in spans), max(e for _, _, e in spans)))
+
+    counts = {}
+    for name, _, _, _ in loci:
+        counts[name] = counts.get(name, 0) + 1
+    return [(name if counts[name] == 1 else f"{name}_{chrom}:{start}-{end}", chrom, start, end)
+            for name, chrom, start, end in loci]
+
+def merge_windows(loci, flank):
+    """
+    Group loci with their flanks into non-overlapping windows, so the reads of
+    nearby loci are fetched once. Returns [(chrom, start, end, [locus indices])].
+    """
+    order = sorted(range(len(loci)), key=lambda i: (loci[i][1], loci[i][2]))
+    windows = []
+    for i in order:
+        _, chrom, start, end = loci[i]
+        w_start, w_end = max(0, start - flank), end + flank
+        if windows and windows[-1][0] == chrom and w_start <= windows[-1][2]:
+            windows[-1][2] = max(windows[-1][2], w_end)
+            windows[-1][3].append(i)
+        else:
+            windows.append([chrom, w_start, w_end, [i]])
+    return windows
+
+def window_depth(bam, chrom, start, end, min_mapq=0):
+    """
+    Per-base depth over [start, end) from the aligned blocks of the reads in the window.
+    Reads are filtered like `samtools depth` (unmapped, secondary, QC-fail and duplicate
+    reads are skipped; deletions are not counted).
+    """
+    block_starts, block_ends = [], []
+    for read in bam.fetch(chrom, start, end):
+        if (read.is_unmapped or read.is_secondary or read.is_qcfail or read.is_duplicate
+                or read.mapping_quality < min_mapq):
+            continue
+        for block_start, block_end in read.get_blocks():
+            block_starts.append(block_start)
+            block_ends.append(block_end)
+
+    length = end - start
+    starts = np.clip(np.asarray(block_starts, dtype=np.int64), start, end) - start
+    ends = np.clip(np.asarray(block_ends, dtype=np.int64), start, end) - start
+    diff = np.bincount(starts, minlength=length + 1) - np.bincount(ends, minlength=length + 1)
+    return np.cumsum(diff[:length])
+
+def resolve_chrom(bam, chrom):
+    """Contig name of the BAM matching chrom, with or without the 'chr' prefix."""
+    if chrom in bam.references:
+        return chrom
+    alternative = chrom[3:] if chrom.startswith('chr') else 'chr' + chrom
+    return alternative if alternative in bam.references else None
+
+def bam_locus_coverage(bam_path, loci, windows, flank, min_mapq=0, reference=None):
+    """Mean locus depth and mean flank depth of every locus for one BAM/CRAM."""
+    locus_depth = np.full(len(loci), np.nan)
+    flank_depth = np.full(len(loci), np.nan)
+    with pysam.AlignmentFile(bam_path, reference_filename=reference) as bam:
+        for chrom, w_start, w_end, members in windows:
+            contig = resolve_chrom(bam, chrom)
+            if contig is None:
+                continue
+            w_end = min(w_end, bam.get_reference_length(contig))
+            depth = window_depth(bam, contig, w_start, w_end, min_mapq)
+            for i in members:
+                _, _, start, end = loci[i]
+                lo, hi = start - w_start, min(end, w_end) - w_start
+                if hi > lo:
+                    locus_depth[i] = depth[lo:hi].mean()
+                flanks = np.concatenate([depth[max(lo - flank, 0):lo], depth[hi:hi + flank]])
+                if len(flanks):
+                    flank_depth[i] = flanks.mean()
+    return locus_depth, flank_depth
+
+def write_matrix(path, samples, names, values):
+    """Samples x loci matrix as TSV, NA where a locus could not be measured."""
+    with open(path, 'w') as f:
+        f.write('sample\t' + '\t'.join(names) + '\n')
+        for sample, row in zip(samples, values):
+            f.write(sample + '\t' + '\t'.join('NA' if np.isnan(v) else f"{v:.2f}" for v in row) + '\n')
+
+def is_flank_depth_file(depth_file):
+    """True if depth_file was written by write_depth_files (it carries the Source line)."""
+    with open(depth_file, 'r') as f:
+        return any(line.startswith(DEPTH_SOURCE) for line in f)
+
+def write_depth_files(depth_dir, samples, flank_depths):
+    """
+    Per-sample depth files read by qc_aggregate_metrics.py. The flanks stand in for the
+    genome-wide mean of tmp_Samtools.sh; a sample without any measured flank gets no
+    average, so the aggregator flags it. Whole-genome depth files of tmp_Samtools.sh
+    already in depth_dir are kept.
+    """
+    os.makedirs(depth_dir, exist_ok=True)
+    for sample, row in zip(samples, flank_depths):
+        measured = row[~np.isnan(row)]
+        depth_file = os.path.join(depth_dir, sample + DEPTH_SUFFIX)
+        if os.path.exists(depth_file) and not is_flank_depth_file(depth_file):
+            print(f"Keeping whole-genome depth file {depth_file}")
+            continue
+        with open(depth_file, 'w') as f:
+            if len(measured):
+                f.write(f"Average coverage = {measured.mean():.6g}\n")
+            f.write(f"{DEPTH_SOURCE}{len(measured)}/{len(row)} STR loci\n")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-locus and flank coverage of STR loci for a list of BAMs')
+    parser.add_argument('--bam-list', required=True, help='Text file with one BAM/CRAM path per line')
+    loci_source = parser.add_mutually_exclusive_group(required=True)
+    loci_source.add_argument('--roi-bed', help='ROI BED (chr, start, end, gene, motif)')
+    loci_source.add_argument('--eh-catalog', help='ExpansionHunter variant catalog JSON')
+    parser.add_argument('--output-prefix', required=True,
+                        help='Writes <prefix>_locus_depth.tsv and <prefix>_flank_depth.tsv')
+    parser.add_argument('--flank', type=int, default=DEFAULT_FLANK,
+                        help=f'Flank length on each side of a locus (default: {DEFAULT_FLANK})')
+    parser.add_argument('--min-mapq', type=int, default=0, help='Minimum mapping quality (default: 0)')
+    parser.add_argument('--reference', help='Reference FASTA (needed for CRAM)')
+    parser.add_argument('--workers', type=int, default=4, help='BAMs processed in parallel (default: 4)')
+    parser.add_argument('--depth-dir',
+                        help='Also write <sample>_samtools.depth.txt files (mean flank depth) to this directory')
+    args = parser.parse_args()
+
+    if pysam is None:
+        sys.exit("Error: str_locus_coverage.py requires pysam (pip install pysam)")
+
+    with open(args.bam_list, 'r') as f:
+        bams = [line.strip() for line in f if line.strip()]
+    missing = [bam for bam in bams if not os.path.exists(bam)]
+    for bam in missing:
+        print(f"Warning: BAM file '{bam}' does not exist, skipping...")
+    bams = [bam for bam in bams if bam not in missing]
+    if not args.reference and any(bam.endswith('.cram') for bam in bams):
+        parser.error("CRAM input needs --reference")
+
+    loci = read_loci(args.roi_bed, args.eh_catalog)
+    windows = merge_windows(loci, args.flank)
+    print(f"{len(loci)} loci in {len(windows)} fetch windows, {len(bams)} BAMs")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(bam_locus_coverage, bam, loci, windows, args.flank,
+                                   args.min_mapq, args.reference) for bam in bams]
+        results = []
+        for bam, future in zip(bams, futures):
+            results.append(future.result())
+            print(f"Completed processing for {sample_name(bam)}")
+
+    samples = [sample_name(bam) for bam in bams]
+    names = [name for name, _, _, _ in loci]
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_prefix)), exist_ok=True)
+    write_matrix(f"{args.output_prefix}_locus_depth.tsv", samples, names, [r[0] for r in results])
+    write_matrix(f"{args.output_prefix}_flank_depth.tsv", samples, names, [r[1] for r in results])
+    print(f"Coverage matrices written to {args.output_prefix}_locus_depth.tsv and _flank_depth.tsv")
+    if args.depth_dir:
+        write_depth_files(args.depth_dir, samples, [r[1] for r in results])
+        print(f"Depth files written to {args.depth_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -12,14 +12,16 @@
 set -e  # Exit immediately if a command fails
 
 # Check if a BAM file is provided as input
-if [ $# -ne 2 ]; then
-    echo "Usage: $0 <bam_file> <output>"
+if [ $# -lt 2 ] || [ $# -gt 3 ]; then
+    echo "Usage: $0 <bam_file> <output> [reference_fasta (for CRAM)]"
     exit 1
 fi
 
 # Get the BAM file path
 bam_file="$1"
 output_file="$2"
+ref_args=()
+[ -n "$3" ] && ref_args=(--reference "$3")
 
 if [ ! -f "$bam_file" ]; then
     echo "Error: BAM file '$bam_file' not found"
@@ -27,4 +29,4 @@ if [ ! -f "$bam_file" ]; then
 fi
 
 # Calculate average coverage and write to output file
-samtools depth "$bam_file" | awk '{sum+=$3} END {print "Average coverage = " sum/NR}' > "$output_file"
+samtools depth "${ref_args[@]}" "$bam_file" | awk '{sum+=$3} END {print "Average coverage = " sum/NR}' > "$output_file"
@@ -3,43 +3,61 @@
 ##############################################################################
 
 # Master script to run the entire pipeline.
+# Run from STR_detection_pipeline/; PROJECT_DIR holds input/ and output/.
+# Tool paths can be overridden with PYTHON, REF, EHDN_BIN, EH_BIN, SAMTOOLS
+# and BLAT; STEP_WRAPPER is prepended to every step (e.g. for profiling).
 
 ## author: Zitian Tang
 ## contact: tang.zitian@wustl.edu
 
 ##############################################################################
 
+if [ -z "$1" ]; then
+    echo "Usage: $0 <subname> [project_dir]"
+    exit 1
+fi
+
 SUBNAME="$1"
-PROJECT_DIR="."
+PROJECT_DIR="${2:-..}"
 
-cd $PROJECT_DIR || exit 1
+cd "$(dirname "$0")" || exit 1
 
-## 1_EHdn_GenerateStrProfile
-bash STR_detection_pipeline/1_EHdn_GenerateStrProfile.sh input/cases.txt cases output
-bash STR_detection_pipeline/1_EHdn_GenerateStrProfile.sh input/controls.txt controls output
+CASES="${PROJECT_DIR}/input/cases.txt"
+CONTROLS="${PROJECT_DIR}/input/controls.txt"
+ROI_BED="${PROJECT_DIR}/input/roi.bed"
 
+run_step() {
+    ${STEP_WRAPPER} bash "$@" || echo "Warning: $1 exited with an error"
+}
+
+## 1_EHdn_GenerateStrProfile
+run_step 1_EHdn_GenerateStrProfile.sh ${CASES} cases ${PROJECT_DIR}/output
+run_step 1_EHdn_GenerateStrProfile.sh ${CONTROLS} controls ${PROJECT_DIR}/output
 
 ## 2_EHdn_GenerateManifestFile
-bash STR_detection_pipeline/2_EHdn_GenerateManifestFile.sh $PROJECT_DIR $SUBNAME \
-    input/cases.txt \
-    output/EHdn/$SUBNAME/EHdn_cases_str-profiles \
-    input/controls.txt \
-    output/EHdn/$SUBNAME/EHdn_controls_str-profiles
+run_step 2_EHdn_GenerateManifestFile.sh ${PROJECT_DIR} ${SUBNAME} \
+    ${CASES} \
+    ${PROJECT_DIR}/output/EHdn/EHdn_cases_str-profiles \
+    ${CONTROLS} \
+    ${PROJECT_DIR}/output/EHdn/EHdn_controls_str-profiles
 
 ## 3_EHdn_RunAnnotEHdn
-bash STR_detection_pipeline/3_EHdn_RunAnnotEHdn.sh $PROJECT_DIR $SUBNAME
+run_step 3_EHdn_RunAnnotEHdn.sh ${PROJECT_DIR} ${SUBNAME}
 
 ## 4_EH_RunEH
-bash STR_detection_pipeline/4_EH_RunEH.sh $PROJECT_DIR $SUBNAME
+run_step 4_EH_RunEH.sh ${PROJECT_DIR} ${SUBNAME} ${CASES} ${CONTROLS}
+
+## 5_CombineEHResult
+run_step 5_CombineEHResult.sh ${PROJECT_DIR} ${SUBNAME}
 
-## 4.5_CombineEHResult.sh
-bash STR_detection_pipeline/4.5_CombineEHResult.sh $PROJECT_DIR $SUBNAME
+## 6_CombineEHdnEH
+run_step 6_CombineEHdnEH.sh ${PROJECT_DIR} ${SUBNAME} ${CASES} ${CONTROLS} ${ROI_BED}
 
-## 5_RunBLAT
-bash STR_detection_pipeline/5_RunBLAT.sh $PROJECT_DIR $SUBNAME input/cases.txt input/controls.txt input/roi.bed
+## 7_RunBLAT
+run_step 7_RunBLAT.sh ${PROJECT_DIR} ${SUBNAME}
 
-## 6_BuildDatabase
-bash STR_detection_pipeline/6_BuildDatabase.sh $PROJECT_DIR $SUBNAME input/roi.bed
+## 8_BuildDatabase
+run_step 8_BuildDatabase.sh ${PROJECT_DIR} ${SUBNAME} ${ROI_BED}
 
-## 7_QueryDatabase
-bash STR_detection_pipeline/7_QueryDatabase.sh $PROJECT_DIR $SUBNAME input/roi.bed
\ No newline at end of file
+## 9_QueryDatabase
+run_step 9_QueryDatabase.sh ${PROJECT_DIR} ${SUBNAME} ${ROI_BED}
@@ -0,0 +1,52 @@
+#!/bin/bash
+
+##############################################################################
+
+# Step 10: STR genotyping via unsupervised clustering of the query results
+# (Python alternative to 10_UnsupervisedIPNFinalStep.R without the Excel sheet).
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+if [ "$#" -lt 2 ]; then
+    echo "Usage: $0 <project_name> <subname> [excluded_samples.txt]"
+    exit 1
+fi
+
+PROJECT_NAME=$1
+SUBNAME=$2
+EXCLUDED_SAMPLES=$3 # optional, e.g. controls with a diagnosis
+
+OUTPUT_DIR="${PROJECT_NAME}/output"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+QUERY_OUTPUT_DIR="${OUTPUT_DIR}/QueryResults/${SUBNAME}"
+CLUSTER_OUTPUT_DIR="${OUTPUT_DIR}/Clusters/${SUBNAME}"
+
+mkdir -p "${CLUSTER_OUTPUT_DIR}"
+
+exclude_args=()
+if [ -n "${EXCLUDED_SAMPLES}" ]; then
+    exclude_args=(--exclude-samples "${EXCLUDED_SAMPLES}")
+fi
+
+# Set CLUSTER_MINI_BATCH=1 to use mini-batch k-means for large cohorts
+mini_batch_args=()
+if [ "${CLUSTER_MINI_BATCH:-0}" = "1" ]; then
+    mini_batch_args=(--mini-batch)
+fi
+
+echo "Clustering STR query results..."
+${PYTHON} python_scripts/wdl_cluster_genotypes.py \
+    --results-dir "${QUERY_OUTPUT_DIR}" \
+    --output-dir "${CLUSTER_OUTPUT_DIR}" \
+    "${exclude_args[@]}" \
+    "${mini_batch_args[@]}"
+
+if [ $? -ne 0 ]; then
+    echo "Error: Genotype clustering failed"
+    exit 1
+fi
+
+echo "Clustering complete! Results in ${CLUSTER_OUTPUT_DIR}"
@@ -20,34 +20,25 @@ BAM_PATHS="$1"
 MODE="$2"
 OUTPUT_DIR="$3"
 
-REF="Homo_sapiens_assembly38.fasta"
+REF="${REF:-Homo_sapiens_assembly38.fasta}"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+EHDN_BIN="${EHDN_BIN:-/ExpansionHunterDenovo/build/ExpansionHunterDenovo}"
 
 PROFILE_DIR="${OUTPUT_DIR}/EHdn/EHdn_${MODE}_str-profiles"
 mkdir -p "${PROFILE_DIR}"
 
-while IFS= read -r bam_path; do
-    sample_name=$(basename "${bam_path}" .bam | sed 's/\.cram$//')
-
-    if [ -f "${PROFILE_DIR}/${sample_name}.str_profile.json" ]; then
-        echo "Skipping ${sample_name} ------------------------>>"
-        continue
-    fi
-    
-    echo "Processing sample: ${sample_name}"
-    echo "BAM path: ${bam_path}"
-
-    /ExpansionHunterDenovo/build/ExpansionHunterDenovo profile \
-        --reads "${bam_path}" \
-        --reference "${REF}" \
-        --output-prefix "${PROFILE_DIR}/${sample_name}" \
-        --min-anchor-mapq 50 \
-        --max-irr-mapq 40
-    
-    if [ $? -eq 0 ]; then
-        echo "Successfully processed ${sample_name}"
-    fi
-    
-    echo "----------------------------------------"
-done < "${BAM_PATHS}"
+# Profile samples in parallel within the CPU/memory budget; failed or truncated profiles are retried
+${PYTHON} python_scripts/wdl_run_jobs.py \
+    --bam-list "${BAM_PATHS}" \
+    --output-dir "${PROFILE_DIR}" \
+    --command "${EHDN_BIN} profile --reads {bam} --reference ${REF} --output-prefix {out_prefix} --min-anchor-mapq 50 --max-irr-mapq 40" \
+    --expected-outputs "{out_prefix}.str_profile.json" \
+    --max-cpus "${MAX_CPUS:-$(nproc)}" \
+    --max-mem-gb "${MAX_MEM_GB:-16}" \
+    --mem-gb-per-job "${EHDN_MEM_GB_PER_JOB:-2}"
+
+if [ $? -ne 0 ]; then
+    echo "Warning: some samples failed, see ${PROFILE_DIR}/run_summary.json"
+fi
 
 echo "All samples processed. Output directory: ${PROFILE_DIR}"
\ No newline at end of file
@@ -21,26 +21,43 @@ PROJECT_NAME="$1"
 SUBNAME="$2"
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
-REF="Homo_sapiens_assembly38.fasta"
+REF="${REF:-Homo_sapiens_assembly38.fasta}"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+EHDN_DIR="${EHDN_DIR:-/ExpansionHunterDenovo}"
+EHDN_BIN="${EHDN_BIN:-${EHDN_DIR}/build/ExpansionHunterDenovo}"
 
-ANNOVAR_VARIATION="annovar_20191024/annotate_variation.pl"
-ANNOVAR_HUMANDB="annovar_20191024/humandb"
+ANNOVAR_DIR="${ANNOVAR_DIR:-annovar_20191024}"
+ANNOVAR_VARIATION="${ANNOVAR_DIR}/annotate_variation.pl"
+ANNOVAR_HUMANDB="${ANNOVAR_HUMANDB:-${ANNOVAR_DIR}/humandb}"
 
 EHDN_OUTPUT_PREFIX="${OUTPUT_DIR}/EHdn/${SUBNAME}"
 MANIFEST_FILE="${EHDN_OUTPUT_PREFIX}/EHdn_manifest.tsv"
 EHDN_MULTI_PROFILE="${EHDN_OUTPUT_PREFIX}/${SUBNAME}.multisample_profile.json"
+EHDN_PROFILE_STORE="${EHDN_OUTPUT_PREFIX}/EHdn_profile_store.sqlite"
 EHDN_OTL_LOCUS="${OUTPUT_DIR}/EHdn/${SUBNAME}/outliers_locus.tsv"
 EHDN_CACO_LOCUS="${OUTPUT_DIR}/EHdn/${SUBNAME}/casecontrol_locus.tsv"
 EHDN_OTL_LOCUS_ANNOT="${OUTPUT_DIR}/EHdn/${SUBNAME}/outliers_locus_hg38_annotated.tsv"
 EHDN_CACO_LOCUS_ANNOT="${OUTPUT_DIR}/EHdn/${SUBNAME}/casecontrol_locus_hg38_annotated.tsv"
-
-
-# Run EHdn merge step
-echo "Running ExpansionHunterDenovo merge..."
-/ExpansionHunterDenovo/build/ExpansionHunterDenovo merge \
-    --reference "${REF}" \
-    --manifest "${MANIFEST_FILE}" \
-    --output-prefix "${EHDN_OUTPUT_PREFIX}/${SUBNAME}"
+# Outlier loci joined with their case-control statistics (native scoring only)
+EHDN_MERGED_LOCUS="${OUTPUT_DIR}/EHdn/${SUBNAME}/merged_locus.tsv"
+EHDN_MERGED_LOCUS_ANNOT="${OUTPUT_DIR}/EHdn/${SUBNAME}/merged_locus_hg38_annotated.tsv"
+
+
+# Run EHdn merge step; EHDN_MERGE=incremental merges profiles through a
+# persistent store instead, so only samples new to the store are read
+if [ "${EHDN_MERGE:-ehdn}" = "incremental" ]; then
+    echo "Running incremental EHdn profile merge..."
+    ${PYTHON} python_scripts/wdl_ehdn_incremental_merge.py \
+        --manifest "${MANIFEST_FILE}" \
+        --store "${EHDN_PROFILE_STORE}" \
+        --output-prefix "${EHDN_OUTPUT_PREFIX}/${SUBNAME}"
+else
+    echo "Running ExpansionHunterDenovo merge..."
+    ${EHDN_BIN} merge \
+        --reference "${REF}" \
+        --manifest "${MANIFEST_FILE}" \
+        --output-prefix "${EHDN_OUTPUT_PREFIX}/${SUBNAME}"
+fi
 
 # Check if merge was successful
 if [ ! -f "${EHDN_MULTI_PROFILE}" ]; then
@@ -48,71 +65,109 @@ if [ ! -f "${EHDN_MULTI_PROFILE}" ]; then
     exit 1
 fi
 
-# Run outlier analysis
-echo "Running outlier analysis..."
-/usr/bin/python3 /ExpansionHunterDenovo/scripts/outlier.py locus \
-    --manifest "${MANIFEST_FILE}" \
-    --multisample-profile "${EHDN_MULTI_PROFILE}" \
-    --output "${EHDN_OTL_LOCUS}"
-
-if [ $? -ne 0 ]; then
-    echo "Error: Outlier analysis failed"
-    exit 1
+# Score loci; EHDN_SCORING=native computes both tables in one pass over the
+# multisample profile instead of running outlier.py and casecontrol.py, and
+# also writes them joined, so the filtering step needs no join of its own
+rm -f "${EHDN_MERGED_LOCUS}" "${EHDN_MERGED_LOCUS_ANNOT}"
+if [ "${EHDN_SCORING:-ehdn}" = "native" ]; then
+    echo "Running native outlier and case-control scoring..."
+    ${PYTHON} python_scripts/wdl_ehdn_score_loci.py \
+        --manifest "${MANIFEST_FILE}" \
+        --multisample-profile "${EHDN_MULTI_PROFILE}" \
+        --outlier-output "${EHDN_OTL_LOCUS}" \
+        --casecontrol-output "${EHDN_CACO_LOCUS}" \
+        --merged-output "${EHDN_MERGED_LOCUS}"
+
+    if [ $? -ne 0 ]; then
+        echo "Error: Native locus scoring failed"
+        exit 1
+    fi
+else
+    # Run outlier analysis
+    echo "Running outlier analysis..."
+    /usr/bin/python3 ${EHDN_DIR}/scripts/outlier.py locus \
+        --manifest "${MANIFEST_FILE}" \
+        --multisample-profile "${EHDN_MULTI_PROFILE}" \
+        --output "${EHDN_OTL_LOCUS}"
+
+    if [ $? -ne 0 ]; then
+        echo "Error: Outlier analysis failed"
+        exit 1
+    fi
+
+    # Run case-control analysis
+    echo "Running case-control analysis..."
+    /usr/bin/python3 ${EHDN_DIR}/scripts/casecontrol.py locus \
+        --manifest "${MANIFEST_FILE}" \
+        --multisample-profile "${EHDN_MULTI_PROFILE}" \
+        --output "${EHDN_CACO_LOCUS}"
+
+    if [ $? -ne 0 ]; then
+        echo "Error: Case control analysis failed"
+        exit 1
+    fi
 fi
 
-# Run case-control analysis
-echo "Running case-control analysis..."
-/usr/bin/python3 /ExpansionHunterDenovo/scripts/casecontrol.py locus \
-    --manifest "${MANIFEST_FILE}" \
-    --multisample-profile "${EHDN_MULTI_PROFILE}" \
-    --output "${EHDN_CACO_LOCUS}"
 
-if [ $? -ne 0 ]; then
-    echo "Error: Case control analysis failed"
-    exit 1
+# Run gene annotation; EHDN_ANNOTATION=native annotates all tables in one
+# process from an indexed refGene model instead of one ANNOVAR run per table
+ANNOT_INPUTS=("${EHDN_OTL_LOCUS}" "${EHDN_CACO_LOCUS}")
+ANNOT_OUTPUTS=("${EHDN_OTL_LOCUS_ANNOT}" "${EHDN_CACO_LOCUS_ANNOT}")
+if [ -f "${EHDN_MERGED_LOCUS}" ]; then
+    ANNOT_INPUTS+=("${EHDN_MERGED_LOCUS}")
+    ANNOT_OUTPUTS+=("${EHDN_MERGED_LOCUS_ANNOT}")
 fi
 
-
-# Run gene annotation
-echo "Running OTL gene annotation..."
-bash /ExpansionHunterDenovo/scripts/annotate_ehdn.sh \
-    --ehdn-results "${EHDN_OTL_LOCUS}" \
-    --ehdn-annotated-results "${EHDN_OTL_LOCUS_ANNOT}" \
-    --annovar-annotate-variation "${ANNOVAR_VARIATION}" \
-    --annovar-humandb "${ANNOVAR_HUMANDB}" \
-    --annovar-buildver hg38
-
-echo "Running CACO gene annotation..."
-bash /ExpansionHunterDenovo/scripts/annotate_ehdn.sh \
-    --ehdn-results "${EHDN_CACO_LOCUS}" \
-    --ehdn-annotated-results "${EHDN_CACO_LOCUS_ANNOT}" \
-    --annovar-annotate-variation "${ANNOVAR_VARIATION}" \
-    --annovar-humandb "${ANNOVAR_HUMANDB}" \
-    --annovar-buildver hg38
-
-if [ $? -ne 0 ]; then
-    echo "Error: Gene annotation failed"
-    exit 1
+annotate_with_annovar() {
+    bash ${EHDN_DIR}/scripts/annotate_ehdn.sh \
+        --ehdn-results "$1" \
+        --ehdn-annotated-results "$2" \
+        --annovar-annotate-variation "${ANNOVAR_VARIATION}" \
+        --annovar-humandb "${ANNOVAR_HUMANDB}" \
+        --annovar-buildver hg38
+}
+
+if [ "${EHDN_ANNOTATION:-annovar}" = "native" ]; then
+    echo "Running native gene annotation..."
+    ${PYTHON} python_scripts/wdl_annotate_loci.py \
+        --gene-model "${ANNOVAR_HUMANDB}/hg38_refGene.txt" \
+        --inputs "${ANNOT_INPUTS[@]}" \
+        --outputs "${ANNOT_OUTPUTS[@]}" \
+        || { echo "Error: Gene annotation failed"; exit 1; }
+else
+    for i in "${!ANNOT_INPUTS[@]}"; do
+        echo "Running gene annotation of $(basename "${ANNOT_INPUTS[$i]}")..."
+        annotate_with_annovar "${ANNOT_INPUTS[$i]}" "${ANNOT_OUTPUTS[$i]}" \
+            || { echo "Error: Gene annotation of ${ANNOT_INPUTS[$i]} failed"; exit 1; }
+    done
 fi
 
 echo "Running EHdn gene-based annotation..."
-REPEAT_MASKER="Samplemaps/hg38RM_simple_repeats.bed"
-REF_PN_GENES="Samplemaps/PNPAN_PNrelated.csv"
-REF_FUNC_GENES="Samplemaps/NIHGene_CellFunc.csv"
-REF_STR_GENES="Samplemaps/Malik_STR_genes.csv"
-REF_HIGH_DRG_EXP="Samplemaps/high_DRGexp_genes.csv"
+SAMPLEMAPS_DIR="${SAMPLEMAPS_DIR:-Samplemaps}"
+REPEAT_MASKER="${SAMPLEMAPS_DIR}/hg38RM_simple_repeats.bed"
+REF_PN_GENES="${SAMPLEMAPS_DIR}/PNPAN_PNrelated.csv"
+REF_FUNC_GENES="${SAMPLEMAPS_DIR}/NIHGene_CellFunc.csv"
+REF_STR_GENES="${SAMPLEMAPS_DIR}/Malik_STR_genes.csv"
+REF_HIGH_DRG_EXP="${SAMPLEMAPS_DIR}/high_DRGexp_genes.csv"
 
 FILTERED_RESULT_DIR="${OUTPUT_DIR}/EHdn/${SUBNAME}"
 mkdir -p "${FILTERED_RESULT_DIR}"
 
-/opt/conda/bin/python python_scripts/wdl_filter_ehdn_results.py \
-    --outlier-locus "${EHDN_OTL_LOCUS_ANNOT}" \
-    --casecontrol-locus "${EHDN_CACO_LOCUS_ANNOT}" \
+# Use the joined table when native scoring wrote one
+if [ -f "${EHDN_MERGED_LOCUS_ANNOT}" ]; then
+    FILTER_INPUTS=(--merged-locus "${EHDN_MERGED_LOCUS_ANNOT}")
+else
+    FILTER_INPUTS=(--outlier-locus "${EHDN_OTL_LOCUS_ANNOT}" --casecontrol-locus "${EHDN_CACO_LOCUS_ANNOT}")
+fi
+
+${PYTHON} python_scripts/wdl_filter_ehdn_results.py \
+    "${FILTER_INPUTS[@]}" \
     --output-dir "${FILTERED_RESULT_DIR}" \
     --output-file "${FILTERED_RESULT_DIR}/EHdn_combined_results.csv" \
+    --sample-counts-file "${FILTERED_RESULT_DIR}/EHdn_sample_counts.csv.gz" \
     --repeatmasker-file "${REPEAT_MASKER}" \
-    --case-count 788 \
-    --control-count 879 \
+    --case-count "${CASE_COUNT:-788}" \
+    --control-count "${CONTROL_COUNT:-879}" \
     --gene-list-files "${REF_PN_GENES},${REF_FUNC_GENES},${REF_STR_GENES},${REF_HIGH_DRG_EXP}"
 
 if [ $? -ne 0 ]; then
@@ -23,7 +23,9 @@ CASE_BAM_PATHS="$3"
 CONTROL_BAM_PATHS="$4"
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
-REF="Homo_sapiens_assembly38.fasta"
+REF="${REF:-Homo_sapiens_assembly38.fasta}"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+EH_BIN="${EH_BIN:-/ExpansionHunter/build/install/bin/ExpansionHunter}"
 
 EHDN_RESULTS="${OUTPUT_DIR}/EHdn/${SUBNAME}/EHdn_combined_results.csv"
 WORKDIR="${OUTPUT_DIR}/EH/${SUBNAME}"
@@ -33,55 +35,101 @@ EH_CATALOG_JSON="${WORKDIR}/EH_variant_catalog.json"
 PATH_TO_CASE_RESULTS="${WORKDIR}/cases_results"
 PATH_TO_CONTROL_RESULTS="${WORKDIR}/controls_results"
 
-EH_COMBINED="${WORKDIR}/EH_combined_allRFC1.vcf"
+# Optional: split the catalog into N cost-balanced shards and run EH per (sample, shard) in parallel
+SHARDS="${EH_SHARDS:-1}"
 
 
-run_expansion_hunter() {
+merge_expansion_hunter_shards() {
     local bam_list="$1"
     local output_dir="$2"
+    local shard_dir="$3"
+    shift 3
+    local shards=("$@")
 
-    echo "Running ExpansionHunter..."
     while IFS= read -r bam_path; do
+        [ -z "${bam_path}" ] && continue
         sample_name_base=$(basename "${bam_path}" .bam | sed 's/\.cram$//')
         sample_name=$(echo "$sample_name_base" | sed 's/\^/_/g')
-        out_prefix="${output_dir}/${sample_name}"
-        out_vcf="${out_prefix}.vcf"
-
-        if [ -f "${out_vcf}" ]; then
-            echo "Skipping ${sample_name} - output file already exists"
-            echo "----------------------------------------"
+        [ -f "${output_dir}/${sample_name}.vcf" ] && continue
+
+        local shard_vcfs=() shard_jsons=() complete=1
+        for shard in "${shards[@]}"; do
+            shard_vcfs+=("${shard_dir}/${sample_name}.${shard}.vcf")
+            shard_jsons+=("${shard_dir}/${sample_name}.${shard}.json")
+            [ -f "${shard_dir}/${sample_name}.${shard}.vcf" ] || complete=0
+        done
+        if [ ${complete} -eq 0 ]; then
+            echo "Error processing ${sample_name}: shard outputs are missing"
             continue
         fi
 
-        echo "Processing sample: ${sample_name}"
-        echo "BAM path: ${bam_path}"
+        ${PYTHON} python_scripts/wdl_merge_eh_shards.py \
+            --shard-vcfs "${shard_vcfs[@]}" \
+            --output-vcf "${output_dir}/${sample_name}.vcf" \
+            --shard-jsons "${shard_jsons[@]}" \
+            --output-json "${output_dir}/${sample_name}.json" \
+            || echo "Error merging shards of ${sample_name}"
+    done < "${bam_list}"
+}
+
+run_expansion_hunter() {
+    local bam_list="$1"
+    local output_dir="$2"
 
-        /ExpansionHunter/build/install/bin/ExpansionHunter \
-            --reads ${bam_path} \
-            --reference ${REF} \
-            --variant-catalog ${EH_CATALOG_JSON} \
-            --output-prefix ${out_prefix}
+    echo "Running ExpansionHunter..."
+    if [ "${SHARDS}" -le 1 ]; then
+        # One EH job per sample, run in parallel within the CPU/memory budget
+        ${PYTHON} python_scripts/wdl_run_jobs.py \
+            --bam-list "${bam_list}" \
+            --output-dir "${output_dir}" \
+            --command "${EH_BIN} --reads {bam} --reference ${REF} --variant-catalog ${EH_CATALOG_JSON} --output-prefix {out_prefix}" \
+            --expected-outputs "{out_prefix}.vcf" "{out_prefix}.json" \
+            --clean-names \
+            --max-cpus "${MAX_CPUS:-$(nproc)}" \
+            --max-mem-gb "${MAX_MEM_GB:-16}" \
+            --mem-gb-per-job "${EH_MEM_GB_PER_JOB:-2}"
+        return
+    fi
 
-        if [ $? -eq 0 ]; then
-            echo "Successfully processed ${sample_name}"
-        else
-            echo "Error processing ${sample_name}"
-        fi
-        
-        echo "----------------------------------------"
-    done < "${bam_list}"
+    # One EH job per sample and catalog shard, all sharing the CPU/memory budget
+    local shards=()
+    for shard_catalog in "${WORKDIR}"/EH_variant_catalog.shard*.json; do
+        [ -f "${shard_catalog}" ] || continue
+        shards+=("$(basename "${shard_catalog}" .json | sed 's/^EH_variant_catalog\.//')")
+    done
+    if [ ${#shards[@]} -eq 0 ]; then
+        echo "Error: No shard catalogs found in ${WORKDIR}"
+        return 1
+    fi
+    local shard_dir="${output_dir}/shards"
+    ${PYTHON} python_scripts/wdl_run_jobs.py \
+        --bam-list "${bam_list}" \
+        --output-dir "${shard_dir}" \
+        --shards "${shards[@]}" \
+        --command "${EH_BIN} --reads {bam} --reference ${REF} --variant-catalog ${WORKDIR}/EH_variant_catalog.{shard}.json --output-prefix {out_prefix}" \
+        --expected-outputs "{out_prefix}.vcf" "{out_prefix}.json" \
+        --clean-names \
+        --max-cpus "${MAX_CPUS:-$(nproc)}" \
+        --max-mem-gb "${MAX_MEM_GB:-16}" \
+        --mem-gb-per-job "${EH_MEM_GB_PER_JOB:-2}"
+
+    merge_expansion_hunter_shards "${bam_list}" "${output_dir}" "${shard_dir}" "${shards[@]}"
 }
 
-# Generate EH catalog
-if [ ! -f "${EH_CATALOG_JSON}" ]; then
+# Generate EH catalog (again if EH_SHARDS changed since the shards were written)
+SHARD_STAMP="${WORKDIR}/EH_variant_catalog.shards"
+if [ ! -f "${EH_CATALOG_JSON}" ] || [ "$(cat "${SHARD_STAMP}" 2>/dev/null)" != "${SHARDS}" ]; then
     echo "Generating ExpansionHunter catalog..."
-    /opt/conda/bin/python python_scripts/wdl_IPN_generate_EHcatalog.py \
-        "${EH_CATALOG_JSON}" "${EHDN_RESULTS}"
+    ${PYTHON} python_scripts/wdl_IPN_generate_EHcatalog.py \
+        "${EH_CATALOG_JSON}" "${EHDN_RESULTS}" --shards "${SHARDS}"
 
     if [ $? -ne 0 ]; then
         echo "Error: Failed to generate EH catalog"
         exit 1
     fi
+    # Per-shard outputs of the old shards no longer match the catalogs
+    rm -rf "${PATH_TO_CASE_RESULTS}/shards" "${PATH_TO_CONTROL_RESULTS}/shards"
+    echo "${SHARDS}" > "${SHARD_STAMP}"
 fi
 
 # Run EH for cases and controls
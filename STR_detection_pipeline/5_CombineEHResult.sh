@@ -9,8 +9,8 @@
 
 ##############################################################################
 
-if [ "$#" -lt 4 ]; then
-    echo "Error: Please provide required arguments: 1) EHdn combined result; 2) BAM txt for cases; 3) BAM txt for controls."
+if [ "$#" -lt 2 ]; then
+    echo "Usage: $0 <project_name> <subname>"
     exit 1
 fi
 
@@ -18,9 +18,10 @@ PROJECT_NAME="$1"
 SUBNAME="$2"
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
-REF="Homo_sapiens_assembly38.fasta"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
 
 MANIFEST_FILE="${OUTPUT_DIR}/EHdn/${SUBNAME}/EHdn_manifest.tsv"
+WORKERS="${EH_SCAN_WORKERS:-4}"  # processes used to scan VCF files
 
 WORKDIR="${OUTPUT_DIR}/EH/${SUBNAME}"
 PATH_TO_CASE_RESULTS="${WORKDIR}/cases_results"
@@ -29,26 +30,30 @@ PATH_TO_CONTROL_RESULTS="${WORKDIR}/controls_results"
 
 EH_COMBINED_IR="${WORKDIR}/EH_combined_ir4all.vcf"
 EH_COMBINED_RFC1="${WORKDIR}/EH_combined_all4rfc1.vcf"
+EH_STORE="${WORKDIR}/EH_store"
 
 
 echo "Combining ExpansionHunter results..."
 
-vcf_files=()
-for vcf in ${PATH_TO_CASE_RESULTS}/*.vcf ${PATH_TO_CONTROL_RESULTS}/*.vcf; do
-    if [ -f "$vcf" ]; then
-        sample_name=$(basename "$vcf" .vcf)
-        if grep -q "$sample_name" "$MANIFEST_FILE"; then
-            vcf_files+=("$vcf")
-        fi
-    fi
-done
+# Select VCFs of samples in the EHdn manifest
+VCF_LIST_PREFIX="${WORKDIR}/EH_vcfs"
+${PYTHON} python_scripts/wdl_build_manifest.py select-vcfs \
+    --manifest "${MANIFEST_FILE}" \
+    --case-vcf-dir "${PATH_TO_CASE_RESULTS}" \
+    --control-vcf-dir "${PATH_TO_CONTROL_RESULTS}" \
+    --output-prefix "${VCF_LIST_PREFIX}"
+
+mapfile -t case_vcf_files < "${VCF_LIST_PREFIX}_cases.txt"
+mapfile -t control_vcf_files < "${VCF_LIST_PREFIX}_controls.txt"
+vcf_files=("${case_vcf_files[@]}" "${control_vcf_files[@]}")
 
 ## updated 0604 ##
-if [ ! -f "${EH_COMBINED}_IRRonly.csv" ]; then
-    /opt/conda/bin/python python_scripts/wdl_filter_eh_vcfs.py \
+if [ ! -f "${EH_COMBINED_RFC1}_IRRonly.csv" ]; then
+    ${PYTHON} python_scripts/wdl_filter_eh_vcfs.py \
         --gene RFC1 \
         --vcf-files "${vcf_files[@]}" \
-        --output-prefix "${EH_COMBINED}"
+        --output-prefix "${EH_COMBINED_RFC1}" \
+        --workers "${WORKERS}"
 fi
 
 
@@ -57,4 +62,17 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
+# Parse all EH VCFs once into the columnar store read by step 6
+echo "Building EH genotype store..."
+${PYTHON} python_scripts/wdl_eh_store.py \
+    --case-vcfs "${case_vcf_files[@]}" \
+    --control-vcfs "${control_vcf_files[@]}" \
+    --store-dir "${EH_STORE}" \
+    --workers "${WORKERS}"
+
+if [ $? -ne 0 ]; then
+    echo "Error: Failed to build EH genotype store"
+    exit 1
+fi
+
 echo "All processes completed successfully!"
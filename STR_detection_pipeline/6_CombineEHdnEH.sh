@@ -11,11 +11,9 @@
 
 ##############################################################################
 
-# Usage: bash 5_RunBLAT.sh <ehdn_results> <eh_results> <case_bams_list> <control_bams_list> [roi_bed]
-
 # Check minimum required arguments (5 arguments, with roi_bed being optional)
 if [ "$#" -lt 4 ]; then
-    echo "Usage: $0 <ehdn_results> <eh_results> <case_bams_list> <control_bams_list> [roi_bed]"
+    echo "Usage: $0 <project_name> <subname> <case_bams_list> <control_bams_list> [roi_bed]"
     exit 1
 fi
 
@@ -25,11 +23,24 @@ CASE_BAM_PATHS=$3
 CONTROL_BAM_PATHS=$4
 ROI_BED=$5  # Optional parameter, can be empty
 
-OUTPUT_DIR="/storage1/fs1/jin810/Active/testing/ztang/code/TRE_IPN/${PROJECT_NAME}/output"
-REF="/storage1/fs1/jin810/Active/References/GRCh38/parabricks_sample/Ref/Homo_sapiens_assembly38.fasta"
+OUTPUT_DIR="${PROJECT_NAME}/output"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
 
 EHDN_RESULTS="${OUTPUT_DIR}/EHdn/${SUBNAME}/EHdn_combined_results.csv"
+EHDN_SAMPLE_COUNTS="${OUTPUT_DIR}/EHdn/${SUBNAME}/EHdn_sample_counts.csv.gz"
 EH_RESULTS="${OUTPUT_DIR}/EH/${SUBNAME}/EH_combined_all4DRG20genes.vcf"
+EH_STORE="${OUTPUT_DIR}/EH/${SUBNAME}/EH_store"
+# EH_SOURCE=store reads the columnar EH store of step 5 instead. The store holds every
+# catalog locus, so set EH_GENE_LIST to keep the gene set of the combined VCF.
+EH_SOURCE="${EH_SOURCE:-vcf}"
+EH_GENE_LIST="${EH_GENE_LIST:-}"
+if [ "${EH_SOURCE}" == "store" ]; then
+    if [ ! -d "${EH_STORE}" ]; then
+        echo "Error: EH store not found: ${EH_STORE}"
+        exit 1
+    fi
+    EH_RESULTS="${EH_STORE}"
+fi
 WORKDIR="${OUTPUT_DIR}/BLAT/${SUBNAME}"
 
 mkdir -p ${WORKDIR}
@@ -37,13 +48,13 @@ mkdir -p ${WORKDIR}
 ALL_BAMS_LIST="${WORKDIR}/all_bams.txt"
 cat ${CASE_BAM_PATHS} ${CONTROL_BAM_PATHS} > ${ALL_BAMS_LIST}
 
-COMBINED_JSON="${WORKDIR}/ConsensusSTRMotifs.json"
+COMBINED_JSON="${WORKDIR}/ConsensusSTRMotifs.jsonl"
 
 # CombineEHdnEH
 echo "Combining EHdn and EH results..."
 
 ## 20250512 - passed in skipRM to bypass repeatmasker check and keep all shared motifs
-CMD="/opt/conda/bin/python python_scripts/wdl_combine_ehdn_eh.py \
+CMD="${PYTHON} python_scripts/wdl_combine_ehdn_eh.py \
     --ehdn-results ${EHDN_RESULTS} \
     --eh-results ${EH_RESULTS} \
     --bams ${ALL_BAMS_LIST} \
@@ -51,6 +62,16 @@ CMD="/opt/conda/bin/python python_scripts/wdl_combine_ehdn_eh.py \
     --output-file ${COMBINED_JSON} \
     --skipRM"
 
+# Reuse the sample-count table from step 3 if it exists
+if [ -f "${EHDN_SAMPLE_COUNTS}" ]; then
+    CMD="${CMD} --ehdn-sample-counts ${EHDN_SAMPLE_COUNTS}"
+fi
+
+# Restrict the EH records to a gene list if one is given
+if [ ! -z "${EH_GENE_LIST}" ]; then
+    CMD="${CMD} --eh-genes ${EH_GENE_LIST}"
+fi
+
 # Add ROI_BED parameter only if it's provided
 if [ ! -z "${ROI_BED}" ]; then
     CMD="${CMD} --roi-bed ${ROI_BED}"
@@ -21,34 +21,41 @@ fi
 PROJECT_NAME=$1
 SUBNAME=$2
 
-REF="Homo_sapiens_assembly38.fasta"
+REF="${REF:-Homo_sapiens_assembly38.fasta}"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
+SAMTOOLS="${SAMTOOLS:-samtools}"
+BLAT="${BLAT:-blat}"
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
 
 WORKDIR="${OUTPUT_DIR}/BLAT/${SUBNAME}"
 mkdir -p ${WORKDIR}
 
-COMBINED_JSON="${WORKDIR}/str_motifs_RFC1.json"
+# Consensus motifs written by step 6
+COMBINED_JSON="${MOTIF_FILE:-${WORKDIR}/ConsensusSTRMotifs.jsonl}"
+# Only this gene_motif is BLATed (set BLAT_GENE_MOTIF=all for every motif)
+BLAT_GENE_MOTIF="${BLAT_GENE_MOTIF:-RFC1_AAGGG}"
 
 
 # Generate SAM files
 
 cat > ${WORKDIR}/process_json.py << 'EOL'
-import json
 import sys
 
+# Stream motif-carrier pairs; works for JSON Lines and legacy JSON motif files
+sys.path.insert(0, sys.argv[2])
+from wdl_str_motif import iter_motif_carriers
+
 json_file = sys.argv[1]
-with open(json_file) as f:
-    data = json.load(f)
-    
-for entry in data:
-    region = f"chr{entry['chrom']}:{entry['start']}-{entry['end']}"
-    for carrier in entry['carriers']:
-        print(f"{entry['gene']}\t{entry['motif']}\t{region}\t{carrier}")
+for entry, carrier in iter_motif_carriers(json_file):
+    chrom = str(entry['chrom'])
+    chrom = chrom if chrom.startswith('chr') else 'chr' + chrom
+    region = f"{chrom}:{entry['start']}-{entry['end']}"
+    print(f"{entry['gene']}\t{entry['motif']}\t{region}\t{carrier}")
 EOL
 
 # Process the JSON file using bsub to get motif-carrier pairs
-/opt/conda/bin/python ${WORKDIR}/process_json.py ${COMBINED_JSON} > ${WORKDIR}/motif_carriers.txt
+${PYTHON} ${WORKDIR}/process_json.py ${COMBINED_JSON} python_scripts > ${WORKDIR}/motif_carriers.txt
 
 while IFS=$'\t' read -r gene motif region bam_path; do
     output_dir=${WORKDIR}/SAMs/${gene}_${motif}
@@ -57,7 +64,7 @@ while IFS=$'\t' read -r gene motif region bam_path; do
     output_sam=${output_dir}/${sample_name}.sam
 
     echo "Generating SAM for ${sample_name}, ${gene}, ${motif}..."
-    samtools view ${bam_path} ${region} > ${output_sam}
+    ${SAMTOOLS} view ${bam_path} ${region} > ${output_sam}
     
     if [ ! -f "${output_sam}" ]; then
         echo "Error: SAM file not generated for ${sample_name}, ${gene}, ${motif}"
@@ -79,7 +86,7 @@ for dir in ${WORKDIR}/SAMs/*; do
     gene_motif=$(basename ${dir})
     echo "Processing ${gene_motif}..."
 
-    if [ "${gene_motif}" != "RFC1_AAGGG" ]; then # or AAGAC
+    if [ "${BLAT_GENE_MOTIF}" != "all" ] && [ "${gene_motif}" != "${BLAT_GENE_MOTIF}" ]; then
         echo "Skipping ${gene_motif}"
         continue
     fi
@@ -102,7 +109,7 @@ for dir in ${WORKDIR}/SAMs/*; do
 
         echo "Processing SAM file: ${sample_name}"
         if [ ! -f "$fasta_file" ]; then
-            /opt/conda/bin/python AllScripts/python_scripts/wdl_query_STR_db.py \
+            ${PYTHON} python_scripts/wdl_query_STR_db.py \
                 filter_reads_to_fasta \
                 --sam-file ${sam_file} \
                 --output-file ${fasta_file} \
@@ -116,6 +123,6 @@ for dir in ${WORKDIR}/SAMs/*; do
         fi
 
         echo "Submitted BLAT job for ${sample_name}..."
-        blat ${REF} ${fasta_file} ${psl_file} -t=dna -q=dna -repMatch=1000000
+        ${BLAT} ${REF} ${fasta_file} ${psl_file} -t=dna -q=dna -repMatch=1000000
     done
 done
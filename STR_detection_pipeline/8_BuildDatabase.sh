@@ -19,6 +19,7 @@ SUBNAME=$2
 ROI_BED=$3 #optional
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
 DB_DIR="${OUTPUT_DIR}/STR_DBs"
 mkdir -p ${DB_DIR}
 
@@ -46,7 +47,7 @@ process_gene_motif() {
             
             if [ ! -f "${DB_PATH}" ]; then
                 echo "Processing SAM files and initializing database: ${DB_NAME}"
-                /opt/conda/bin/python python_scripts/wdl_addBlatResult2db.py \
+                ${PYTHON} python_scripts/wdl_addBlatResult2db.py \
                     --mode init \
                     --db-path ${DB_PATH} \
                     --gene ${gene} \
@@ -57,10 +58,10 @@ process_gene_motif() {
             
             echo "Processing BLAT results for ${gene}_${motif}..."
             
-            /opt/conda/bin/python python_scripts/wdl_addBlatResult2db.py \
+            ${PYTHON} python_scripts/wdl_addBlatResult2db.py \
                 --mode blat \
                 --db-path ${DB_PATH} \
-                --psl-files ${PSL_DIR}/*.psl
+                --psl-dir ${PSL_DIR}
                 
             echo "Processing complete for ${gene}_${motif}. Database at: ${DB_PATH}"
         else
@@ -19,10 +19,11 @@ SUBNAME=$2
 ROI_BED=$3 # optional
 
 OUTPUT_DIR="${PROJECT_NAME}/output"
+PYTHON="${PYTHON:-/opt/conda/bin/python}"
 DB_DIR="${OUTPUT_DIR}/STR_DBs"
 
 BLAT_DIR="${OUTPUT_DIR}/BLAT/${SUBNAME}/PSLs"
-JSON_FILE="${OUTPUT_DIR}/BLAT/${SUBNAME}/str_motifs_RFC1.json"
+JSON_FILE="${MOTIF_FILE:-${OUTPUT_DIR}/BLAT/${SUBNAME}/ConsensusSTRMotifs.jsonl}"
 
 echo "Querying STR sequences..."
 
@@ -47,7 +48,7 @@ process_query() {
             roi_args="--json-file ${JSON_FILE}"
         fi
 
-        /opt/conda/bin/python python_scripts/wdl_query_STR_db.py \
+        ${PYTHON} python_scripts/wdl_query_STR_db.py \
             --db-path ${db_path} \
             --gene ${gene} \
             --motif ${motif} \
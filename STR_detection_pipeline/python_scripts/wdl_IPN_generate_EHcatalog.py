@@ -9,43 +9,142 @@
 
 ##############################################################################
 
+"""
+Usage:
+python wdl_IPN_generate_EHcatalog.py <output_json> <input_csv_files...> [--shards K]
+"""
+
 import os
 import sys
+import glob
+import heapq
 import json
+import argparse
 import pandas as pd
+from wdl_metrics import add_metrics_args, setup_metrics
+
+# Reads overlapping a locus reach roughly one fragment beyond it on each side
+FLANK_COST = 1000
+
+def merge_overlapping_loci(df):
+    """
+    Drop duplicated loci and merge overlapping intervals of the same gene and motif.
+    Merged loci keep the position of their first occurrence in the input.
+    """
+    df = df[['chr', 'start', 'end', 'motif', 'gene']].dropna().copy()
+    df['chr'] = df['chr'].astype(str)
+    df['start'] = df['start'].astype('int64')
+    df['end'] = df['end'].astype('int64')
+    df['order'] = range(len(df))
+
+    keys = ['chr', 'gene', 'motif']
+    df = df.sort_values(keys + ['start', 'end'])
+    # A new interval starts when it begins after every interval seen so far in its group
+    running_end = df.groupby(keys, sort=False)['end'].cummax()
+    prev_end = running_end.groupby([df[key] for key in keys], sort=False).shift()
+    new_group = prev_end.isna() | (df['start'] > prev_end)
+    df['cluster'] = new_group.cumsum()
+
+    merged = (df.groupby('cluster')
+              .agg(chr=('chr', 'first'), start=('start', 'min'), end=('end', 'max'),
+                   motif=('motif', 'first'), gene=('gene', 'first'), order=('order', 'min'))
+              .sort_values('order')
+              .reset_index(drop=True))
+    return merged.drop(columns='order')
+
+def build_catalog_entries(df):
+    """Build EH catalog entries for all loci at once."""
+    locus_ids = df['gene'].astype(str)
+    structures = '(' + df['motif'].astype(str) + ')*'
+    regions = df['chr'] + ':' + df['start'].astype(str) + '-' + df['end'].astype(str)
+    return [
+        {
+            "LocusId": locus_id,
+            "LocusStructure": structure,
+            "ReferenceRegion": region,
+            "VariantType": "Repeat"
+        }
+        for locus_id, structure, region in zip(locus_ids, structures, regions)
+    ]
+
+def estimate_locus_cost(df):
+    """Estimate the relative EH run time of each locus from its span plus flanking reads."""
+    return (df['end'] - df['start']).clip(lower=0) + 2 * FLANK_COST
+
+def assign_shards(costs, locus_ids, n_shards):
+    """
+    Assign loci to shards, largest cost first onto the least loaded shard (LPT).
+    Entries sharing a LocusId stay in the same shard so each shard VCF reports them together.
+    Shards left empty (fewer LocusIds than shards) are dropped.
+    """
+    groups = {}
+    for index, locus_id in enumerate(locus_ids):
+        groups.setdefault(locus_id, []).append(index)
+    group_costs = [(sum(costs[i] for i in indices), indices) for indices in groups.values()]
+
+    heap = [(0, shard) for shard in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    for cost, indices in sorted(group_costs, key=lambda item: -item[0]):
+        load, shard = heapq.heappop(heap)
+        shards[shard].extend(indices)
+        heapq.heappush(heap, (load + cost, shard))
+    # Keep catalog order inside each shard
+    return [sorted(indices) for indices in shards if indices]
 
-def create_eh_catalog_entry(row):
-    return {
-        "LocusId": row["gene"],
-        "LocusStructure": f'({row["motif"]})*',
-        "ReferenceRegion": f'{row["chr"]}:{row["start"]}-{row["end"]}',
-        "VariantType": "Repeat"
-    }
-
-def generate_catalog(input_file, output_json):
-    df = pd.read_csv(input_file)
-    json_data = [create_eh_catalog_entry(row) for _, row in df.iterrows()]
-    
+def shard_path(output_json, shard, n_shards):
+    """Path of one shard catalog, e.g. EH_variant_catalog.shard01.json"""
+    base, ext = os.path.splitext(output_json)
+    return f"{base}.shard{shard + 1:0{len(str(n_shards))}d}{ext}"
+
+def remove_shard_catalogs(output_json):
+    """Remove shard catalogs of an earlier run, which may have used another shard count."""
+    base, ext = os.path.splitext(output_json)
+    for path in glob.glob(f"{glob.escape(base)}.shard*{ext}"):
+        os.remove(path)
+
+def write_catalog(entries, output_json):
     with open(output_json, 'w') as outfile:
-        json.dump(json_data, outfile, indent=4)
-    print(f"Generated catalog for {len(json_data)} variants in {output_json}")
+        json.dump(entries, outfile, indent=4)
+
+def generate_catalog(input_files, output_json, n_shards=1):
+    df = pd.concat([pd.read_csv(f) for f in input_files], ignore_index=True)
+    n_input = len(df)
+    df = merge_overlapping_loci(df)
+    entries = build_catalog_entries(df)
+
+    write_catalog(entries, output_json)
+    print(f"Generated catalog for {len(entries)} variants ({n_input} input rows) in {output_json}")
+
+    remove_shard_catalogs(output_json)
+    if n_shards > 1:
+        costs = estimate_locus_cost(df).tolist()
+        locus_ids = [entry["LocusId"] for entry in entries]
+        shards = assign_shards(costs, locus_ids, n_shards)
+        if len(shards) < n_shards:
+            print(f"Only {len(shards)} shards written: there are fewer loci than the {n_shards} requested")
+        for shard, indices in enumerate(shards):
+            path = shard_path(output_json, shard, len(shards))
+            write_catalog([entries[i] for i in indices], path)
+            print(f"  Shard {shard + 1}/{len(shards)}: {len(indices)} variants, "
+                  f"estimated cost {sum(costs[i] for i in indices)} in {path}")
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python IPN_generate_EHcatalog.py <output_json> <input_csv_files...>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Generate ExpansionHunter variant catalog')
+    parser.add_argument('output_json', help='Output catalog JSON')
+    parser.add_argument('input_files', nargs='+', help='EHdn combined result CSV file(s)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Also write this many cost-balanced shard catalogs (default: 1, no shards)')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_IPN_generate_EHcatalog', args, os.path.dirname(args.output_json))
 
-    output_json = sys.argv[1]
-    input_file = sys.argv[2]
-    
-    if os.path.exists(input_file):
-        df = pd.read_csv(input_file)
-    else:
-        print(f"Warning: Input file {input_file} not found")
+    missing = [f for f in args.input_files if not os.path.exists(f)]
+    if missing:
+        print(f"Warning: Input file {', '.join(missing)} not found")
         sys.exit(1)
-    
-    generate_catalog(input_file, output_json)
-    
+
+    generate_catalog(args.input_files, args.output_json, args.shards)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -19,6 +19,7 @@ import csv
 import re
 import glob
 from contextlib import closing
+from wdl_metrics import add_metrics_args, setup_metrics, debug, debug_enabled
 
 def get_table_name(db_path):
     """Extract table name from database filename"""
@@ -67,7 +68,7 @@ def read_exists(curr, table_name, qname, flag, sample_name):
                  (qname, flag, sample_name))
     return curr.fetchone() is not None
 
-def parse_sam_file(file_path, conn, table_name, gene_of_interest):
+def parse_sam_file(file_path, conn, table_name, gene_of_interest, stage=None):
     """Parses a SAM file and inserts data into the SQLite database"""
     sample_name = os.path.basename(file_path).split('.')[0]
     
@@ -100,6 +101,8 @@ def parse_sam_file(file_path, conn, table_name, gene_of_interest):
                 qual = fields[10]
 
                 batch.append((qname, flag, rname, pos, mapq, cigar, rnext, pnext, tlen, seq, qual, sample_name, gene_of_interest))
+                if stage:
+                    stage.rows += 1
                 
                 if len(batch) >= batch_size:
                     curr.executemany(f'''
@@ -119,13 +122,15 @@ def parse_sam_file(file_path, conn, table_name, gene_of_interest):
                 ''', batch)
                 conn.commit()
             
-def parse_directory(directory, conn, table_name, gene_of_interest):
+def parse_directory(directory, conn, table_name, gene_of_interest, stage=None):
     """Parses all SAM files within the specified directory and stores the data in the database"""
     sam_files = glob.glob(os.path.join(directory, "*.sam"))
     
     for sfile in sam_files:
-        print(f"Importing information from {sfile}...")
-        parse_sam_file(sfile, conn, table_name, gene_of_interest)
+        debug(f"Importing information from {sfile}...")
+        parse_sam_file(sfile, conn, table_name, gene_of_interest, stage)
+        if stage:
+            stage.count('sam_files')
 
 def compute_blat_score(rows, N):
     """Compute the BLAT score for each row and return the top N rows as a formatted string."""
@@ -162,7 +167,7 @@ def add_column_if_not_exists(conn, table_name, column_name, column_type):
         else:
             print(f"Column '{column_name}' already exists in table '{table_name}'")
 
-def parse_single_psl_file(psl_file, db_path, table_name, N=3):
+def parse_single_psl_file(psl_file, db_path, table_name, N=3, stage=None):
     """Parse a single PSL file and update the SQLite database with the top N BLAT results for this sample."""
     columns = ['match', 'mis-match', 'rep.match', 'N\'s', 'Q gap count', 'Q gap bases', 
               'T gap count', 'T gap bases', 'strand', 'Q_name', 'Q size', 'Q start', 
@@ -184,7 +189,7 @@ def parse_single_psl_file(psl_file, db_path, table_name, N=3):
             
         # Group by read name to compute BLAT scores
         unique_qnames = df['Q_name'].unique()
-        print(f"Found {len(unique_qnames)} unique read names in {sample_name}")
+        debug(f"Found {len(unique_qnames)} unique read names in {sample_name}")
         
         # Connect to database
         with closing(connect_to_db(db_path)) as conn:
@@ -198,7 +203,7 @@ def parse_single_psl_file(psl_file, db_path, table_name, N=3):
                 
                 # Find intersection of reads in PSL and database
                 qnames_to_process = set(unique_qnames).intersection(db_qnames)
-                print(f"Processing {len(qnames_to_process)} reads that exist in both PSL and database")
+                debug(f"Processing {len(qnames_to_process)} reads that exist in both PSL and database")
                 
                 # Process in batches to improve performance
                 batch_size = 100
@@ -219,7 +224,7 @@ def parse_single_psl_file(psl_file, db_path, table_name, N=3):
                         """, batch)
                         conn.commit()
                         processed_count += len(batch)
-                        print(f"  Progress: {processed_count}/{len(qnames_to_process)} reads processed")
+                        debug(f"  Progress: {processed_count}/{len(qnames_to_process)} reads processed")
                         batch = []
                 
                 # Process any remaining reads
@@ -239,27 +244,33 @@ def parse_single_psl_file(psl_file, db_path, table_name, N=3):
                 
                 print(f"Sample {sample_name}: {processed_count} reads processed, {updated_count} reads updated with BLAT results")
                 
+                if stage:
+                    stage.rows += processed_count
+                    stage.count('psl_hits', len(df))
+                    stage.count('reads_updated', updated_count)
+
                 # Print a few examples for verification
-                curr.execute(f"""
-                    SELECT qname, top_N_blat_results 
-                    FROM {table_name} 
-                    WHERE sample_name = ? AND top_N_blat_results IS NOT NULL 
-                    LIMIT 3
-                """, (sample_name,))
-                sample_rows = curr.fetchall()
-                if sample_rows:
-                    print("Sample updated entries:")
-                    for row in sample_rows:
-                        print(f"  {row[0]}: {row[1]}")
+                if debug_enabled():
+                    curr.execute(f"""
+                        SELECT qname, top_N_blat_results 
+                        FROM {table_name} 
+                        WHERE sample_name = ? AND top_N_blat_results IS NOT NULL 
+                        LIMIT 3
+                    """, (sample_name,))
+                    sample_rows = curr.fetchall()
+                    if sample_rows:
+                        debug("Sample updated entries:")
+                        for row in sample_rows:
+                            debug(f"  {row[0]}: {row[1]}")
                 
-        print(f"{sample_name} processing completed")
+        debug(f"{sample_name} processing completed")
         
     except Exception as e:
         print(f"Error processing {psl_file}: {e}")
         import traceback
         traceback.print_exc()
 
-def process_psl_directory(psl_dir, db_path, table_name, N=3):
+def process_psl_directory(psl_dir, db_path, table_name, N=3, stage=None):
     """Process each PSL file in directory separately"""
     psl_files = glob.glob(os.path.join(psl_dir, "*.psl"))
     
@@ -289,9 +300,9 @@ def process_psl_directory(psl_dir, db_path, table_name, N=3):
     # Process each PSL file separately
     for i, psl_file in enumerate(psl_files, 1):
         print(f"Processing file {i}/{len(psl_files)}: {psl_file}")
-        parse_single_psl_file(psl_file, db_path, table_name, N)
-        print(f"Completed file {i}/{len(psl_files)}")
-        print("-" * 50)
+        parse_single_psl_file(psl_file, db_path, table_name, N, stage)
+        debug(f"Completed file {i}/{len(psl_files)}")
+        debug("-" * 50)
 
 def main():
     parser = argparse.ArgumentParser(description='Process SAM and PSL files for STR analysis')
@@ -303,8 +314,10 @@ def main():
     parser.add_argument('--sam-dir', help='Directory containing SAM files (for init mode)')
     parser.add_argument('--psl-dir', help='Directory containing PSL files (for blat mode)')
     parser.add_argument('--top-n', type=int, default=3, help='Number of top BLAT results to save (default: 3)')
+    add_metrics_args(parser)
     
     args = parser.parse_args()
+    metrics = setup_metrics(f"wdl_addBlatResult2db.{args.mode}", args, os.path.dirname(args.db_path))
     
     if args.mode == 'init':
         if not args.gene or not args.sam_dir:
@@ -313,22 +326,24 @@ def main():
         table_name = initialize_database(args.db_path)
         
         with closing(connect_to_db(args.db_path)) as conn:
-            parse_directory(args.sam_dir, conn, table_name, args.gene)
+            with metrics.stage('import_sam') as stage:
+                parse_directory(args.sam_dir, conn, table_name, args.gene, stage)
             
             # Print some sample data for verification
-            print("\nSample data after initialization:")
+            debug("\nSample data after initialization:")
             with closing(conn.cursor()) as curr:
                 curr.execute(f"SELECT qname, sample_name, gene FROM {table_name} LIMIT 5")
                 sample_rows = curr.fetchall()
                 for row in sample_rows:
-                    print(row)
+                    debug(row)
                     
     elif args.mode == 'blat':
         if not args.psl_dir:
             parser.error("blat mode requires --psl-dir")
             
         table_name = get_table_name(args.db_path)
-        process_psl_directory(args.psl_dir, args.db_path, table_name, args.top_n)
+        with metrics.stage('add_blat_results') as stage:
+            process_psl_directory(args.psl_dir, args.db_path, table_name, args.top_n, stage)
 
 if __name__ == '__main__':
     main()
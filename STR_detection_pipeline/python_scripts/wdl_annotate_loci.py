@@ -0,0 +1,271 @@
+
+##############################################################################
+
+# Helper script for annotating EHdn loci with gene and region in-process.
+# A refGene table (e.g. ANNOVAR humandb hg38_refGene.txt) or a GTF is
+# loaded once into per-chromosome numpy interval arrays, cached next to
+# the gene model, and used to annotate the outlier and case-control
+# tables in one run. Regions follow ANNOVAR's gene-based precedence:
+# exonic = splicing > ncRNA > UTR5 = UTR3 > intronic > upstream = downstream > intergenic
+# Called by 3_EHdn_RunAnnotEHdn.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_annotate_loci.py \
+  --gene-model humandb/hg38_refGene.txt \
+  --inputs outliers_locus.tsv casecontrol_locus.tsv \
+  --outputs outliers_locus_hg38_annotated.tsv casecontrol_locus_hg38_annotated.tsv
+"""
+
+import os
+import re
+import gzip
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+from wdl_metrics import add_metrics_args, setup_metrics
+
+# Same defaults as ANNOVAR annotate_variation.pl
+NEIGHBOR_DISTANCE = 1000
+SPLICING_THRESHOLD = 2
+CACHE_VERSION = 1
+
+REGION_RANK = {
+    'exonic': 0, 'splicing': 0,
+    'ncRNA_exonic': 1, 'ncRNA_splicing': 1, 'ncRNA_intronic': 2,
+    'UTR5': 3, 'UTR3': 3,
+    'intronic': 4,
+    'upstream': 5, 'downstream': 5,
+}
+
+def normalize_chrom(chrom):
+    """Match chromosomes with or without the 'chr' prefix."""
+    chrom = str(chrom)
+    return chrom[3:] if chrom.startswith('chr') else chrom
+
+def read_refgene(path):
+    """Transcripts from a UCSC/ANNOVAR refGene table (0-based, half-open coordinates)."""
+    cols = ['name', 'chrom', 'strand', 'txStart', 'txEnd', 'cdsStart', 'cdsEnd',
+            'exonCount', 'exonStarts', 'exonEnds', 'score', 'name2']
+    df = pd.read_csv(path, sep='\t', header=None, comment='#', dtype=str)
+    # hg38_refGene.txt has a leading bin column
+    if df.shape[1] >= 16:
+        df = df.iloc[:, 1:13]
+    df = df.iloc[:, :12]
+    df.columns = cols
+    for col in ['txStart', 'txEnd', 'cdsStart', 'cdsEnd']:
+        df[col] = df[col].astype(np.int64)
+    return [
+        (row.chrom, row.strand, row.txStart, row.txEnd, row.cdsStart, row.cdsEnd,
+         [int(x) for x in row.exonStarts.rstrip(',').split(',')],
+         [int(x) for x in row.exonEnds.rstrip(',').split(',')],
+         row.name2)
+        for row in df.itertuples(index=False)
+    ]
+
+def read_gtf(path):
+    """Transcripts from a GTF, converted to refGene-style 0-based coordinates."""
+    opener = gzip.open if path.endswith('.gz') else open
+    attr_re = re.compile(r'(\S+) "([^"]*)"')
+    transcripts = {}
+    with opener(path, 'rt') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 9 or fields[2] not in ('exon', 'CDS'):
+                continue
+            attrs = dict(attr_re.findall(fields[8]))
+            tx_id = attrs.get('transcript_id')
+            if not tx_id:
+                continue
+            tx = transcripts.setdefault(tx_id, {
+                'chrom': fields[0], 'strand': fields[6], 'exons': [], 'cds': [],
+                'gene': attrs.get('gene_name', attrs.get('gene_id', tx_id))
+            })
+            interval = (int(fields[3]) - 1, int(fields[4]))
+            tx['exons' if fields[2] == 'exon' else 'cds'].append(interval)
+
+    records = []
+    for tx in transcripts.values():
+        if not tx['exons']:
+            continue
+        exons = sorted(tx['exons'])
+        tx_start, tx_end = exons[0][0], max(e for _, e in exons)
+        if tx['cds']:
+            cds_start, cds_end = min(s for s, _ in tx['cds']), max(e for _, e in tx['cds'])
+        else:
+            cds_start = cds_end = tx_end
+        records.append((tx['chrom'], tx['strand'], tx_start, tx_end, cds_start, cds_end,
+                        [s for s, _ in exons], [e for _, e in exons], tx['gene']))
+    return records
+
+def build_index(records):
+    """Per-chromosome numpy arrays of transcripts, sorted by start, with flattened exons."""
+    by_chrom = {}
+    for record in records:
+        by_chrom.setdefault(normalize_chrom(record[0]), []).append(record)
+
+    index = {}
+    for chrom, recs in by_chrom.items():
+        recs.sort(key=lambda r: r[2])
+        exon_counts = np.array([len(r[6]) for r in recs])
+        tx_end = np.array([r[3] for r in recs], dtype=np.int64)
+        order_by_end = np.argsort(tx_end, kind='stable')
+        index[chrom] = {
+            'tx_start': np.array([r[2] for r in recs], dtype=np.int64),
+            'tx_end': tx_end,
+            'cds_start': np.array([r[4] for r in recs], dtype=np.int64),
+            'cds_end': np.array([r[5] for r in recs], dtype=np.int64),
+            'plus': np.array([r[1] == '+' for r in recs]),
+            'gene': np.array([r[8] for r in recs], dtype=object),
+            'exon_offset': np.concatenate([[0], np.cumsum(exon_counts)]),
+            'exon_start': np.array([s for r in recs for s in r[6]], dtype=np.int64),
+            'exon_end': np.array([e for r in recs for e in r[7]], dtype=np.int64),
+            'max_len': int((tx_end - np.array([r[2] for r in recs])).max()),
+            'end_order': order_by_end,
+            'sorted_end': tx_end[order_by_end],
+        }
+    return index
+
+def load_gene_index(gene_model, cache_file=None):
+    """Load the interval index from its binary cache, rebuilding it if the gene model changed."""
+    cache_file = cache_file or gene_model + '.idx.pkl'
+    stat = os.stat(gene_model)
+    key = (CACHE_VERSION, os.path.abspath(gene_model), stat.st_size, stat.st_mtime)
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('key') == key:
+            return cached['index']
+
+    is_gtf = any(gene_model.endswith(ext) for ext in ('.gtf', '.gtf.gz', '.gff', '.gff.gz'))
+    records = read_gtf(gene_model) if is_gtf else read_refgene(gene_model)
+    index = build_index(records)
+    try:
+        with open(cache_file, 'wb') as f:
+            pickle.dump({'key': key, 'index': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        print(f"Warning: could not write gene model cache {cache_file}")
+    print(f"Indexed {len(records)} transcripts on {len(index)} chromosomes from {gene_model}")
+    return index
+
+def classify_transcript(idx, t, start, end):
+    """
+    Regions of a 1-based closed locus [start, end] relative to a nearby transcript t,
+    or none if the locus lies more than NEIGHBOR_DISTANCE outside of it.
+    """
+    tx_start, tx_end = idx['tx_start'][t] + 1, idx['tx_end'][t]
+    plus = idx['plus'][t]
+    if end < tx_start or start > tx_end:
+        distance = tx_start - end if end < tx_start else start - tx_end
+        if distance > NEIGHBOR_DISTANCE:
+            return []
+        five_prime = (end < tx_start) == plus
+        return ['upstream' if five_prime else 'downstream']
+
+    coding = idx['cds_start'][t] != idx['cds_end'][t]
+    lo, hi = idx['exon_offset'][t], idx['exon_offset'][t + 1]
+    exon_start, exon_end = idx['exon_start'][lo:hi] + 1, idx['exon_end'][lo:hi]
+
+    regions = set()
+    overlap = (start <= exon_end) & (end >= exon_start)
+    if overlap.any():
+        if not coding:
+            regions.add('ncRNA_exonic')
+        else:
+            cds_start, cds_end = idx['cds_start'][t] + 1, idx['cds_end'][t]
+            if start <= cds_end and end >= cds_start:
+                regions.add('exonic')
+            if start < cds_start:
+                regions.add('UTR5' if plus else 'UTR3')
+            if end > cds_end:
+                regions.add('UTR3' if plus else 'UTR5')
+
+    # Splice sites: the first/last bases of each intron next to an internal exon boundary
+    acceptor = exon_start[1:]
+    donor = exon_end[:-1]
+    near_splice = (((start <= acceptor - 1) & (end >= acceptor - SPLICING_THRESHOLD)).any() or
+                   ((start <= donor + SPLICING_THRESHOLD) & (end >= donor + 1)).any())
+    if near_splice:
+        regions.add('splicing' if coding else 'ncRNA_splicing')
+    if not regions:
+        regions.add('intronic' if coding else 'ncRNA_intronic')
+    best = min(REGION_RANK[r] for r in regions)
+    return [r for r in regions if REGION_RANK[r] == best]
+
+def nearest_gene(idx, start, end):
+    """Nearest transcripts left and right of an intergenic locus, ANNOVAR style."""
+    left_n = np.searchsorted(idx['sorted_end'], start, side='left')
+    if left_n:
+        t = idx['end_order'][left_n - 1]
+        left = f"{idx['gene'][t]}(dist={start - idx['tx_end'][t]})"
+    else:
+        left = 'NONE(dist=NONE)'
+    right_n = np.searchsorted(idx['tx_start'], end, side='left')
+    if right_n < len(idx['tx_start']):
+        t = right_n
+        right = f"{idx['gene'][t]}(dist={idx['tx_start'][t] + 1 - end})"
+    else:
+        right = 'NONE(dist=NONE)'
+    return f"{left},{right}"
+
+def annotate_locus(index, chrom, start, end):
+    """Return (gene, region) for one locus."""
+    idx = index.get(normalize_chrom(chrom))
+    if idx is None:
+        return 'NONE(dist=NONE),NONE(dist=NONE)', 'intergenic'
+
+    lo = np.searchsorted(idx['tx_start'], start - NEIGHBOR_DISTANCE - idx['max_len'], side='left')
+    hi = np.searchsorted(idx['tx_start'], end + NEIGHBOR_DISTANCE, side='right')
+    candidates = lo + np.flatnonzero(idx['tx_end'][lo:hi] >= start - NEIGHBOR_DISTANCE)
+
+    hits = {}
+    for t in candidates:
+        for region in classify_transcript(idx, t, start, end):
+            hits.setdefault(region, []).append(idx['gene'][t])
+    if not hits:
+        return nearest_gene(idx, start, end), 'intergenic'
+
+    best = min(REGION_RANK[r] for r in hits)
+    regions = sorted((r for r in hits if REGION_RANK[r] == best), key=list(REGION_RANK).index)
+    genes = [','.join(dict.fromkeys(hits[r])) for r in regions]
+    return ';'.join(dict.fromkeys(genes)), ';'.join(regions)
+
+def annotate_table(index, input_file, output_file):
+    """Insert gene and region columns after motif, as annotate_ehdn.sh does."""
+    # Read as text so the score columns are written back unchanged
+    data = pd.read_csv(input_file, sep='\t', header=0, dtype=str, keep_default_na=False)
+    contig, start, end = data.columns[:3]
+    annotations = [annotate_locus(index, c, int(s), int(e))
+                   for c, s, e in zip(data[contig], data[start], data[end])]
+    data.insert(4, 'gene', [gene for gene, _ in annotations])
+    data.insert(5, 'region', [region for _, region in annotations])
+    data.to_csv(output_file, sep='\t', index=False)
+    print(f"Annotated {len(data)} loci: {input_file} -> {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Annotate EHdn loci with gene and region')
+    parser.add_argument('--gene-model', required=True, help='refGene table (e.g. hg38_refGene.txt) or GTF')
+    parser.add_argument('--cache-file', help='Binary index cache (default: <gene-model>.idx.pkl)')
+    parser.add_argument('--inputs', nargs='+', required=True, help='EHdn locus TSVs (outlier / case-control)')
+    parser.add_argument('--outputs', nargs='+', required=True, help='Annotated TSVs, one per input')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_annotate_loci', args, os.path.dirname(args.outputs[0]))
+
+    if len(args.inputs) != len(args.outputs):
+        parser.error("--inputs and --outputs need the same number of files")
+
+    index = load_gene_index(args.gene_model, args.cache_file)
+    for input_file, output_file in zip(args.inputs, args.outputs):
+        annotate_table(index, input_file, output_file)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+
+##############################################################################
+
+# Helper script for building the EHdn manifest by joining STR profiles to
+# the case/control BAM lists with a hash map, and for selecting the EH VCFs
+# of manifest samples.
+# Called by 2_EHdn_GenerateManifestFile.sh and 5_CombineEHResult.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_build_manifest.py manifest \
+  --case-bams cases.txt --case-profile-dir EHdn_cases_str-profiles \
+  --control-bams controls.txt --control-profile-dir EHdn_controls_str-profiles \
+  --output EHdn_manifest.tsv
+
+python wdl_build_manifest.py select-vcfs \
+  --manifest EHdn_manifest.tsv \
+  --case-vcf-dir cases_results --control-vcf-dir controls_results \
+  --output-prefix EH_vcfs
+"""
+
+import os
+import sys
+import json
+import argparse
+from wdl_sample_names import clean_sample_name, strip_suffix, build_bam_index
+from wdl_metrics import add_metrics_args, setup_metrics
+
+PROFILE_SUFFIX = '.str_profile.json'
+# Keys every complete EHdn profile carries next to its motif counts
+REQUIRED_PROFILE_KEYS = ('Depth', 'ReadLength')
+
+def read_lines(path):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def list_files(directory, suffix):
+    """Files in a directory with the given suffix, sorted by name."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(suffix))
+
+def check_profile(path):
+    """Return None if an EHdn profile JSON is complete, otherwise the reason it is not."""
+    try:
+        with open(path, 'r') as f:
+            profile = json.load(f)
+    except (ValueError, OSError) as e:
+        return f"unreadable ({type(e).__name__})"
+    missing = [key for key in REQUIRED_PROFILE_KEYS if key not in profile]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    return None
+
+def match_profiles(profile_dir, bam_list, status):
+    """
+    Join the profiles of one group to its BAM list. Returns manifest rows
+    (sample, status, profile path) and the profiles skipped with their reason.
+    """
+    bam_index = build_bam_index(read_lines(bam_list)) if bam_list else {}
+    rows, skipped = [], []
+    for path in list_files(profile_dir, PROFILE_SUFFIX):
+        sample = strip_suffix(path, PROFILE_SUFFIX)
+        if clean_sample_name(sample) not in bam_index:
+            skipped.append((sample, 'not in BAM list'))
+            continue
+        problem = check_profile(path)
+        if problem:
+            skipped.append((sample, f'incomplete profile: {problem}'))
+            continue
+        rows.append((sample, status, os.path.realpath(path)))
+    return rows, skipped
+
+def build_manifest(groups, output_file):
+    """Write the EHdn manifest for all (profile_dir, bam_list, status) groups."""
+    all_rows = []
+    for profile_dir, bam_list, status in groups:
+        print(f"Processing {status}s...")
+        rows, skipped = match_profiles(profile_dir, bam_list, status)
+        for sample, reason in skipped:
+            print(f"Warning: skipping {sample} - {reason}")
+        all_rows.extend(rows)
+
+    with open(output_file, 'w') as f:
+        for row in all_rows:
+            f.write('\t'.join(row) + '\n')
+
+    print(f"Manifest file created successfully at: {output_file}")
+    print("Number of samples processed:")
+    for _, _, status in groups:
+        print(f"{status.capitalize()}s: {sum(row[1] == status for row in all_rows)}")
+    return all_rows
+
+def load_manifest_samples(manifest_file):
+    """Cleaned sample names of a manifest, for lookups against EH output names."""
+    samples = set()
+    with open(manifest_file, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if fields[0]:
+                samples.add(clean_sample_name(fields[0]))
+    return samples
+
+def select_vcfs(samples, vcf_dir):
+    """EH VCFs in a directory whose sample is in the manifest sample set."""
+    return [vcf for vcf in list_files(vcf_dir, '.vcf')
+            if clean_sample_name(strip_suffix(vcf, '.vcf')) in samples]
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the EHdn manifest and select EH VCFs of manifest samples')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    manifest = subparsers.add_parser('manifest', help='Join STR profiles to BAM lists into the EHdn manifest')
+    manifest.add_argument('--case-bams', required=True, help='Text file with case BAM paths')
+    manifest.add_argument('--case-profile-dir', required=True, help='Directory of case STR profiles')
+    manifest.add_argument('--control-bams', help='Text file with control BAM paths')
+    manifest.add_argument('--control-profile-dir', help='Directory of control STR profiles')
+    manifest.add_argument('--output', required=True, help='Output manifest TSV')
+
+    select = subparsers.add_parser('select-vcfs', help='List EH VCFs of samples in the manifest')
+    select.add_argument('--manifest', required=True, help='EHdn manifest TSV')
+    select.add_argument('--case-vcf-dir', required=True, help='Directory of case EH VCFs')
+    select.add_argument('--control-vcf-dir', required=True, help='Directory of control EH VCFs')
+    select.add_argument('--output-prefix', required=True,
+                        help='Writes <prefix>_cases.txt and <prefix>_controls.txt, one VCF path per line')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    output_file = args.output if args.mode == 'manifest' else args.output_prefix
+    setup_metrics('wdl_build_manifest', args, os.path.dirname(output_file))
+
+    if args.mode == 'manifest':
+        groups = [(args.case_profile_dir, args.case_bams, 'case')]
+        if args.control_profile_dir and args.control_bams:
+            groups.append((args.control_profile_dir, args.control_bams, 'control'))
+        rows = build_manifest(groups, args.output)
+        if not rows:
+            print("Error: No samples matched, manifest is empty")
+            sys.exit(1)
+    else:
+        samples = load_manifest_samples(args.manifest)
+        for vcf_dir, label in ((args.case_vcf_dir, 'cases'), (args.control_vcf_dir, 'controls')):
+            vcfs = select_vcfs(samples, vcf_dir)
+            with open(f"{args.output_prefix}_{label}.txt", 'w') as f:
+                f.writelines(vcf + '\n' for vcf in vcfs)
+            print(f"Selected {len(vcfs)} {label} VCFs")
+
+if __name__ == '__main__':
+    main()
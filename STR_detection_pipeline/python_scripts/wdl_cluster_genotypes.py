@@ -0,0 +1,184 @@
+
+##############################################################################
+
+# Helper script for STR genotyping via unsupervised clustering.
+# Python version of 10_UnsupervisedIPNFinalStep.R that reads the
+# *_results.txt files of wdl_query_STR_db.py directly: features are scaled,
+# then clustered per locus with multi-start k-means (or mini-batch k-means),
+# Ward hierarchical clustering and a BIC-selected Gaussian mixture. The
+# cluster with the highest mean feature values is called Biallelic.
+# Called by 10_ClusterGenotypes.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_cluster_genotypes.py \
+  --results-dir QueryResults/SUBNAME \
+  --output-dir Clusters/SUBNAME \
+  [--exclude-samples excluded.txt] [--case-pattern PNRR] [--k 2] [--mini-batch]
+"""
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, fcluster
+from sklearn.cluster import KMeans, MiniBatchKMeans, AgglomerativeClustering
+from sklearn.mixture import GaussianMixture
+from sklearn.neighbors import kneighbors_graph
+from wdl_metrics import add_metrics_args, setup_metrics
+
+SEED = 1234
+DEFAULT_FEATURES = ['percent_reads', 'mean_str_length']
+RESULTS_SUFFIX = '_results.txt'
+# Exact Ward needs the n x n distances; above this many samples it is
+# restricted to a k-nearest-neighbour graph, which stays O(n)
+DENSE_WARD_MAX = 5000
+WARD_NEIGHBORS = 15
+
+def load_results(results_file, features, excluded=()):
+    """Read one wdl_query_STR_db.py results table, dropping excluded samples."""
+    # 'None' in other_detected_patterns is a value, not a missing entry
+    data = pd.read_csv(results_file, sep='\t', keep_default_na=False,
+                       dtype={'sample_name': str, 'other_detected_patterns': str})
+    missing = [f for f in features if f not in data.columns]
+    if missing:
+        raise ValueError(f"{results_file} has no column(s) {', '.join(missing)}")
+    return data[~data['sample_name'].isin(excluded)].reset_index(drop=True)
+
+def scale_features(values):
+    """Center and scale columns like R's scale() (sample sd); constant columns are only centered."""
+    sd = values.std(axis=0, ddof=1) if len(values) > 1 else np.zeros(values.shape[1])
+    sd[~(sd > 0)] = 1.0
+    return (values - values.mean(axis=0)) / sd
+
+def kmeans_clusters(X, k, n_init=25, mini_batch=False):
+    """Multi-start k-means; returns (labels, within-cluster sum of squares)."""
+    model_cls = MiniBatchKMeans if mini_batch else KMeans
+    model = model_cls(n_clusters=k, n_init=n_init, random_state=SEED).fit(X)
+    return model.labels_, model.inertia_
+
+def ward_clusters(X, k):
+    """
+    Ward clustering cut into k groups. Small cohorts use exact Ward (as R's hclust
+    ward.D2); large ones use Ward constrained to a k-nearest-neighbour graph.
+    """
+    if len(X) <= DENSE_WARD_MAX:
+        return fcluster(linkage(X, method='ward'), k, criterion='maxclust') - 1
+    connectivity = kneighbors_graph(X, n_neighbors=min(WARD_NEIGHBORS, len(X) - 1), include_self=False)
+    model = AgglomerativeClustering(n_clusters=k, linkage='ward', connectivity=connectivity)
+    return model.fit_predict(X)
+
+def gmm_clusters(X, max_components=5):
+    """Gaussian mixture with the number of components chosen by BIC; returns (labels, uncertainty, n, bic)."""
+    best = None
+    for n in range(1, min(max_components, len(X)) + 1):
+        model = GaussianMixture(n_components=n, covariance_type='full', n_init=3, random_state=SEED).fit(X)
+        bic = model.bic(X)
+        if best is None or bic < best[1]:
+            best = (model, bic)
+    model, bic = best
+    posterior = model.predict_proba(X)
+    return posterior.argmax(axis=1), 1 - posterior.max(axis=1), model.n_components, bic
+
+def biallelic_call(labels, raw_values):
+    """Biallelic for the cluster with the highest sum of mean (unscaled) features, else Monoallelic."""
+    labels = np.asarray(labels)
+    clusters = np.unique(labels)
+    scores = [raw_values[labels == c].mean(axis=0).sum() for c in clusters]
+    return np.where(labels == clusters[int(np.argmax(scores))], 'Biallelic', 'Monoallelic')
+
+def cluster_locus(data, features, k=2, max_k=10, mini_batch=False, case_pattern='PNRR'):
+    """Cluster the samples of one locus. Returns (assignments, k-means WSS table, model summary)."""
+    raw = data[features].to_numpy(dtype=float)
+    X = scale_features(raw)
+
+    # Elbow curve, replacing the R plot
+    wss = [(n, kmeans_clusters(X, n, mini_batch=mini_batch)[1]) for n in range(1, min(max_k, len(X)) + 1)]
+
+    kmeans_labels, _ = kmeans_clusters(X, k, mini_batch=mini_batch)
+    hc_labels = ward_clusters(X, k)
+    gmm_labels, uncertainty, n_components, bic = gmm_clusters(X)
+
+    out = data[['sample_name'] + features].copy()
+    out['status'] = np.where(data['sample_name'].str.contains(case_pattern, regex=False), 'Case', 'Control')
+    out['kmeans_cluster'] = kmeans_labels + 1
+    out['hierarchical_cluster'] = hc_labels + 1
+    out['gmm_cluster'] = gmm_labels + 1
+    out['gmm_uncertainty'] = np.round(uncertainty, 3)
+    out['kmeans'] = biallelic_call(kmeans_labels, raw)
+    out['hierarchical'] = biallelic_call(hc_labels, raw)
+    out['GMM'] = biallelic_call(gmm_labels, raw)
+    out['WGS_new'] = np.where((out['hierarchical'] == 'Biallelic') | (out['GMM'] == 'Biallelic'),
+                              'Biallelic', 'Monoallelic')
+    if 'other_detected_patterns' in data.columns:
+        out['other_detected_patterns'] = data['other_detected_patterns']
+
+    wss = pd.DataFrame(wss, columns=['k', 'tot_withinss'])
+    summary = {'n_samples': len(X), 'k': k, 'gmm_components': n_components, 'gmm_bic': round(bic, 3)}
+    return out, wss, summary
+
+def locus_name(results_file):
+    return os.path.basename(results_file)[:-len(RESULTS_SUFFIX)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster STR query results into Biallelic / Monoallelic calls')
+    parser.add_argument('--results-dir', help='Directory with *_results.txt files of wdl_query_STR_db.py')
+    parser.add_argument('--results', nargs='+', help='Individual *_results.txt files')
+    parser.add_argument('--output-dir', required=True, help='Output directory')
+    parser.add_argument('--features', nargs='+', default=DEFAULT_FEATURES,
+                        help=f'Feature columns (default: {" ".join(DEFAULT_FEATURES)})')
+    parser.add_argument('--exclude-samples', help='Text file with sample names to leave out (one per line)')
+    parser.add_argument('--case-pattern', default='PNRR', help='Substring marking case samples (default: PNRR)')
+    parser.add_argument('--k', type=int, default=2, help='Clusters for k-means and hierarchical (default: 2)')
+    parser.add_argument('--max-k', type=int, default=10, help='Largest k of the elbow table (default: 10)')
+    parser.add_argument('--mini-batch', action='store_true', help='Use mini-batch k-means for large cohorts')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_cluster_genotypes', args, args.output_dir)
+
+    results_files = list(args.results or [])
+    if args.results_dir:
+        results_files += sorted(glob.glob(os.path.join(args.results_dir, f'*{RESULTS_SUFFIX}')))
+    if not results_files:
+        parser.error("No results files given (--results-dir or --results)")
+
+    excluded = set()
+    if args.exclude_samples:
+        with open(args.exclude_samples, 'r') as f:
+            excluded = {line.strip() for line in f if line.strip()}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    assignments, elbows, summaries = [], [], []
+    for results_file in results_files:
+        locus = locus_name(results_file)
+        data = load_results(results_file, args.features, excluded)
+        if len(data) <= args.k:
+            print(f"Skipping {locus}: {len(data)} samples for k = {args.k}")
+            continue
+        out, wss, summary = cluster_locus(data, args.features, args.k, args.max_k,
+                                          args.mini_batch, args.case_pattern)
+        out.insert(0, 'locus', locus)
+        wss.insert(0, 'locus', locus)
+        assignments.append(out)
+        elbows.append(wss)
+        summaries.append({'locus': locus, **summary})
+        print(f"{locus}: {len(out)} samples, {(out['WGS_new'] == 'Biallelic').sum()} Biallelic, "
+              f"GMM with {summary['gmm_components']} components")
+
+    if not assignments:
+        print("No loci with enough samples to cluster")
+        return
+
+    pd.concat(assignments).to_csv(os.path.join(args.output_dir, 'genotype_clusters.tsv'), sep='\t', index=False)
+    pd.concat(elbows).to_csv(os.path.join(args.output_dir, 'kmeans_wss.tsv'), sep='\t', index=False)
+    pd.DataFrame(summaries).to_csv(os.path.join(args.output_dir, 'cluster_models.tsv'), sep='\t', index=False)
+    print(f"Cluster assignments written to {os.path.join(args.output_dir, 'genotype_clusters.tsv')}")
+
+if __name__ == '__main__':
+    main()
@@ -15,13 +15,19 @@ import os
 import re
 import pandas as pd
 import json
-from wdl_str_motif import STRMotif
+from wdl_str_motif import STRMotif, write_motifs_jsonl
+from wdl_sample_names import clean_sample_name
+from wdl_ehdn_sample_counts import (
+    make_locus_id, build_sample_count_table, load_sample_counts, get_source_counts
+)
+from wdl_filter_eh_vcfs import read_gene_list
+from wdl_metrics import add_metrics_args, setup_metrics, debug
 
-def clean_sample_name(sample_name):
-    """Standardize and clean sample names by removing file extensions and invalid chars."""
-    name = os.path.basename(sample_name)
-    name = name.replace('.bam', '').replace('.cram', '')
-    return name.replace('^', '_')
+def clean_sample_column(samples):
+    """Clean a categorical sample column, calling clean_sample_name once per distinct sample."""
+    categories = samples.cat.categories
+    cleaned = dict(zip(categories, categories.map(clean_sample_name)))
+    return samples.map(cleaned)
 
 def load_bam_paths(bams_file):
     """Load BAM paths and create a mapping of cleaned sample names to BAM paths."""
@@ -34,25 +40,32 @@ def load_bam_paths(bams_file):
                 bam_mapping[cleaned_name] = bam_path
     return bam_mapping
 
-def get_sample_sets(ehdn_data, eh_data, gene, motif):
-    """Extract and clean sample sets from EHdn and EH data for a given gene/motif."""
-    # Get EHdn samples
-    ehdn_matches = ehdn_data[
-        (ehdn_data['gene'] == gene) & 
-        (ehdn_data['motif'] == motif)
-    ]
-    ehdn_samples = set()
-    for raw_data in ehdn_matches['raw_data']:
-        samples = [clean_sample_name(s.split(':')[0]) for s in str(raw_data).split(',')]
-        ehdn_samples.update(samples)
+def build_sample_set_index(ehdn_data, ehdn_counts, eh_data):
+    """
+    Build (gene, motif) -> frozenset of samples maps for EHdn and EH in one groupby pass each,
+    so motif discovery does not re-filter the full tables for every row.
+    """
+    # Attach gene/motif to every EHdn sample entry through its locus id
+    locus_keys = ehdn_data[['locus_id', 'gene', 'motif']].drop_duplicates()
+    ehdn_long = ehdn_counts[['locus_id', 'sample_clean']].astype({'locus_id': str}).merge(
+        locus_keys, on='locus_id'
+    )
+    ehdn_index = {
+        key: frozenset(samples)
+        for key, samples in ehdn_long.groupby(['gene', 'motif'], sort=False)['sample_clean']
+    }
     
-    # Get EH samples
-    eh_samples = set(eh_data[
-        (eh_data['REPID'] == gene) & 
-        (eh_data['RU'] == motif)
-    ]['SampleID'])
+    eh_index = {
+        key: frozenset(samples)
+        for key, samples in eh_data.groupby(['REPID', 'RU'], sort=False)['SampleID']
+    }
+    return ehdn_index, eh_index
 
-    return ehdn_samples, eh_samples
+def get_sample_sets(sample_index, gene, motif):
+    """Look up the EHdn and EH sample sets for a given gene/motif."""
+    ehdn_index, eh_index = sample_index
+    key = (gene, motif)
+    return ehdn_index.get(key, frozenset()), eh_index.get(key, frozenset())
 
 def check_sample_overlap(ehdn_samples, eh_samples, min_overlap_percent):
     """Check if sample overlap meets the minimum percentage requirement."""
@@ -89,7 +102,19 @@ def create_str_motif(gene, motif, row, total_samples, bam_mapping):
 
 def load_ehdn_results(ehdn_file):
     """Load EHdn results from CSV file."""
-    return pd.read_csv(ehdn_file)
+    ehdn_data = pd.read_csv(ehdn_file)
+    ehdn_data['locus_id'] = make_locus_id(ehdn_data)
+    return ehdn_data
+
+def load_ehdn_sample_counts(ehdn_data, sample_counts_file=None):
+    """Load (or build once) the EHdn raw_data sample table with cleaned sample names."""
+    if sample_counts_file:
+        sample_counts = load_sample_counts(sample_counts_file)
+    else:
+        sample_counts = build_sample_count_table(ehdn_data, columns=['raw_data'])
+    ehdn_counts = get_source_counts(sample_counts, 'raw_data').copy()
+    ehdn_counts['sample_clean'] = clean_sample_column(ehdn_counts['sample'])
+    return ehdn_counts
 
 def process_info_field(df, info_str):
     """Process INFO field from VCF-like format into separate columns."""
@@ -112,16 +137,26 @@ def process_info_field(df, info_str):
     
     return info_data
 
-def load_eh_results(eh_results_file):
-    """Load and process EH results file."""
+def load_eh_results(eh_results_file, genes=None):
+    """
+    Load and process EH results, either a combined CSV or a columnar EH store directory.
+    With genes, only records whose VARID starts with one of the gene names are kept.
+    """
+    if os.path.isdir(eh_results_file):
+        from wdl_eh_store import read_store
+        return read_store(eh_results_file, inrepeat_only=True, genes=genes)
+    
     df = pd.read_csv(eh_results_file)
     
     # Process INFO field
     info_data = process_info_field(df, df['INFO'])
     
-    # Process FORMAT field
-    format_cols = df.iloc[0]['FORMAT'].split(':')
-    variant_data = df['VARIANTS'].str.split(':', expand=True)
+    # Process FORMAT field; each record carries its own FORMAT keys
+    variant_data = [
+        dict(zip(str(fmt).split(':'), str(values).split(':')))
+        for fmt, values in zip(df['FORMAT'], df['VARIANTS'])
+    ]
+    format_cols = list(dict.fromkeys(key for record in variant_data for key in record))
     
     # Construct output dataframe
     new_df = pd.DataFrame()
@@ -136,20 +171,22 @@ def load_eh_results(eh_results_file):
         new_df[field] = values
     
     # Add FORMAT columns
-    for i, col in enumerate(format_cols):
-        new_df[col] = variant_data[i].astype(str)
+    for col in format_cols:
+        new_df[col] = [record.get(col, '') for record in variant_data]
     
     # Clean up data
     new_df = new_df.replace('nan', '')
+    if genes is not None:
+        new_df = new_df[new_df['VARID'].astype(str).str.startswith(tuple(genes))].reset_index(drop=True)
     
     return new_df
 
-def filter_motifs_by_evidence(motifs, ehdn_data, eh_data, bam_mapping, min_overlap_percent):
+def filter_motifs_by_evidence(motifs, sample_index, bam_mapping, min_overlap_percent):
     """Filter motifs by requiring evidence from both EHdn and EH."""
     filtered_motifs = []
     
     for motif in motifs:
-        ehdn_samples, eh_samples = get_sample_sets(ehdn_data, eh_data, motif.gene, motif.motif)
+        ehdn_samples, eh_samples = get_sample_sets(sample_index, motif.gene, motif.motif)
         passes_overlap, total_samples = check_sample_overlap(ehdn_samples, eh_samples, min_overlap_percent)
         
         if passes_overlap:
@@ -170,18 +207,21 @@ def filter_motifs_by_evidence(motifs, ehdn_data, eh_data, bam_mapping, min_overl
     
     return filtered_motifs
 
-def identify_motifs_from_results(ehdn_data, eh_data, bam_mapping, min_overlap_percent):
+def identify_motifs_from_results(ehdn_data, sample_index, bam_mapping, min_overlap_percent, skip_rm=False):
     """Identify and create STR motifs from EHdn and EH results."""
     # Filter by RepeatMasker
-    passing_mask = ehdn_data.apply(check_repeatmasker_motif, axis=1)
-    filtered_data = ehdn_data[passing_mask].copy()
+    if skip_rm:
+        filtered_data = ehdn_data
+    else:
+        passing_mask = ehdn_data.apply(check_repeatmasker_motif, axis=1)
+        filtered_data = ehdn_data[passing_mask].copy()
 
     motifs = []
     for _, row in filtered_data.iterrows():
         gene = row['gene']
         motif_seq = row['motif']
         
-        ehdn_samples, eh_samples = get_sample_sets(ehdn_data, eh_data, gene, motif_seq)
+        ehdn_samples, eh_samples = get_sample_sets(sample_index, gene, motif_seq)
         passes_overlap, total_samples = check_sample_overlap(ehdn_samples, eh_samples, min_overlap_percent)
         
         if passes_overlap:
@@ -221,38 +261,60 @@ def check_repeatmasker_motif(row):
 def main():
     parser = argparse.ArgumentParser(description='Combine EHdn and EH results')
     parser.add_argument('--ehdn-results', required=True, help='EHdn result file')
-    parser.add_argument('--eh-results', required=True, help='EH results file')
+    parser.add_argument('--eh-results', required=True,
+                       help='EH results file (combined CSV) or EH store directory from wdl_eh_store.py')
+    parser.add_argument('--eh-genes',
+                       help='Optional file of gene names, one per line; only EH records of these genes are used')
+    parser.add_argument('--ehdn-sample-counts',
+                       help='Optional long-format EHdn sample-count table written by wdl_filter_ehdn_results.py')
     parser.add_argument('--roi-bed', help='Optional BED file with regions of interest')
     parser.add_argument('--bams', required=True, help='File storing BAM files paths')
     parser.add_argument('--min-overlap-percent', type=float, default=10,
                        help='Minimum percentage of samples detected by both EHdn and EH')
-    parser.add_argument('--output-file', required=True, help='JSON output file for the motifs')
+    parser.add_argument('--output-file', required=True,
+                       help='Output file for the motifs (JSON Lines if it ends with .jsonl, otherwise JSON)')
+    parser.add_argument('--skipRM', action='store_true',
+                       help='Keep motifs already annotated by RepeatMasker (skip the RepeatMasker check)')
+    add_metrics_args(parser)
     args = parser.parse_args()
+    metrics = setup_metrics('wdl_combine_ehdn_eh', args, os.path.dirname(args.output_file))
 
     # Load all required data
-    bam_mapping = load_bam_paths(args.bams)
-    ehdn_data = load_ehdn_results(args.ehdn_results)
-    eh_data = load_eh_results(args.eh_results)
+    with metrics.stage('load_results') as stage:
+        bam_mapping = load_bam_paths(args.bams)
+        ehdn_data = load_ehdn_results(args.ehdn_results)
+        ehdn_counts = load_ehdn_sample_counts(ehdn_data, args.ehdn_sample_counts)
+        eh_genes = read_gene_list(args.eh_genes) if args.eh_genes else None
+        eh_data = load_eh_results(args.eh_results, eh_genes)
+        sample_index = build_sample_set_index(ehdn_data, ehdn_counts, eh_data)
+        stage.rows = len(ehdn_data)
+        stage.count('bams', len(bam_mapping))
     
     # Get motifs either from ROI bed or from results
-    if args.roi_bed:
-        initial_motifs = load_motifs_from_bed(args.roi_bed)
-        motifs = filter_motifs_by_evidence(
-            initial_motifs, ehdn_data, eh_data, bam_mapping, args.min_overlap_percent
-        )
-    else:
-        motifs = identify_motifs_from_results(
-            ehdn_data, eh_data, bam_mapping, args.min_overlap_percent
-        )
+    with metrics.stage('find_motifs') as stage:
+        if args.roi_bed:
+            initial_motifs = load_motifs_from_bed(args.roi_bed)
+            motifs = filter_motifs_by_evidence(
+                initial_motifs, sample_index, bam_mapping, args.min_overlap_percent
+            )
+            stage.rows = len(initial_motifs)
+        else:
+            motifs = identify_motifs_from_results(
+                ehdn_data, sample_index, bam_mapping, args.min_overlap_percent, args.skipRM
+            )
+            stage.rows = len(ehdn_data)
+        stage.count('motifs', len(motifs))
 
     # Print summary
     print(f"\nFound {len(motifs)} valid STR motifs")
     for motif in motifs:
-        print(f"\nMotif: {motif}")
-        print(f"Carriers: {len(motif.carriers)}")
+        debug(f"\nMotif: {motif}")
+        debug(f"Carriers: {len(motif.carriers)}")
 
     # Save results
-    if args.output_file:
+    if args.output_file.endswith('.jsonl'):
+        write_motifs_jsonl(motifs, args.output_file)
+    elif args.output_file:
         with open(args.output_file, 'w') as f:
             json.dump([m.to_dict() for m in motifs], f, indent=4)
 
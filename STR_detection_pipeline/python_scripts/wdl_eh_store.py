@@ -0,0 +1,299 @@
+
+##############################################################################
+
+# Helper script for building a columnar cohort store of ExpansionHunter
+# genotypes. EH VCFs are parsed once into typed columns (REPID, RU, REPCN
+# alleles, CI bounds, ADSP/ADFL/ADIR, case/control, ...) and streamed, one
+# record batch per VCF, into a Parquet dataset partitioned by a hash bucket
+# of the locus (bucket=<n>/), so the number of partitions stays fixed
+# however many loci the catalog has.
+# Called by 5_CombineEHResult.sh; read by wdl_combine_ehdn_eh.py
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_eh_store.py \
+  --case-vcfs cases_results/*.vcf \
+  --control-vcfs controls_results/*.vcf \
+  --store-dir /path/to/EH_store
+"""
+
+import os
+import json
+import zlib
+import shutil
+import argparse
+from functools import partial
+from multiprocessing import Pool
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from wdl_metrics import add_metrics_args, setup_metrics
+
+# Older ExpansionHunter releases use different FORMAT keys for the same values
+FORMAT_ALIASES = {'CN': 'REPCN', 'CI': 'REPCI', 'AD_SP': 'ADSP', 'AD_FL': 'ADFL', 'AD_IR': 'ADIR'}
+
+DEFAULT_BUCKETS = 64
+# Ignored by pyarrow dataset discovery (leading underscore)
+STORE_INFO = '_store_info.json'
+
+STORE_SCHEMA = pa.schema([
+    ('SampleID', pa.string()),
+    ('case_control', pa.string()),
+    ('CHROM', pa.string()),
+    ('POS', pa.int64()),
+    ('ID', pa.string()),
+    ('REF', pa.string()),
+    ('ALT', pa.string()),
+    ('FILTER', pa.string()),
+    ('END', pa.int64()),
+    ('REPID', pa.string()),
+    ('VARID', pa.string()),
+    ('RU', pa.string()),
+    ('REF_UNITS', pa.int64()),
+    ('RL', pa.int64()),
+    ('GT', pa.string()),
+    ('SO', pa.string()),
+    ('REPCN_1', pa.int64()),
+    ('REPCN_2', pa.int64()),
+    ('REPCI_1_LO', pa.int64()),
+    ('REPCI_1_HI', pa.int64()),
+    ('REPCI_2_LO', pa.int64()),
+    ('REPCI_2_HI', pa.int64()),
+    ('ADSP_1', pa.int64()),
+    ('ADSP_2', pa.int64()),
+    ('ADFL_1', pa.int64()),
+    ('ADFL_2', pa.int64()),
+    ('ADIR_1', pa.int64()),
+    ('ADIR_2', pa.int64()),
+    ('LC', pa.float64()),
+    ('category', pa.string()),
+    ('bucket', pa.int32()),
+])
+
+def to_int(value):
+    """Convert a VCF value to int, returning None for missing values."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_float(value):
+    """Convert a VCF value to float, returning None for missing values."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def split_alleles(value):
+    """Split a per-allele value like '12/45' into two ints (second is None for haploid calls)."""
+    if value is None:
+        return None, None
+    alleles = value.split('/')
+    return to_int(alleles[0]), to_int(alleles[1]) if len(alleles) > 1 else None
+
+def split_ci(value):
+    """Split a per-allele confidence interval like '10-12/40-50' into four ints."""
+    bounds = []
+    for allele in (value.split('/') if value else [])[:2]:
+        lo, _, hi = allele.partition('-')
+        bounds.extend([to_int(lo), to_int(hi)])
+    return bounds + [None] * (4 - len(bounds))
+
+def get_category(line):
+    """Same read-support category as wdl_filter_eh_vcfs.py uses for INREPEAT records."""
+    if 'SPANNING' in line:
+        return 'SP'
+    if 'FLANKING' in line:
+        return 'FL'
+    return 'IRRonly'
+
+def parse_eh_record(line, sample_id, case_control):
+    """Parse one EH VCF record into a typed row. FORMAT is read from the record itself."""
+    fields = line.rstrip('\n').split('\t')
+    info = dict(item.split('=', 1) for item in fields[7].split(';') if '=' in item)
+    sample = {}
+    if len(fields) > 9:
+        for key, value in zip(fields[8].split(':'), fields[9].split(':')):
+            sample[FORMAT_ALIASES.get(key, key)] = value
+
+    repcn_1, repcn_2 = split_alleles(sample.get('REPCN'))
+    ci = split_ci(sample.get('REPCI'))
+    adsp_1, adsp_2 = split_alleles(sample.get('ADSP'))
+    adfl_1, adfl_2 = split_alleles(sample.get('ADFL'))
+    adir_1, adir_2 = split_alleles(sample.get('ADIR'))
+
+    return {
+        'SampleID': sample_id,
+        'case_control': case_control,
+        'CHROM': fields[0],
+        'POS': to_int(fields[1]),
+        'ID': fields[2],
+        'REF': fields[3],
+        'ALT': fields[4],
+        'FILTER': fields[6],
+        'END': to_int(info.get('END')),
+        'REPID': info.get('REPID', info.get('VARID')),
+        'VARID': info.get('VARID'),
+        'RU': info.get('RU'),
+        'REF_UNITS': to_int(info.get('REF')),
+        'RL': to_int(info.get('RL')),
+        'GT': sample.get('GT'),
+        'SO': sample.get('SO'),
+        'REPCN_1': repcn_1,
+        'REPCN_2': repcn_2,
+        'REPCI_1_LO': ci[0],
+        'REPCI_1_HI': ci[1],
+        'REPCI_2_LO': ci[2],
+        'REPCI_2_HI': ci[3],
+        'ADSP_1': adsp_1,
+        'ADSP_2': adsp_2,
+        'ADFL_1': adfl_1,
+        'ADFL_2': adfl_2,
+        'ADIR_1': adir_1,
+        'ADIR_2': adir_2,
+        'LC': to_float(sample.get('LC')),
+        'category': get_category(line) if 'INREPEAT' in line else None,
+    }
+
+def locus_bucket(repid, n_buckets):
+    """Stable hash bucket of a locus (same in every process and Python version)."""
+    return zlib.crc32(str(repid).encode()) % n_buckets
+
+def parse_eh_vcf(vcf_path, case_control, loci=None, n_buckets=DEFAULT_BUCKETS):
+    """Parse all records of one EH VCF file into a record batch, optionally keeping only the given loci."""
+    sample_id = os.path.basename(vcf_path).replace('.vcf', '')
+    rows = []
+    with open(vcf_path, 'r') as vcf_file:
+        for line in vcf_file:
+            if line.startswith('#') or not line.strip():
+                continue
+            row = parse_eh_record(line, sample_id, case_control)
+            if loci is None or row['REPID'] in loci:
+                row['bucket'] = locus_bucket(row['REPID'], n_buckets)
+                rows.append(row)
+    return pa.RecordBatch.from_pylist(rows, schema=STORE_SCHEMA)
+
+def _parse_job(job, loci=None, n_buckets=DEFAULT_BUCKETS):
+    vcf_path, case_control = job
+    return parse_eh_vcf(vcf_path, case_control, loci, n_buckets)
+
+def replace_dir(src, dst):
+    """Move src over dst; dst must be missing, empty or a previous EH store."""
+    entries = os.listdir(dst) if os.path.isdir(dst) else []
+    # Stores written before bucketing hold only REPID=<locus>/ partitions
+    is_store = STORE_INFO in entries or all(entry.startswith('REPID=') for entry in entries)
+    if not is_store:
+        raise SystemExit(f"Error: {dst} is not empty and is not an EH store; refusing to replace it")
+    old = f"{dst}.old-{os.getpid()}"
+    if os.path.exists(dst):
+        os.rename(dst, old)
+    os.rename(src, dst)
+    shutil.rmtree(old, ignore_errors=True)
+
+def build_store(case_vcfs, control_vcfs, store_dir, loci=None, workers=1, n_buckets=DEFAULT_BUCKETS):
+    """
+    Parse EH VCFs once and write them as a Parquet dataset partitioned by locus bucket.
+    Batches are written as each VCF is parsed; the store replaces any previous one as a whole.
+    """
+    jobs = [(path, 'case') for path in case_vcfs] + [(path, 'control') for path in control_vcfs]
+    jobs = [(path, status) for path, status in jobs if os.path.exists(path)]
+    parse = partial(_parse_job, loci=loci, n_buckets=n_buckets)
+    stats = {'rows': 0, 'loci': set()}
+
+    def batches(parsed):
+        for batch in parsed:
+            stats['rows'] += batch.num_rows
+            stats['loci'].update(batch.column('REPID').to_pylist())
+            yield batch
+
+    store_dir = store_dir.rstrip('/')
+    tmp_dir = f"{store_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    write = partial(
+        ds.write_dataset, base_dir=tmp_dir, schema=STORE_SCHEMA, format='parquet',
+        partitioning=ds.partitioning(pa.schema([('bucket', pa.int32())]), flavor='hive'),
+        max_partitions=n_buckets, max_open_files=n_buckets
+    )
+    try:
+        if workers > 1:
+            with Pool(workers) as pool:
+                write(batches(pool.imap(parse, jobs, chunksize=8)))
+        else:
+            write(batches(map(parse, jobs)))
+        with open(os.path.join(tmp_dir, STORE_INFO), 'w') as f:
+            json.dump({'buckets': n_buckets}, f)
+        replace_dir(tmp_dir, store_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"Stored {stats['rows']} EH records from {len(jobs)} VCF files "
+          f"({len(stats['loci'])} loci) in {store_dir}")
+    return stats['rows']
+
+def read_store(store_dir, loci=None, columns=None, inrepeat_only=False, genes=None):
+    """
+    Read the EH store into a pandas DataFrame with memory-mapped Parquet reads.
+    Only the buckets holding the requested loci are touched. With genes, only records
+    whose VARID starts with one of the gene names are kept, as in wdl_filter_eh_vcfs.py.
+    """
+    filters = []
+    if loci is not None:
+        with open(os.path.join(store_dir, STORE_INFO), 'r') as f:
+            n_buckets = json.load(f)['buckets']
+        filters.append(('bucket', 'in', sorted({locus_bucket(locus, n_buckets) for locus in loci})))
+        filters.append(('REPID', 'in', list(loci)))
+    if inrepeat_only:
+        filters.append(('category', 'in', ['SP', 'FL', 'IRRonly']))
+    read_columns = columns
+    if genes is not None and columns is not None and 'VARID' not in columns:
+        read_columns = list(columns) + ['VARID']
+    table = pq.read_table(store_dir, columns=read_columns, filters=filters or None,
+                          memory_map=True, partitioning='hive')
+    df = table.to_pandas()
+    if genes is not None:
+        df = df[df['VARID'].astype(str).str.startswith(tuple(genes))].reset_index(drop=True)
+        if read_columns is not columns:
+            df = df.drop(columns='VARID')
+    if 'bucket' in df.columns:
+        df = df.drop(columns='bucket')
+    if 'REPID' in df.columns:
+        df['REPID'] = df['REPID'].astype(str)
+    return df
+
+def read_loci(gene, gene_list):
+    """Collect the loci requested on the command line."""
+    if gene:
+        return {gene}
+    if gene_list:
+        with open(gene_list, 'r') as f:
+            return {line.strip() for line in f if line.strip()}
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a columnar store of ExpansionHunter genotypes')
+    parser.add_argument('--case-vcfs', nargs='*', default=[], help='EH VCF files of cases')
+    parser.add_argument('--control-vcfs', nargs='*', default=[], help='EH VCF files of controls')
+    parser.add_argument('--store-dir', required=True, help='Output directory of the Parquet store')
+    parser.add_argument('--gene', help='Only store records of this locus (REPID)')
+    parser.add_argument('--gene-list', help='Only store records of loci listed in this file, one per line')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes used to parse VCF files (default: 1)')
+    parser.add_argument('--buckets', type=int, default=DEFAULT_BUCKETS,
+                        help=f'Number of locus hash buckets (Parquet partitions) (default: {DEFAULT_BUCKETS})')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_eh_store', args, os.path.dirname(os.path.abspath(args.store_dir)))
+
+    if not args.case_vcfs and not args.control_vcfs:
+        parser.error("Provide at least one of --case-vcfs / --control-vcfs")
+
+    build_store(args.case_vcfs, args.control_vcfs, args.store_dir,
+                read_loci(args.gene, args.gene_list), args.workers, args.buckets)
+
+if __name__ == '__main__':
+    main()
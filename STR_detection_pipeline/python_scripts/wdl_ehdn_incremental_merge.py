@@ -0,0 +1,238 @@
+
+##############################################################################
+
+# Helper script for merging EHdn STR profiles incrementally. Each
+# str_profile.json is streamed into a persistent locus-keyed SQLite store,
+# so adding samples only reads the new (or changed) profiles. The
+# multisample profile for outlier.py / casecontrol.py is written from the
+# store in the same layout as `ExpansionHunterDenovo merge`.
+# Called by 3_EHdn_RunAnnotEHdn.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_ehdn_incremental_merge.py \
+  --manifest EHdn_manifest.tsv \
+  --store EHdn_profile_store.sqlite \
+  --output-prefix /path/to/SUBNAME
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+from wdl_metrics import add_metrics_args, setup_metrics
+
+# Anchored regions of different samples closer than this are reported as one region
+MERGE_DISTANCE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    sample TEXT PRIMARY KEY, status TEXT, profile TEXT,
+    mtime REAL, size INTEGER, depth REAL, read_length INTEGER
+);
+CREATE TABLE IF NOT EXISTS irr_pairs (
+    motif TEXT, sample TEXT, count INTEGER, PRIMARY KEY (motif, sample)
+);
+CREATE TABLE IF NOT EXISTS anchors (
+    motif TEXT, chrom TEXT, start INTEGER, end INTEGER, sample TEXT, count INTEGER
+);
+CREATE INDEX IF NOT EXISTS anchors_motif ON anchors (motif, chrom, start);
+CREATE INDEX IF NOT EXISTS anchors_sample ON anchors (sample);
+CREATE INDEX IF NOT EXISTS irr_pairs_sample ON irr_pairs (sample);
+"""
+
+def iter_profile_items(path, chunk_size=1 << 20):
+    """
+    Stream the top-level (key, value) pairs of a JSON object without loading the whole file.
+    Only one value (e.g. one motif of a profile) is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def skip(chars):
+            """Skip whitespace and any of the given separator characters."""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in chars):
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                fill()
+
+        def decode():
+            """Decode the next complete JSON value, reading more input when it is cut off."""
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A number cut off by the chunk boundary decodes early, so only accept
+                    # a value once the next delimiter has been read
+                    following = buffer[end:].lstrip()
+                    if eof or (following and following[0] in ',:}]'):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        skip('')
+        if buffer[pos:pos + 1] != '{':
+            raise ValueError(f"{path} is not a JSON object")
+        pos += 1
+        while True:
+            skip(',')
+            if pos >= len(buffer):
+                raise ValueError(f"{path} ended before the closing brace")
+            if buffer[pos] == '}':
+                return
+            key = decode()
+            skip(':')
+            yield key, decode()
+
+def parse_region(region):
+    """Split 'chr1:100-200' into ('chr1', 100, 200)."""
+    chrom, _, span = region.rpartition(':')
+    start, _, end = span.partition('-')
+    return chrom, int(start), int(end)
+
+def read_manifest(manifest_file):
+    """Manifest rows as (sample, status, profile path)."""
+    samples = []
+    with open(manifest_file, 'r') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 3 and fields[0]:
+                samples.append((fields[0], fields[1], fields[2]))
+    return samples
+
+def open_store(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_profile(conn, sample, status, profile):
+    """Replace one sample's rows in the store with the contents of its profile."""
+    conn.execute("DELETE FROM irr_pairs WHERE sample = ?", (sample,))
+    conn.execute("DELETE FROM anchors WHERE sample = ?", (sample,))
+
+    depth, read_length = None, None
+    for key, value in iter_profile_items(profile):
+        if key == 'Depth':
+            depth = value
+        elif key == 'ReadLength':
+            read_length = value
+        elif isinstance(value, dict):
+            if 'IrrPairCount' in value:
+                conn.execute("INSERT INTO irr_pairs VALUES (?, ?, ?)", (key, sample, value['IrrPairCount']))
+            conn.executemany(
+                "INSERT INTO anchors VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, *parse_region(region), sample, count)
+                 for region, count in value.get('RegionsWithIrrAnchors', {}).items())
+            )
+
+    stat = os.stat(profile)
+    conn.execute("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (sample, status, profile, stat.st_mtime, stat.st_size, depth, read_length))
+
+def update_store(conn, manifest):
+    """Load only the profiles that are new or changed since they were last stored."""
+    stored = {row[0]: row[1:] for row in conn.execute("SELECT sample, profile, mtime, size FROM samples")}
+    added = 0
+    for sample, status, profile in manifest:
+        stat = os.stat(profile)
+        if stored.get(sample) == (profile, stat.st_mtime, stat.st_size):
+            conn.execute("UPDATE samples SET status = ? WHERE sample = ?", (status, sample))
+            continue
+        print(f"Adding profile of {sample}")
+        load_profile(conn, sample, status, profile)
+        conn.commit()
+        added += 1
+    return added
+
+def merge_regions(rows, merge_distance):
+    """
+    Merge anchored regions of one motif (sorted by chrom, start) that lie within
+    merge_distance of each other, summing the counts of each sample.
+    """
+    merged = []
+    current = None
+    for chrom, start, end, sample, count in rows:
+        if current and chrom == current[0] and start <= current[2] + merge_distance:
+            current[2] = max(current[2], end)
+        else:
+            current = [chrom, start, end, {}]
+            merged.append(current)
+        current[3][sample] = current[3].get(sample, 0) + count
+    return {f"{chrom}:{start}-{end}": counts for chrom, start, end, counts in merged}
+
+def write_multisample_profile(conn, samples, output_file, merge_distance=MERGE_DISTANCE):
+    """Write the Counts / Parameters multisample profile for the given samples."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS active (sample TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM active")
+    conn.executemany("INSERT INTO active VALUES (?)", ((s,) for s in samples))
+
+    motifs = [row[0] for row in conn.execute(
+        "SELECT DISTINCT motif FROM irr_pairs JOIN active USING (sample) "
+        "UNION SELECT DISTINCT motif FROM anchors JOIN active USING (sample) ORDER BY 1"
+    )]
+    params = {'Depths': {}, 'ReadLengths': {}}
+    for sample, depth, read_length in conn.execute(
+            "SELECT sample, depth, read_length FROM samples JOIN active USING (sample)"):
+        params['Depths'][sample] = depth
+        params['ReadLengths'][sample] = read_length
+
+    # Written one motif at a time so the full cohort never has to be held in memory
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as out:
+        out.write('{"Counts": {')
+        for i, motif in enumerate(motifs):
+            irr_counts = dict(conn.execute(
+                "SELECT sample, count FROM irr_pairs JOIN active USING (sample) WHERE motif = ?", (motif,)))
+            rows = conn.execute(
+                "SELECT chrom, start, end, sample, count FROM anchors JOIN active USING (sample) "
+                "WHERE motif = ? ORDER BY chrom, start", (motif,))
+            entry = {'IrrPairCounts': irr_counts, 'RegionsWithIrrAnchors': merge_regions(rows, merge_distance)}
+            out.write(('' if i == 0 else ', ') + json.dumps(motif) + ': ' + json.dumps(entry))
+        out.write('}, "Parameters": ' + json.dumps(params) + '}')
+    os.replace(tmp_file, output_file)
+    return len(motifs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally merge EHdn STR profiles')
+    parser.add_argument('--manifest', required=True, help='EHdn manifest TSV (sample, case/control, profile)')
+    parser.add_argument('--store', required=True, help='Persistent SQLite profile store (created if missing)')
+    parser.add_argument('--output-prefix', required=True,
+                        help='Writes <prefix>.multisample_profile.json, as ExpansionHunterDenovo merge does')
+    parser.add_argument('--merge-distance', type=int, default=MERGE_DISTANCE,
+                        help=f'Merge anchored regions closer than this many bp (default: {MERGE_DISTANCE})')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_ehdn_incremental_merge', args, os.path.dirname(args.output_prefix))
+
+    manifest = read_manifest(args.manifest)
+    conn = open_store(args.store)
+    added = update_store(conn, manifest)
+    print(f"Added {added} new or changed profiles; {len(manifest) - added} already in the store")
+
+    output_file = f"{args.output_prefix}.multisample_profile.json"
+    n_motifs = write_multisample_profile(conn, [s for s, _, _ in manifest], output_file, args.merge_distance)
+    conn.close()
+    print(f"Wrote multisample profile for {len(manifest)} samples and {n_motifs} motifs to {output_file}")
+
+if __name__ == '__main__':
+    main()
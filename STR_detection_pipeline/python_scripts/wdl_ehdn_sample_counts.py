@@ -0,0 +1,119 @@
+
+##############################################################################
+
+# Helper functions for the long-format EHdn sample-count table.
+# EHdn `raw_data` / `caco_raw_data` strings (sample:count,...) are exploded
+# once into (locus_id, source, sample, count, is_case) rows, which are then
+# shared by wdl_filter_ehdn_results.py and wdl_combine_ehdn_eh.py.
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import numpy as np
+import pandas as pd
+from itertools import chain
+
+CASE_TAG = "PNRR"
+LOCUS_KEY_COLS = ['chr', 'start', 'end', 'motif']
+SAMPLE_COUNT_COLS = ['raw_data', 'caco_raw_data']
+
+def make_locus_id(data):
+    """
+    Build a chr:start-end:motif locus id for every row. Rows with a missing chr,
+    start, end or motif get a missing id, so they match no locus.
+    """
+    starts = pd.to_numeric(data['start'], errors='coerce')
+    ends = pd.to_numeric(data['end'], errors='coerce')
+    complete = (starts.notna() & ends.notna() &
+                data['chr'].notna().to_numpy() & data['motif'].notna().to_numpy())
+    ids = pd.Series(np.nan, index=data.index, dtype=object)
+    ids[complete] = (data['chr'][complete].astype(str) + ':' +
+                     starts[complete].astype('int64').astype(str) + '-' +
+                     ends[complete].astype('int64').astype(str) + ':' +
+                     data['motif'][complete].astype(str))
+    return ids
+
+def explode_sample_counts(data, column):
+    """
+    Explode one sample:count column into long format, one row per (locus, sample).
+    Rows without complete locus coordinates are skipped. A locus listed on several
+    rows (e.g. one per annotated gene) is taken from its first row; those rows carry
+    the same EHdn counts, and a warning is printed if they do not.
+    """
+    locus_ids = make_locus_id(data)
+    keep = locus_ids.notna() & data[column].notna()
+    locus_ids, values = locus_ids[keep], data[column][keep]
+    duplicated = locus_ids.duplicated(keep=False)
+    if duplicated.any():
+        n_values = values[duplicated].astype(str).groupby(locus_ids[duplicated]).nunique()
+        if (n_values > 1).any():
+            print(f"Warning: {(n_values > 1).sum()} loci have differing {column} values across rows, "
+                  f"using the first row of each")
+    first = ~locus_ids.duplicated(keep='first')
+    locus_ids, values = locus_ids[first], values[first]
+    item_lists = [str(value).split(',') for value in values]
+    items = [item.rpartition(':') for item in chain.from_iterable(item_lists)]
+    
+    samples = pd.Categorical([sample for sample, _, _ in items])
+    # Case/control status only needs to be derived once per distinct sample
+    case_categories = np.asarray(samples.categories.str.contains(CASE_TAG, regex=False), dtype=bool)
+    
+    long_data = pd.DataFrame({
+        'locus_id': np.repeat(locus_ids.to_numpy(), [len(lst) for lst in item_lists]),
+        'source': column,
+        'sample': samples,
+        'count': pd.to_numeric(pd.Series([count for _, _, count in items], dtype=object),
+                               errors='coerce').to_numpy(),
+        'is_case': case_categories[samples.codes] if len(samples) else np.zeros(0, dtype=bool)
+    })
+    return long_data[long_data['sample'] != '']
+
+def build_sample_count_table(data, columns=SAMPLE_COUNT_COLS):
+    """Build the typed long sample-count table from all available sample:count columns."""
+    tables = [explode_sample_counts(data, col) for col in columns if col in data.columns]
+    if tables:
+        table = pd.concat(tables, ignore_index=True)
+    else:
+        table = pd.DataFrame(columns=['locus_id', 'source', 'sample', 'count', 'is_case'])
+    return set_sample_count_dtypes(table)
+
+def set_sample_count_dtypes(table):
+    """Apply the typed schema: categorical ids, float counts, boolean case flag."""
+    return table.astype({
+        'locus_id': 'category',
+        'source': 'category',
+        'sample': 'category',
+        'count': 'float64',
+        'is_case': 'bool'
+    })
+
+def save_sample_counts(table, path):
+    """Save the sample-count table (Parquet if path ends with .parquet, otherwise CSV)."""
+    if path.endswith('.parquet'):
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+    print(f"Saved {len(table)} sample counts for {table['locus_id'].nunique()} loci to: {path}")
+
+def load_sample_counts(path):
+    """Load a saved sample-count table with its typed schema."""
+    if path.endswith('.parquet'):
+        table = pd.read_parquet(path)
+    else:
+        table = pd.read_csv(path, dtype={'locus_id': str, 'source': str, 'sample': str})
+    return set_sample_count_dtypes(table)
+
+def get_source_counts(table, source):
+    """Select the rows that came from one sample:count column."""
+    return table[table['source'] == source]
+
+def count_case_control_by_locus(table, source='caco_raw_data'):
+    """Count case and control entries per locus from the long table."""
+    counts = (get_source_counts(table, source)
+              .groupby(['locus_id', 'is_case'], observed=True).size()
+              .unstack(fill_value=0)
+              .reindex(columns=[True, False], fill_value=0))
+    counts.columns = ['case_count', 'control_count']
+    return counts
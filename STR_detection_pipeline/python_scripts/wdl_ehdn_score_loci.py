@@ -0,0 +1,231 @@
+
+##############################################################################
+
+# Helper script for scoring EHdn loci natively. The multisample profile is
+# loaded once into a sparse loci x samples matrix of depth-normalized
+# anchored IRR counts; outlier z-scores and case-control Mann-Whitney tests
+# are computed for all loci at once and written in the TSV schema of
+# EHdn's outlier.py / casecontrol.py (locus mode).
+# Called by 3_EHdn_RunAnnotEHdn.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_ehdn_score_loci.py \
+  --manifest EHdn_manifest.tsv \
+  --multisample-profile SUBNAME.multisample_profile.json \
+  --outlier-output outliers_locus.tsv \
+  --casecontrol-output casecontrol_locus.tsv \
+  [--merged-output merged_locus.tsv] \
+  [--compare-outlier ehdn_outliers_locus.tsv --compare-casecontrol ehdn_casecontrol_locus.tsv]
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import mannwhitneyu
+from wdl_metrics import add_metrics_args, setup_metrics
+
+# EHdn reports anchored IRR counts normalized to 40x coverage
+TARGET_DEPTH = 40
+# Cases whose z-score exceeds this are reported as high-count cases
+ZSCORE_CUTOFF = 1.0
+# Loci are densified in blocks of this many rows for the rank tests
+BLOCK_SIZE = 5000
+
+OUTLIER_COLUMNS = ['contig', 'start', 'end', 'motif', 'top_case_zscore', 'high_case_counts', 'counts']
+CASECONTROL_COLUMNS = ['contig', 'start', 'end', 'motif', 'pvalue', 'bonf_pvalue', 'counts']
+
+def load_manifest(manifest_file):
+    """Sample -> 'case' / 'control' from the EHdn manifest, in manifest order."""
+    manifest = pd.read_csv(manifest_file, sep='\t', header=None, usecols=[0, 1],
+                           names=['sample', 'status'], dtype=str)
+    return dict(zip(manifest['sample'], manifest['status']))
+
+def load_count_matrix(profile_file, samples):
+    """
+    Load anchored IRR counts of a multisample profile into a CSR matrix
+    (loci x samples), normalized to TARGET_DEPTH. Returns (loci table, matrix).
+    """
+    with open(profile_file, 'r') as f:
+        profile = json.load(f)
+
+    sample_index = {sample: i for i, sample in enumerate(samples)}
+    contigs, starts, ends, motifs = [], [], [], []
+    rows, cols, values = [], [], []
+    for motif, record in profile['Counts'].items():
+        for region, sample_counts in record.get('RegionsWithIrrAnchors', {}).items():
+            if region == 'unaligned':
+                continue
+            contig, _, span = region.rpartition(':')
+            start, _, end = span.partition('-')
+            locus = len(contigs)
+            contigs.append(contig)
+            starts.append(int(start))
+            ends.append(int(end))
+            motifs.append(motif)
+            for sample, count in sample_counts.items():
+                if sample in sample_index:
+                    rows.append(locus)
+                    cols.append(sample_index[sample])
+                    values.append(count)
+
+    depths = profile['Parameters']['Depths']
+    scale = np.array([TARGET_DEPTH / depths[sample] if depths.get(sample) else 0.0
+                      for sample in samples])
+    counts = sparse.csr_matrix(
+        (np.asarray(values, dtype=float) * scale[np.asarray(cols, dtype=int)], (rows, cols)),
+        shape=(len(contigs), len(samples))
+    )
+    loci = pd.DataFrame({'contig': contigs, 'start': starts, 'end': ends, 'motif': motifs})
+    return loci, counts
+
+def encode_counts(counts, samples, mask=None):
+    """Encode the non-zero entries of each CSR row as 'sample:count,...' strings."""
+    encoded = []
+    for i in range(counts.shape[0]):
+        lo, hi = counts.indptr[i], counts.indptr[i + 1]
+        idx, data = counts.indices[lo:hi], counts.data[lo:hi]
+        if mask is not None:
+            keep = np.isin(idx, mask.indices[mask.indptr[i]:mask.indptr[i + 1]])
+            idx, data = idx[keep], data[keep]
+        encoded.append(','.join(f"{samples[j]}:{v:.2f}" for j, v in zip(idx, data)))
+    return encoded
+
+def score_outliers(counts, is_case):
+    """
+    Z-scores of every case against the control distribution of each locus.
+    Returns the top case z-score per locus and a sparse mask of high-count cases.
+    """
+    controls = counts[:, ~is_case]
+    n_controls = max(controls.shape[1], 1)
+    mean = np.asarray(controls.sum(axis=1)).ravel() / n_controls
+    mean_sq = np.asarray(controls.multiply(controls).sum(axis=1)).ravel() / n_controls
+    std = np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
+    std[std == 0] = 1.0
+
+    cases = counts[:, is_case].tocsr()
+    case_cols = np.flatnonzero(is_case)
+    top_zscore = np.full(counts.shape[0], -np.inf)
+    high_rows, high_cols = [], []
+    for lo in range(0, counts.shape[0], BLOCK_SIZE):
+        block = cases[lo:lo + BLOCK_SIZE].toarray()
+        z = (block - mean[lo:lo + BLOCK_SIZE, None]) / std[lo:lo + BLOCK_SIZE, None]
+        if z.shape[1]:
+            top_zscore[lo:lo + BLOCK_SIZE] = z.max(axis=1)
+        r, c = np.nonzero((z > ZSCORE_CUTOFF) & (block > 0))
+        high_rows.append(lo + r)
+        high_cols.append(case_cols[c])
+    high_rows = np.concatenate(high_rows) if high_rows else np.zeros(0, dtype=int)
+    high_cols = np.concatenate(high_cols) if high_cols else np.zeros(0, dtype=int)
+    high = sparse.csr_matrix((np.ones(len(high_rows), dtype=bool), (high_rows, high_cols)), shape=counts.shape)
+    return top_zscore, high
+
+def score_casecontrol(counts, is_case):
+    """One-sided Mann-Whitney U test (cases > controls) per locus, with Bonferroni correction."""
+    pvalues = np.ones(counts.shape[0])
+    if is_case.any() and (~is_case).any():
+        for lo in range(0, counts.shape[0], BLOCK_SIZE):
+            block = counts[lo:lo + BLOCK_SIZE].toarray()
+            result = mannwhitneyu(block[:, is_case], block[:, ~is_case], axis=1,
+                                  alternative='greater', method='asymptotic')
+            pvalues[lo:lo + BLOCK_SIZE] = np.nan_to_num(result.pvalue, nan=1.0)
+    bonf = np.minimum(pvalues * len(pvalues), 1.0)
+    return pvalues, bonf
+
+def score_loci(manifest_file, profile_file):
+    """Compute the outlier and case-control tables from a multisample profile."""
+    status = load_manifest(manifest_file)
+    samples = list(status)
+    is_case = np.array([status[s] == 'case' for s in samples])
+    loci, counts = load_count_matrix(profile_file, samples)
+    print(f"Loaded {counts.shape[0]} loci x {counts.shape[1]} samples ({counts.nnz} non-zero counts)")
+
+    top_zscore, high = score_outliers(counts, is_case)
+    all_counts = encode_counts(counts, samples)
+    outliers = loci.assign(
+        top_case_zscore=np.round(top_zscore, 2),
+        high_case_counts=encode_counts(counts, samples, high),
+        counts=all_counts
+    )
+    # Like outlier.py, loci without any high-count case are not reported
+    outliers = outliers[outliers['high_case_counts'] != ''].sort_values(
+        'top_case_zscore', ascending=False, kind='stable')
+
+    pvalues, bonf = score_casecontrol(counts, is_case)
+    casecontrol = loci.assign(pvalue=pvalues, bonf_pvalue=bonf, counts=all_counts)
+    casecontrol = casecontrol.sort_values('pvalue', kind='stable')
+    return outliers[OUTLIER_COLUMNS], casecontrol[CASECONTROL_COLUMNS]
+
+def merge_scores(outliers, casecontrol):
+    """
+    One row per outlier locus with its case-control statistics, in the column order of
+    wdl_filter_ehdn_results.py --merged-locus once the annotation step has inserted
+    gene and region after motif.
+    """
+    keys = ['contig', 'start', 'end', 'motif']
+    merged = outliers.merge(casecontrol.rename(columns={'counts': 'caco_counts'}), on=keys, how='left')
+    return merged.rename(columns={'contig': 'chr', 'top_case_zscore': 'top_zscore',
+                                  'high_case_counts': 'raw_data', 'counts': 'all_counts',
+                                  'pvalue': 'p_val', 'bonf_pvalue': 'bonf_pval',
+                                  'caco_counts': 'caco_raw_data'})
+
+def compare_tables(ours, theirs_file, columns, value_cols, rtol=1e-3, atol=1e-2):
+    """Compare a native table with an EHdn TSV on shared loci and print a short report."""
+    keys = ['contig', 'start', 'end', 'motif']
+    theirs = pd.read_csv(theirs_file, sep='\t', header=0, names=columns)
+    joined = ours.merge(theirs, on=keys, how='outer', suffixes=('', '_ehdn'), indicator=True)
+    both = joined[joined['_merge'] == 'both']
+    print(f"Compared with {theirs_file}: {len(both)} shared loci, "
+          f"{(joined['_merge'] == 'left_only').sum()} native only, "
+          f"{(joined['_merge'] == 'right_only').sum()} EHdn only")
+    ok = len(both) == len(joined)
+    for col in value_cols:
+        close = np.isclose(both[col].astype(float), both[f'{col}_ehdn'].astype(float), rtol=rtol, atol=atol)
+        print(f"  {col}: {close.sum()}/{len(both)} within tolerance")
+        ok = ok and bool(close.all())
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Score EHdn loci (outlier and case-control) natively')
+    parser.add_argument('--manifest', required=True, help='EHdn manifest TSV')
+    parser.add_argument('--multisample-profile', required=True, help='EHdn multisample profile JSON')
+    parser.add_argument('--outlier-output', required=True, help='Outlier locus TSV (outlier.py schema)')
+    parser.add_argument('--casecontrol-output', required=True, help='Case-control locus TSV (casecontrol.py schema)')
+    parser.add_argument('--merged-output', help='Optional merged outlier + case-control table (TSV)')
+    parser.add_argument('--compare-outlier', help='EHdn outlier.py output to validate against')
+    parser.add_argument('--compare-casecontrol', help='EHdn casecontrol.py output to validate against')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_ehdn_score_loci', args, os.path.dirname(args.outlier_output))
+
+    outliers, casecontrol = score_loci(args.manifest, args.multisample_profile)
+    outliers.to_csv(args.outlier_output, sep='\t', index=False)
+    casecontrol.to_csv(args.casecontrol_output, sep='\t', index=False)
+    print(f"Wrote {len(outliers)} outlier loci to {args.outlier_output}")
+    print(f"Wrote {len(casecontrol)} case-control loci to {args.casecontrol_output}")
+
+    if args.merged_output:
+        merge_scores(outliers, casecontrol).to_csv(args.merged_output, sep='\t', index=False)
+        print(f"Wrote merged scores to {args.merged_output}")
+
+    matches = True
+    if args.compare_outlier:
+        matches &= compare_tables(outliers, args.compare_outlier, OUTLIER_COLUMNS, ['top_case_zscore'])
+    if args.compare_casecontrol:
+        matches &= compare_tables(casecontrol, args.compare_casecontrol, CASECONTROL_COLUMNS,
+                                  ['pvalue', 'bonf_pvalue'])
+    if not matches:
+        print("Error: native scores differ from EHdn output")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -27,8 +27,11 @@ python vcf_processor.py \
 import sys
 import os
 import csv
-import pandas as pd
+import tempfile
 import argparse
+from functools import partial
+from multiprocessing import Pool
+from wdl_metrics import add_metrics_args, setup_metrics
 
 def read_gene_list(gene_csv):
     """Read gene names from a CSV file, one gene per line."""
@@ -40,53 +43,72 @@ def read_gene_list(gene_csv):
                 genes.append(gene)
     return genes
 
-def process_vcf_file_for_gene(vcf_path, gene_name):
-    """Process a single VCF file for a specific gene and categorize results."""
-    results = {'IRRonly': [], 'SP': [], 'FL': [], 'ALL': []}
+def parse_varid(info):
+    """Extract the VARID value from a VCF INFO string."""
+    for item in info.split(';'):
+        if item.startswith('VARID='):
+            return item[len('VARID='):]
+    return None
+
+def process_vcf_file(vcf_path, gene_list):
+    """
+    Read a single VCF file once and dispatch its INREPEAT records to every requested gene.
+    Returns {gene_index: [(category, record), ...]} in file order.
+    """
+    results = {}
     sample_id = os.path.basename(vcf_path).replace('.vcf', '')
+    # A record belongs to a gene if "VARID=<gene>" occurs in INFO, i.e. VARID starts with the gene name
+    varid_genes = {}
     
     with open(vcf_path, 'r') as vcf_file:
         for line in vcf_file:
             if not line.startswith('#') and 'INREPEAT' in line:
                 fields = line.strip().split('\t')
-                chrom = fields[0]
                 info = fields[7]
+                varid = parse_varid(info)
+                if varid is None:
+                    continue
+                
+                gene_indices = varid_genes.get(varid)
+                if gene_indices is None:
+                    gene_indices = [i for i, gene in enumerate(gene_list) if varid.startswith(gene)]
+                    varid_genes[varid] = gene_indices
+                if not gene_indices:
+                    continue
                 
-                if f"VARID={gene_name}" in info:
-                    pos = fields[1]
-                    id_ = fields[2]
-                    ref = fields[3]
-                    alt = fields[4]
-                    format_ = fields[8]
-                    sample_data = fields[9]
-                    
-                    record = [sample_id, chrom, pos, id_, ref, alt, info, format_, sample_data]
-                    results['ALL'].append(record)
-
-                    if 'SPANNING' in line:
-                        results['SP'].append(record)
-                    elif 'FLANKING' in line:
-                        results['FL'].append(record)
-                    else:
-                        results['IRRonly'].append(record)
+                record = [sample_id, fields[0], fields[1], fields[2], fields[3], fields[4],
+                          info, fields[8], fields[9]]
+                if 'SPANNING' in line:
+                    category = 'SP'
+                elif 'FLANKING' in line:
+                    category = 'FL'
+                else:
+                    category = 'IRRonly'
+                
+                for gene_index in gene_indices:
+                    results.setdefault(gene_index, []).append((category, record))
     
     return results
 
-def combine_vcfs(vcf_files, output_prefix, gene_list):
+def scan_vcf_files(vcf_files, gene_list, workers=1):
+    """Yield per-file results in input order, reading files in parallel when workers > 1."""
+    scan = partial(process_vcf_file, gene_list=gene_list)
+    if workers > 1:
+        with Pool(workers) as pool:
+            yield from pool.imap(scan, vcf_files, chunksize=8)
+    else:
+        yield from map(scan, vcf_files)
+
+def combine_vcfs(vcf_files, output_prefix, gene_list, workers=1):
     """Combine multiple VCF files and generate three categorized output files."""
     header = ['SampleID', 'CHROM', 'POS', 'ID', 'REF', 'ALT', 'INFO', 'FORMAT', 'VARIANTS']
     
-    all_results = {'IRRonly': [], 'SP': [], 'FL': [], 'ALL': []}
-    
-    for gene_name in gene_list:
-        print(f"Processing gene: {gene_name}")
-        for vcf_file in vcf_files:
-            if os.path.exists(vcf_file):
-                results = process_vcf_file_for_gene(vcf_file, gene_name)
-                for category in all_results:
-                    all_results[category].extend(results[category])
-            else:
-                print(f"Warning: VCF file not found: {vcf_file}")
+    existing_files = []
+    for vcf_file in vcf_files:
+        if os.path.exists(vcf_file):
+            existing_files.append(vcf_file)
+        else:
+            print(f"Warning: VCF file not found: {vcf_file}")
     
     output_files = {
         'IRRonly': f"{output_prefix}_IRRonly.csv",
@@ -95,14 +117,35 @@ def combine_vcfs(vcf_files, output_prefix, gene_list):
         'ALL': f"{output_prefix}.csv"
     }
     
-    for category, filename in output_files.items():
-        if os.path.exists(filename):
-            os.remove(filename)
+    print(f"Scanning {len(existing_files)} VCF files for {len(gene_list)} genes with {workers} worker(s)")
+    spool_dir = os.path.dirname(os.path.abspath(output_prefix))
+    with tempfile.TemporaryDirectory(dir=spool_dir, prefix='.eh_spool_') as tmp_dir:
+        # Records are spooled per gene as they arrive, so output keeps the gene-major order
+        spool_paths = [os.path.join(tmp_dir, f"gene_{i}.csv") for i in range(len(gene_list))]
+        spool_files = [open(path, 'w', newline='') for path in spool_paths]
+        spool_writers = [csv.writer(f) for f in spool_files]
+        try:
+            for n_done, results in enumerate(scan_vcf_files(existing_files, gene_list, workers), 1):
+                for gene_index, records in results.items():
+                    spool_writers[gene_index].writerows([category] + record for category, record in records)
+                if n_done % 500 == 0:
+                    print(f"  Scanned {n_done}/{len(existing_files)} VCF files")
+        finally:
+            for f in spool_files:
+                f.close()
         
-        with open(filename, 'w', newline='') as out_file:
-            writer = csv.writer(out_file)
-            writer.writerow(header)
-            writer.writerows(all_results[category])
+        for category, filename in output_files.items():
+            if os.path.exists(filename):
+                os.remove(filename)
+            
+            with open(filename, 'w', newline='') as out_file:
+                writer = csv.writer(out_file)
+                writer.writerow(header)
+                for spool_path in spool_paths:
+                    with open(spool_path, 'r', newline='') as spool:
+                        for row in csv.reader(spool):
+                            if category == 'ALL' or row[0] == category:
+                                writer.writerow(row[1:])
     
     return output_files
 
@@ -113,13 +156,18 @@ def main():
     parser.add_argument('--vcf-files', required=True, nargs='+',
                       help='One or more VCF files to process')
     
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Number of worker processes used to scan VCF files (default: 1)')
+    
     gene_group = parser.add_mutually_exclusive_group(required=True)
     gene_group.add_argument('--gene',
                           help='Single gene name to process')
     gene_group.add_argument('--gene-list',
                           help='CSV file with gene names, one per line')
 
+    add_metrics_args(parser)
     args = parser.parse_args()
+    setup_metrics('wdl_filter_eh_vcfs', args, os.path.dirname(args.output_prefix))
 
     if not args.vcf_files:
         print("Error: No VCF files provided")
@@ -134,7 +182,7 @@ def main():
         if not gene_list:
             parser.error("No genes found in the provided CSV file")
     
-    output_files = combine_vcfs(args.vcf_files, args.output_prefix, gene_list)
+    output_files = combine_vcfs(args.vcf_files, args.output_prefix, gene_list, args.workers)
     
     print("VCF processing completed. Output files created:")
     for category, filename in output_files.items():
@@ -14,41 +14,123 @@ import sys
 import numpy as np
 import pandas as pd
 import argparse
+import resource
+from functools import lru_cache
+from pandas.api.types import union_categoricals
 from scipy.stats import fisher_exact
+from wdl_metrics import add_metrics_args, setup_metrics
+from wdl_ehdn_sample_counts import (
+    make_locus_id, build_sample_count_table, save_sample_counts, count_case_control_by_locus
+)
 
-def compute_fisher_pvalue(caco_raw_data, case_total, control_total):
+OTL_COLUMNS = ['chr', 'start', 'end', 'motif', 'gene', 'region', 
+               'top_zscore', 'raw_data', 'all_counts']
+CACO_COLUMNS = ['chr', 'start', 'end', 'motif', 'gene', 'region', 
+                'p_val', 'bonf_pval', 'caco_raw_data']
+# Annotated wdl_ehdn_score_loci.py --merged-output: outlier loci with their case-control columns
+MERGED_COLUMNS = OTL_COLUMNS + ['p_val', 'bonf_pval', 'caco_raw_data']
+MERGE_KEYS = ['chr', 'start', 'end', 'motif', 'gene', 'region']
+CATEGORICAL_COLS = ['chr', 'motif', 'gene', 'region']
+
+@lru_cache(maxsize=None)
+def fisher_pvalue(case_count, control_count, case_total, control_total):
     """
-    Compute Fisher's exact test p-value for case-control comparison.
+    Fisher's exact test p-value for a single (case_count, control_count) pair.
+    Cached, since case/control totals are fixed for a run and many loci share counts.
     """
-    case_count = sum("PNRR" in item for item in caco_raw_data.split(','))
-    control_count = len(caco_raw_data.split(',')) - case_count
     table = [[case_count, control_count], 
              [case_total - case_count, control_total - control_count]]
     _, p_value = fisher_exact(table)
     return p_value
 
+def add_fisher_pvalues(in_data, sample_counts, case_total, control_total):
+    """Attach Fisher's exact test p-values, testing each distinct count pair only once."""
+    counts = count_case_control_by_locus(sample_counts).reindex(
+        make_locus_id(in_data).to_numpy(), fill_value=0)
+    pairs = list(zip(counts['case_count'].tolist(), counts['control_count'].tolist()))
+    pair_pvals = {pair: fisher_pvalue(*pair, case_total, control_total) for pair in set(pairs)}
+    
+    in_data['fisher_p_value'] = [pair_pvals[pair] for pair in pairs]
+    print(f"Computed Fisher's exact test for {len(pair_pvals)} distinct count pairs "
+          f"across {len(in_data)} loci.")
+    return in_data
+
 def read_exdn_otl(otl_data_path):
     unfiltered = pd.read_csv(otl_data_path, sep='\t', header=0, 
-                            names=['chr', 'start', 'end', 'motif', 'gene', 'region', 
-                                  'top_zscore', 'raw_data', 'all_counts'])
+                            names=OTL_COLUMNS)
     print(f"EXDN initial output count: {len(unfiltered)}.")
     return unfiltered
 
 def merge_exdn_caco_output(otl_data, exdn_caco_path):
     exdn_caco_out = pd.read_csv(exdn_caco_path, sep='\t', header=0, 
-                               names=['chr', 'start', 'end', 'motif', 'gene', 'region', 
-                                     'p_val', 'bonf_pval', 'caco_raw_data'])
+                               names=CACO_COLUMNS)
     exdn_caco_out['chr'] = exdn_caco_out['chr'].str[3:]
     exdn_caco_out = exdn_caco_out[
         (exdn_caco_out['chr'].str.isnumeric()) | 
         (exdn_caco_out['chr'].isin(['X', 'Y']))
     ].copy()
     
-    merged = otl_data.merge(exdn_caco_out, on=['chr', 'start', 'end', 'motif', 'gene', 'region'])
+    merged = otl_data.merge(exdn_caco_out, on=MERGE_KEYS)
     merged = merged.dropna(subset=['caco_raw_data'])
     print(f"Counts after incorporating controls: {len(merged)}.")
     return merged
 
+def drop_loci_without_caco(merged):
+    """Keep merged loci that have case-control statistics, like the join in merge_exdn_caco_output."""
+    merged = merged.dropna(subset=['caco_raw_data']).reset_index(drop=True)
+    print(f"Counts after incorporating controls: {len(merged)}.")
+    return merged
+
+def read_exdn_table_chunked(data_path, names, chunksize, min_motif_len=None, max_motif_len=None):
+    """
+    Read an EHdn TSV in chunks for low-memory mode. Chromosome and motif-length filters
+    are applied per chunk, and chr/motif/gene/region are kept as categoricals.
+    """
+    chunks = []
+    total_count = 0
+    reader = pd.read_csv(data_path, sep='\t', header=0, names=names, chunksize=chunksize,
+                         dtype={col: str for col in CATEGORICAL_COLS})
+    for chunk in reader:
+        total_count += len(chunk)
+        chunk['chr'] = chunk['chr'].str[3:]
+        keep = chunk['chr'].str.isnumeric().fillna(False) | chunk['chr'].isin(['X', 'Y'])
+        if min_motif_len is not None and max_motif_len is not None:
+            motif_len = chunk['motif'].str.len()
+            keep &= (motif_len >= min_motif_len) & (motif_len <= max_motif_len)
+        chunk = chunk[keep]
+        chunks.append(chunk.astype({col: 'category' for col in CATEGORICAL_COLS}))
+    
+    if not chunks:
+        return pd.DataFrame(columns=names)
+    # Unify categories across chunks so the concatenated columns stay categorical
+    categoricals = {col: union_categoricals([chunk[col] for chunk in chunks]) for col in CATEGORICAL_COLS}
+    data = pd.concat([chunk.drop(columns=CATEGORICAL_COLS) for chunk in chunks], ignore_index=True)
+    for col, values in categoricals.items():
+        data[col] = values
+    data = data[names]
+    print(f"EXDN initial output count: {total_count}; kept after chromosome/motif filtering: {len(data)}.")
+    return data
+
+def join_exdn_caco_output(otl_data, exdn_caco_path, chunksize, min_motif_len, max_motif_len):
+    """Low-memory counterpart of merge_exdn_caco_output using a keyed join on shared categories."""
+    exdn_caco_out = read_exdn_table_chunked(
+        exdn_caco_path, CACO_COLUMNS, chunksize, min_motif_len, max_motif_len
+    ).dropna(subset=['caco_raw_data'])
+    
+    # Recode case-control categoricals to the outlier categories; anything outside them can't match
+    for col in CATEGORICAL_COLS:
+        exdn_caco_out[col] = exdn_caco_out[col].cat.set_categories(otl_data[col].cat.categories)
+    caco_values = exdn_caco_out.set_index(MERGE_KEYS)[['p_val', 'bonf_pval', 'caco_raw_data']]
+    
+    merged = otl_data.join(caco_values, on=MERGE_KEYS, how='inner').reset_index(drop=True)
+    print(f"Counts after incorporating controls: {len(merged)}.")
+    return merged
+
+def report_peak_rss():
+    """Print the peak resident set size of this process."""
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"Peak RSS: {peak_kb / 1024:.1f} MB")
+
 def filter_chromosomes(in_file):
     in_file['chr'] = in_file['chr'].str[3:]
     out_file = in_file[
@@ -76,23 +158,27 @@ def normalize_motif(motif):
     
     return get_cyclic_permutations(motif) | get_cyclic_permutations(reverse_complement(motif))
 
-def extract_genes(gene_str):
-    """Extract clean gene names from gene string."""
-    extracted = []
-    genes = gene_str.split(',')
-    for g in genes:
-        ext_g = g.split('(')[0]
-        extracted.append(ext_g)
-    return extracted
+def explode_genes(gene_col):
+    """Parse gene strings once into one clean gene name per row, indexed by locus row."""
+    genes = gene_col.astype(str).str.split(',').explode()
+    return genes.str.split('(').str[0]
 
-def gene_in_list(gene_str, gene_list):
-    """Check if any gene from the gene string is in gene list."""
-    extracted = extract_genes(gene_str)
-    return any(gene in gene_list for gene in extracted)
+def build_gene_index(gene_list_files):
+    """Build an inverted gene -> list-membership bitmask index (bit i = i-th gene list)."""
+    gene_index = {}
+    for bit, gene_file in enumerate(gene_list_files):
+        for gene in pd.read_csv(gene_file, header=None)[0].astype(str):
+            gene_index[gene] = gene_index.get(gene, 0) | (1 << bit)
+    return gene_index
 
-def filter_genes(in_data, gene_list):
-    """Filter data to include only genes in the provided list."""
-    return in_data[in_data['gene'].apply(lambda x: gene_in_list(x, gene_list))]
+def compute_gene_list_membership(in_data, gene_index, n_lists):
+    """Compute the gene-list membership bitmask of every locus in one pass."""
+    gene_masks = explode_genes(in_data['gene']).map(gene_index).fillna(0).astype(np.int64)
+    membership = pd.Series(0, index=in_data.index, dtype=np.int64)
+    for bit in range(n_lists):
+        in_list = ((gene_masks & (1 << bit)) != 0).groupby(level=0).any()
+        membership |= in_list.reindex(in_data.index, fill_value=False).astype(np.int64) * (1 << bit)
+    return membership
 
 def annotate_with_repeatmasker(output_data, repeat_masker_path):
     repeatmasker_data = pd.read_csv(repeat_masker_path, sep='\t', header=None, 
@@ -136,29 +222,38 @@ def annotate_with_repeatmasker(output_data, repeat_masker_path):
     print(f"Counts after RepeatMasker annotation: {len(output_data)}")
     return output_data
 
-def filter_by_gene_list(out_data, gene_file, case_total, control_total, save_path):
-    """Filter and save results for a specific gene list."""
-    gene_list = pd.read_csv(gene_file, header=None)[0].tolist()
-    gene_list_name = os.path.splitext(os.path.basename(gene_file))[0]
+def save_gene_list_results(out_data, gene_list_files, save_path, output_file):
+    """Write every per-gene-list CSV and the combined file from a single membership pass."""
+    gene_index = build_gene_index(gene_list_files)
+    membership = compute_gene_list_membership(out_data, gene_index, len(gene_list_files))
     
-    filtered = filter_genes(out_data, gene_list)
-    # Add Fisher's exact test p-values
-    filtered['fisher_p_value'] = filtered['caco_raw_data'].apply(
-        lambda x: compute_fisher_pvalue(x, case_total, control_total)
-    )
+    output_files = []
+    for bit, gene_file in enumerate(gene_list_files):
+        gene_list_name = os.path.splitext(os.path.basename(gene_file))[0]
+        filtered = out_data[(membership & (1 << bit)) != 0]
+        
+        list_output = f'{save_path}/{gene_list_name}.csv'
+        filtered.to_csv(list_output, index=False)
+        output_files.append(list_output)
+        print(f"Saved results for {gene_list_name} (bit {bit}): {len(filtered)} entries")
     
-    output_file = f'{save_path}/{gene_list_name}.csv'
-    filtered.to_csv(output_file, index=False)
-    print(f"Saved results for {gene_list_name}: {len(filtered)} entries")
-    return output_file, filtered
+    combined_results = out_data[membership != 0].copy()
+    combined_results['gene_list_membership'] = membership[membership != 0]
+    combined_results = combined_results.reset_index(drop=True)
+    combined_results.to_csv(output_file, index=False)
+    print(f"\nSaved combined results to: {output_file}")
+    return output_files, combined_results
 
 def main():
     ## 1212 new ver. ##
     parser = argparse.ArgumentParser(description='Combine and filter EHDN results')
-    parser.add_argument('--outlier-locus', required=True,
+    parser.add_argument('--outlier-locus',
                       help='Path to EHdn outlier locus file')
-    parser.add_argument('--casecontrol-locus', required=True,
+    parser.add_argument('--casecontrol-locus',
                       help='Path to EHdn case-control locus file')
+    parser.add_argument('--merged-locus',
+                      help='Annotated merged outlier + case-control table (wdl_ehdn_score_loci.py '
+                           '--merged-output), instead of --outlier-locus and --casecontrol-locus')
     parser.add_argument('--output-dir', required=True,
                         help='Output directory for individual gene list files')
     parser.add_argument('--output-file', required=True,
@@ -171,8 +266,19 @@ def main():
                       help='Total number of controls')
     parser.add_argument('--gene-list-files', required=True,
                       help='Comma-separated list of gene list files')
+    parser.add_argument('--low-memory', action='store_true',
+                      help='Read EHdn tables in chunks with categorical columns and filters pushed into the reader')
+    parser.add_argument('--chunksize', type=int, default=200000,
+                      help='Rows per chunk in low-memory mode (default: 200000)')
+    parser.add_argument('--sample-counts-file',
+                      help='Optional path to save the long-format sample-count table (.parquet or .csv[.gz])')
+
+    add_metrics_args(parser)
 
     args = parser.parse_args()
+    if not args.merged_locus and not (args.outlier_locus and args.casecontrol_locus):
+        parser.error("Provide --merged-locus, or both --outlier-locus and --casecontrol-locus")
+    metrics = setup_metrics('wdl_filter_ehdn_results', args, os.path.dirname(args.output_file))
     gene_list_files = args.gene_list_files.split(',')
     
     
@@ -181,41 +287,75 @@ def main():
 
 
     # Process data
-    print("Reading EXDN outlier data...")
-    otl_data = read_exdn_otl(args.outlier_locus)
-    
-    print("Filtering chromosomes...")
-    filtered_data = filter_chromosomes(otl_data)
-    
-    print("Filtering motif lengths...")
-    filtered_data = filter_motif_lengths(filtered_data, motif_len_min, motif_len_max)
-    
-    print("Merging with case-control data...")
-    merged_data = merge_exdn_caco_output(filtered_data, args.casecontrol_locus)
+    with metrics.stage('load_ehdn_tables') as stage:
+        if args.merged_locus and args.low_memory:
+            print("Reading merged EXDN data in chunks (low-memory mode)...")
+            merged_data = drop_loci_without_caco(read_exdn_table_chunked(
+                args.merged_locus, MERGED_COLUMNS, args.chunksize, motif_len_min, motif_len_max
+            ))
+        elif args.merged_locus:
+            print("Reading merged EXDN data...")
+            merged_data = pd.read_csv(args.merged_locus, sep='\t', header=0, names=MERGED_COLUMNS)
+            print(f"EXDN initial output count: {len(merged_data)}.")
+
+            print("Filtering chromosomes...")
+            merged_data = filter_chromosomes(merged_data)
+
+            print("Filtering motif lengths...")
+            merged_data = drop_loci_without_caco(
+                filter_motif_lengths(merged_data, motif_len_min, motif_len_max))
+        elif args.low_memory:
+            print("Reading EXDN outlier data in chunks (low-memory mode)...")
+            filtered_data = read_exdn_table_chunked(
+                args.outlier_locus, OTL_COLUMNS, args.chunksize, motif_len_min, motif_len_max
+            )
+            
+            print("Joining with case-control data...")
+            merged_data = join_exdn_caco_output(
+                filtered_data, args.casecontrol_locus, args.chunksize, motif_len_min, motif_len_max
+            )
+        else:
+            print("Reading EXDN outlier data...")
+            otl_data = read_exdn_otl(args.outlier_locus)
+            
+            print("Filtering chromosomes...")
+            filtered_data = filter_chromosomes(otl_data)
+            
+            print("Filtering motif lengths...")
+            filtered_data = filter_motif_lengths(filtered_data, motif_len_min, motif_len_max)
+            
+            print("Merging with case-control data...")
+            merged_data = merge_exdn_caco_output(filtered_data, args.casecontrol_locus)
+        stage.rows = len(merged_data)
     
     print("Annotating with RepeatMasker...")
-    annotated_data = annotate_with_repeatmasker(merged_data, args.repeatmasker_file)
+    with metrics.stage('annotate_repeatmasker') as stage:
+        annotated_data = annotate_with_repeatmasker(merged_data, args.repeatmasker_file)
+        stage.rows = len(annotated_data)
 
-    # Process each gene list
-    output_files = []
-    all_dfs = []
-    for gene_file in gene_list_files:
-        print(f"\nProcessing gene list: {gene_file}")
-        output_file, df = filter_by_gene_list(
-            annotated_data, gene_file, args.case_count, args.control_count, args.output_dir
-        )
-        output_files.append(output_file)
-        all_dfs.append(df)
+    # Parse sample:count strings once; downstream steps read this table
+    print("Building long-format sample-count table...")
+    with metrics.stage('sample_counts') as stage:
+        sample_counts = build_sample_count_table(annotated_data)
+        if args.sample_counts_file:
+            save_sample_counts(sample_counts, args.sample_counts_file)
+        stage.rows = len(sample_counts)
 
-    combined_results = pd.concat(all_dfs).drop_duplicates().reset_index(drop=True)
+    # Fisher's exact test p-values only depend on per-locus counts, so compute them once
+    print("Computing Fisher's exact test p-values...")
+    with metrics.stage('fisher_pvalues') as stage:
+        annotated_data = add_fisher_pvalues(
+            annotated_data, sample_counts, args.case_count, args.control_count
+        )
+        stage.rows = len(annotated_data)
 
-    # Save combined results
-    # combined_output = f'{args.output_dir}/EHdn_combined_results.csv'
-    # combined_results.to_csv(combined_output, index=False)
-    # print(f"\nSaved combined results to: {combined_output}")
-    combined_results.to_csv(args.output_file, index=False)
-    print(f"\nSaved combined results to: {args.output_file}")
+    # Process all gene lists in one pass
+    print(f"\nProcessing gene lists: {', '.join(gene_list_files)}")
+    with metrics.stage('gene_lists') as stage:
+        save_gene_list_results(annotated_data, gene_list_files, args.output_dir, args.output_file)
+        stage.rows = len(annotated_data)
 
+    report_peak_rss()
     print("\nAll processing complete!")
 
 if __name__ == '__main__':
@@ -0,0 +1,98 @@
+
+##############################################################################
+
+# Helper script for merging per-shard ExpansionHunter outputs of one sample
+# back into the single per-sample VCF (and JSON) expected by
+# wdl_filter_eh_vcfs.py.
+# Called by 4_EH_RunEH.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_merge_eh_shards.py \
+  --shard-vcfs sample.shard1.vcf sample.shard2.vcf \
+  --output-vcf sample.vcf \
+  [--shard-jsons sample.shard1.json sample.shard2.json --output-json sample.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+from wdl_metrics import add_metrics_args, setup_metrics
+
+def merge_shard_vcfs(shard_vcfs, output_vcf):
+    """
+    Concatenate shard VCF records in shard order. Meta-information lines are merged
+    (e.g. the ##ALT allele lines differ between shards), keeping first-seen order.
+    """
+    meta_lines = {}
+    column_header = None
+    records = []
+
+    for vcf in shard_vcfs:
+        with open(vcf, 'r') as f:
+            for line in f:
+                if line.startswith('##'):
+                    meta_lines.setdefault(line, None)
+                elif line.startswith('#'):
+                    if column_header is None:
+                        column_header = line
+                    elif line != column_header:
+                        raise ValueError(f"Sample columns of {vcf} do not match the other shards")
+                elif line.strip():
+                    records.append(line if line.endswith('\n') else line + '\n')
+
+    if column_header is None:
+        raise ValueError("No #CHROM header line found in shard VCFs")
+
+    # Write to a temporary file first so a partial merge never looks like a finished sample
+    tmp_vcf = output_vcf + '.tmp'
+    with open(tmp_vcf, 'w') as out:
+        out.writelines(meta_lines)
+        out.write(column_header)
+        out.writelines(records)
+    os.replace(tmp_vcf, output_vcf)
+    return len(records)
+
+def merge_shard_jsons(shard_jsons, output_json):
+    """Merge per-shard EH JSON outputs by combining their LocusResults."""
+    merged = None
+    for path in shard_jsons:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if merged is None:
+            merged = data
+        else:
+            merged.setdefault('LocusResults', {}).update(data.get('LocusResults', {}))
+
+    with open(output_json, 'w') as out:
+        json.dump(merged, out, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge per-shard ExpansionHunter outputs of one sample')
+    parser.add_argument('--shard-vcfs', nargs='+', required=True, help='Shard VCF files, in shard order')
+    parser.add_argument('--output-vcf', required=True, help='Merged per-sample VCF')
+    parser.add_argument('--shard-jsons', nargs='*', default=[], help='Optional shard JSON files')
+    parser.add_argument('--output-json', help='Merged per-sample JSON (with --shard-jsons)')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_merge_eh_shards', args, os.path.dirname(args.output_vcf))
+
+    missing = [f for f in args.shard_vcfs + args.shard_jsons if not os.path.exists(f)]
+    if missing:
+        print(f"Error: Missing shard outputs: {', '.join(missing)}")
+        sys.exit(1)
+
+    n_records = merge_shard_vcfs(args.shard_vcfs, args.output_vcf)
+    print(f"Merged {n_records} records from {len(args.shard_vcfs)} shards into {args.output_vcf}")
+
+    if args.shard_jsons and args.output_json:
+        merge_shard_jsons(args.shard_jsons, args.output_json)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+
+##############################################################################
+
+# Shared instrumentation for the helper scripts: per-stage timers, counters,
+# peak memory and rows/second written as JSON Lines to a metrics file, a
+# quiet switch for per-sample debug output, and optional profiling.
+# Settings come from the script arguments (add_metrics_args) or, so that the
+# bash steps need no changes, from the environment:
+#   STR_METRICS_FILE=<path>       append stage records to this file
+#   STR_QUIET=1                   silence per-sample debug output
+#   STR_PROFILE=cprofile|sample   profile the script; cProfile writes
+#                                 <script>.<pid>.prof, the sampling profiler
+#                                 writes collapsed stacks <script>.<pid>.folded
+#                                 (flamegraph.pl / speedscope) next to the outputs
+#   STR_PROFILE_DIR=<dir>         write profiles here instead
+# Used by the wdl_*.py helper scripts and wdl_profile.py
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+from wdl_metrics import add_metrics_args, setup_metrics, debug
+
+add_metrics_args(parser)
+args = parser.parse_args()
+metrics = setup_metrics('wdl_query_STR_db', args, output_dir=os.path.dirname(args.output_file))
+with metrics.stage('query_sequences') as stage:
+    for sample in samples:
+        debug(f"Debug: ...")
+        stage.rows += 1
+        stage.count('reads_above_threshold', n)
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import resource
+from collections import Counter
+from contextlib import contextmanager
+
+QUIET = os.environ.get('STR_QUIET', '0') == '1'
+SAMPLE_INTERVAL = 0.005
+
+def debug_enabled():
+    """False when per-sample debug output is silenced (skip work done only for it)."""
+    return not QUIET
+
+def debug(message):
+    """Print per-sample debug output unless the quiet switch is on."""
+    if not QUIET:
+        print(message)
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+class Stage:
+    """Rows and counters of one timed stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.counters = Counter()
+
+    def count(self, key, n=1):
+        self.counters[key] += n
+
+class Metrics:
+    """Collects stage records of one script run and appends them to the metrics file."""
+
+    def __init__(self, script, metrics_file=None):
+        self.script = script
+        self.metrics_file = metrics_file
+        self.start = time.perf_counter()
+        self.cpu_start = cpu_seconds()
+        self.closed = False
+
+    def emit(self, record):
+        if not self.metrics_file:
+            return
+        record = {'script': self.script, 'pid': os.getpid(), 'time': round(time.time(), 3), **record}
+        with open(self.metrics_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; set stage.rows to the records it handled for rows/second."""
+        stage = Stage(name)
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - start
+            self.emit({
+                'stage': name,
+                'wall_s': round(wall, 4),
+                'cpu_s': round(cpu_seconds() - cpu_start, 4),
+                'rows': stage.rows,
+                'rows_per_s': round(stage.rows / wall, 1) if wall > 0 else None,
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+                'counters': dict(stage.counters),
+            })
+
+    def close(self):
+        """Write the whole-script record (called at exit)."""
+        if self.closed:
+            return
+        self.closed = True
+        self.emit({
+            'stage': 'total',
+            'wall_s': round(time.perf_counter() - self.start, 4),
+            'cpu_s': round(cpu_seconds() - self.cpu_start, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        })
+
+def add_metrics_args(parser):
+    """Add --metrics-file and --quiet (defaults from STR_METRICS_FILE / STR_QUIET)."""
+    parser.add_argument('--metrics-file', default=os.environ.get('STR_METRICS_FILE'),
+                        help='Append per-stage metrics as JSON Lines to this file (default: $STR_METRICS_FILE)')
+    parser.add_argument('--quiet', action='store_true', default=QUIET,
+                        help='Silence per-sample debug output (default: $STR_QUIET=1)')
+
+def profile_path(script, output_dir, suffix):
+    directory = os.environ.get('STR_PROFILE_DIR') or output_dir or '.'
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{script}.{os.getpid()}.{suffix}")
+
+def start_cprofile(script, output_dir):
+    import cProfile
+    profiler = cProfile.Profile()
+    path = profile_path(script, output_dir, 'prof')
+
+    def save():
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"cProfile written to {path}", file=sys.stderr)
+
+    profiler.enable()
+    atexit.register(save)
+
+def start_sampling(script, output_dir):
+    """Sample the main thread's stack on a CPU-time timer and save collapsed stacks at exit."""
+    stacks = Counter()
+    path = profile_path(script, output_dir, 'folded')
+
+    def sample(signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        stacks[';'.join(reversed(names))] += 1
+
+    def save():
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        with open(path, 'w') as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        print(f"Sampled profile ({sum(stacks.values())} samples) written to {path}", file=sys.stderr)
+
+    signal.signal(signal.SIGPROF, sample)
+    signal.setitimer(signal.ITIMER_PROF, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+    atexit.register(save)
+
+def setup_metrics(script, args=None, output_dir=None):
+    """Metrics of this run; applies --quiet and starts the profiler selected by STR_PROFILE."""
+    global QUIET
+    QUIET = getattr(args, 'quiet', QUIET)
+    metrics = Metrics(script, getattr(args, 'metrics_file', None) or os.environ.get('STR_METRICS_FILE'))
+    atexit.register(metrics.close)
+
+    profiler = os.environ.get('STR_PROFILE', '').lower()
+    if profiler in ('1', 'cprofile'):
+        start_cprofile(script, output_dir)
+    elif profiler == 'sample':
+        start_sampling(script, output_dir)
+    elif profiler:
+        print(f"Warning: unknown STR_PROFILE={profiler}, expected cprofile or sample", file=sys.stderr)
+    return metrics
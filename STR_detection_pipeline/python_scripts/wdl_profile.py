@@ -0,0 +1,42 @@
+
+##############################################################################
+
+# Runs any Python script under the profiler selected by STR_PROFILE (see
+# wdl_metrics.py), for scripts that do not call setup_metrics themselves,
+# e.g. Gene_annotation/processRawVariant.py or the QC scripts. The wdl_*.py
+# helpers read STR_PROFILE on their own and need no wrapper. Only the
+# wrapped script is profiled, not the processes it starts.
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+STR_PROFILE=sample python wdl_profile.py ../../Gene_annotation/processRawVariant.py --workers 4 ...
+"""
+
+import os
+import sys
+import runpy
+from wdl_metrics import setup_metrics
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print("Usage: STR_PROFILE=cprofile|sample python wdl_profile.py <script.py> [script arguments]")
+        sys.exit(0 if len(sys.argv) > 1 else 1)
+
+    script = os.path.abspath(sys.argv[1])
+    name = os.path.splitext(os.path.basename(script))[0]
+    setup_metrics(name, output_dir=os.getcwd())
+    # A wrapped wdl_*.py helper would otherwise start a second profiler
+    os.environ.pop('STR_PROFILE', None)
+
+    # Run the script as if it had been called directly
+    sys.argv = [script] + sys.argv[2:]
+    sys.path[0] = os.path.dirname(script)
+    runpy.run_path(script, run_name='__main__')
+
+if __name__ == '__main__':
+    main()
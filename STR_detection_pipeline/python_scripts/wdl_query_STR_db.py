@@ -14,11 +14,13 @@ import sys
 import sqlite3
 import argparse
 import re
-import json
 import math
+from wdl_str_motif import iter_motif_dicts
+from wdl_metrics import add_metrics_args, setup_metrics, debug, debug_enabled
 
-def filter_reads_to_fasta(sam_file, output_file, mapq_threshold=1, append=False):
+def filter_reads_to_fasta(sam_file, output_file, mapq_threshold=1, append=False, stage=None):
     """Filter reads from SAM file with MAPQ >= threshold and save to FASTA"""
+    written = 0
     mode = 'a' if append else 'w'
     with open(sam_file, 'r') as sam, open(output_file, mode) as fasta:
         for line in sam:
@@ -33,6 +35,11 @@ def filter_reads_to_fasta(sam_file, output_file, mapq_threshold=1, append=False)
             
             if int(mapq) >= mapq_threshold:
                 fasta.write(f">{qname}\n{seq}\n")
+                written += 1
+            if stage:
+                stage.rows += 1
+    if stage:
+        stage.count('reads_written', written)
 
 def get_roi_coordinates(roi_bed=None, json_file=None, gene=None, motif=None):
     """Get ROI coordinates and chromosome from either bed file or json file"""
@@ -45,11 +52,11 @@ def get_roi_coordinates(roi_bed=None, json_file=None, gene=None, motif=None):
                     if bed_gene == gene and bed_motif == motif:
                         return chr_, int(start), int(end)
     elif json_file:
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-            for entry in data:
-                if entry['gene'] == gene and entry['motif'] == motif:
-                    return entry['chrom'], entry['start'], entry['end']
+        for entry in iter_motif_dicts(json_file):
+            if entry['gene'] == gene and entry['motif'] == motif:
+                # Motif files store chromosomes without 'chr', BLAT targets carry it
+                chrom = str(entry['chrom'])
+                return chrom if chrom.startswith('chr') else 'chr' + chrom, entry['start'], entry['end']
     
     raise ValueError(f"Could not find ROI coordinates for {gene}_{motif}")
 
@@ -142,7 +149,8 @@ def find_max_str_length(sequence, motif, allowed_patterns=None):
            
     return max_length//2 if other_patterns else max_length, other_patterns
 
-def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_start, roi_end, allowed_patterns=None):
+def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_start, roi_end, allowed_patterns=None,
+                    stage=None):
     """Query STR sequences to further validate carriers"""
     try:
         table_name = os.path.splitext(os.path.basename(db_path))[0]
@@ -150,19 +158,20 @@ def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_sta
         curr = conn.cursor()
 
         # Debug: Print ROI info and check database content
-        print(f"Debug: ROI coordinates - {roi_chr}:{roi_start}-{roi_end}")
+        debug(f"Debug: ROI coordinates - {roi_chr}:{roi_start}-{roi_end}")
         minn = math.floor(roi_start / 1000) * 1000
         maxx = math.ceil(roi_end / 1000) * 1000
-        print(f"Debug: Query range - {minn}-{maxx}")
+        debug(f"Debug: Query range - {minn}-{maxx}")
         
-        # Verify database has relevant data
-        curr.execute(f"SELECT COUNT(*) FROM {table_name} WHERE sample_name = ?", (sample_name,))
-        total_samples = curr.fetchone()[0]
-        print(f"Debug: Records for sample {sample_name}: {total_samples}")
+        # Verify database has relevant data (the record count is only reported, so skip it when quiet)
+        if debug_enabled():
+            curr.execute(f"SELECT COUNT(*) FROM {table_name} WHERE sample_name = ?", (sample_name,))
+            total_samples = curr.fetchone()[0]
+            debug(f"Debug: Records for sample {sample_name}: {total_samples}")
         
         curr.execute(f"SELECT COUNT(*) FROM {table_name} WHERE sample_name = ? AND top_N_blat_results IS NOT NULL", (sample_name,))
         blat_samples = curr.fetchone()[0]
-        print(f"Debug: Records with BLAT results for sample {sample_name}: {blat_samples}")
+        debug(f"Debug: Records with BLAT results for sample {sample_name}: {blat_samples}")
         
         # If no BLAT results, early exit
         if blat_samples == 0:
@@ -170,10 +179,11 @@ def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_sta
             return sample_name, 0, 0, 0, 0, 0, 'None'
 
         # Get a few examples to verify data format
-        curr.execute(f"SELECT qname, top_N_blat_results FROM {table_name} WHERE sample_name = ? AND top_N_blat_results IS NOT NULL LIMIT 3", (sample_name,))
-        examples = curr.fetchall()
-        for ex in examples:
-            print(f"Debug: Example BLAT result - {ex[0]}: {ex[1]}")
+        if debug_enabled():
+            curr.execute(f"SELECT qname, top_N_blat_results FROM {table_name} WHERE sample_name = ? AND top_N_blat_results IS NOT NULL LIMIT 3", (sample_name,))
+            examples = curr.fetchall()
+            for ex in examples:
+                debug(f"Debug: Example BLAT result - {ex[0]}: {ex[1]}")
 
         # Original query
         query = f'''
@@ -185,7 +195,7 @@ def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_sta
         
         curr.execute(query, (sample_name, minn, maxx))
         results = curr.fetchall()
-        print(f"Debug: Query returned {len(results)} results")
+        debug(f"Debug: Query returned {len(results)} results")
         
         total_reads = 0
         read_count = 0
@@ -258,11 +268,18 @@ def query_sequences(db_path, sample_name, motif, threshold_len, roi_chr, roi_sta
                 continue
         
         # Print debugging stats
-        print(f"Debug: Reads with no BLAT results: {no_blat_count}")
-        print(f"Debug: Reads with format errors: {format_error_count}")
-        print(f"Debug: Reads outside region: {region_mismatch_count}")
-        print(f"Debug: Total reads passing filters: {total_reads}")
-        print(f"Debug: Reads above threshold: {read_count}")
+        debug(f"Debug: Reads with no BLAT results: {no_blat_count}")
+        debug(f"Debug: Reads with format errors: {format_error_count}")
+        debug(f"Debug: Reads outside region: {region_mismatch_count}")
+        debug(f"Debug: Total reads passing filters: {total_reads}")
+        debug(f"Debug: Reads above threshold: {read_count}")
+        if stage:
+            stage.count('reads_queried', len(results))
+            stage.count('reads_no_blat', no_blat_count)
+            stage.count('reads_format_error', format_error_count)
+            stage.count('reads_outside_region', region_mismatch_count)
+            stage.count('reads_passing', total_reads)
+            stage.count('reads_above_threshold', read_count)
         
         # Prevent division by zero
         percentage_reads = (read_count / total_reads * 100) if total_reads > 0 else 0
@@ -289,17 +306,22 @@ def main():
         filter_parser.add_argument('--mapq-threshold', type=int, default=1, help='MAPQ threshold (default: 1)')
         filter_parser.add_argument('--append', type=lambda x: (x.lower() == 'true'), default=False, 
                                   help='Append to existing file if true, overwrite if false (default: false)')
+        add_metrics_args(filter_parser)
         
         # Parse only the remaining arguments (excluding "filter_reads_to_fasta")
         filter_args = filter_parser.parse_args(sys.argv[2:])
+        metrics = setup_metrics('wdl_query_STR_db.filter_reads_to_fasta', filter_args,
+                                os.path.dirname(filter_args.output_file))
         
         # Call the filter_reads_to_fasta function
-        filter_reads_to_fasta(
-            sam_file=filter_args.sam_file,
-            output_file=filter_args.output_file,
-            mapq_threshold=filter_args.mapq_threshold,
-            append=filter_args.append
-        )
+        with metrics.stage('filter_reads_to_fasta') as stage:
+            filter_reads_to_fasta(
+                sam_file=filter_args.sam_file,
+                output_file=filter_args.output_file,
+                mapq_threshold=filter_args.mapq_threshold,
+                append=filter_args.append,
+                stage=stage
+            )
         return
 
     parser = argparse.ArgumentParser(description='Query and analyze STR sequences')
@@ -311,8 +333,10 @@ def main():
     parser.add_argument('--roi-bed', help='Path to ROI bed file (optional)')
     parser.add_argument('--json-file', help='Path to json file with ROI coordinates (optional)')
     parser.add_argument('--output-file', required=True, help='Output file path')
+    add_metrics_args(parser)
     
     args = parser.parse_args()
+    metrics = setup_metrics('wdl_query_STR_db', args, os.path.dirname(args.output_file))
     
     if not args.roi_bed and not args.json_file:
         parser.error("Either --roi-bed or --json-file must be provided")
@@ -333,9 +357,11 @@ def main():
     # print(args.allowed_patterns)
 
     all_results = []
-    for sample_name in sample_names:
-        result = query_sequences(args.db_path, sample_name, args.motif, args.threshold_len, roi_chr, roi_start, roi_end, args.allowed_patterns)
-        all_results.append(result)
+    with metrics.stage('query_sequences') as stage:
+        for sample_name in sample_names:
+            result = query_sequences(args.db_path, sample_name, args.motif, args.threshold_len, roi_chr, roi_start, roi_end, args.allowed_patterns, stage)
+            all_results.append(result)
+            stage.rows += 1
     
     with open(args.output_file, 'w') as file:
         file.write("sample_name\ttotal_read_num\t"
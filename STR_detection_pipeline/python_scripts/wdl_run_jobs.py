@@ -0,0 +1,373 @@
+
+##############################################################################
+
+# Helper script for running one tool command per BAM file (or per BAM file
+# and shard) in parallel within CPU and memory budgets, with retries, a per-job state manifest,
+# truncated-output detection and a run summary.
+# Called by 1_EHdn_GenerateStrProfile.sh and 4_EH_RunEH.sh
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+"""
+Usage:
+python wdl_run_jobs.py \
+  --bam-list cases_bams.txt \
+  --output-dir EHdn_cases_str-profiles \
+  --command "ExpansionHunterDenovo profile --reads {bam} --reference ref.fa --output-prefix {out_prefix}" \
+  --expected-outputs "{out_prefix}.str_profile.json" \
+  --max-cpus 16 --max-mem-gb 64 --cpus-per-job 1 --mem-gb-per-job 2
+
+Placeholders in --command and --expected-outputs: {bam}, {sample}, {out_prefix}
+With --shards shard1 shard2 ..., one job runs per sample and shard, {shard} is the
+shard label and {out_prefix} is <output-dir>/<sample>.<shard>
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import shlex
+import argparse
+import threading
+import subprocess
+from queue import Queue, Empty
+from collections import deque, Counter
+from wdl_metrics import add_metrics_args, setup_metrics
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+def get_sample_name(bam_path, clean=False):
+    """Sample name from a BAM/CRAM path, as used by the pipeline shell scripts."""
+    name = os.path.basename(bam_path)
+    for ext in ('.bam', '.cram'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name.replace('^', '_') if clean else name
+
+def read_bam_list(bam_list):
+    """BAM paths of the list; a path listed twice is run once."""
+    with open(bam_list, 'r') as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+def find_duplicate_samples(bams, clean_names=False):
+    """Sample names shared by different BAM paths (their jobs would overwrite each other)."""
+    counts = Counter(get_sample_name(bam, clean_names) for bam in bams)
+    return sorted(sample for sample, n in counts.items() if n > 1)
+
+def total_memory_gb():
+    """Physical memory of this machine in GB."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3
+    except (ValueError, OSError, AttributeError):
+        return 8.0
+
+def check_output(path):
+    """
+    Return None if an output file looks complete, otherwise the reason it is not.
+    JSON must parse, VCFs need a #CHROM header and a final newline, gzip must decompress.
+    """
+    if not os.path.exists(path):
+        return 'missing'
+    if os.path.getsize(path) == 0:
+        return 'empty'
+    try:
+        if path.endswith('.json'):
+            with open(path, 'r') as f:
+                json.load(f)
+        elif path.endswith('.gz'):
+            with gzip.open(path, 'rb') as f:
+                while f.read(1 << 20):
+                    pass
+        elif path.endswith('.vcf'):
+            with open(path, 'rb') as f:
+                has_header = any(line.startswith(b'#CHROM') for line in f)
+                f.seek(-1, os.SEEK_END)
+                ends_with_newline = f.read(1) == b'\n'
+            if not has_header:
+                return 'truncated (no #CHROM header)'
+            if not ends_with_newline:
+                return 'truncated (incomplete last line)'
+    except (ValueError, OSError, EOFError) as e:
+        return f'truncated ({type(e).__name__})'
+    return None
+
+def check_outputs(paths):
+    """Check all expected outputs of a job, returning {path: reason} for the bad ones."""
+    problems = {}
+    for path in paths:
+        reason = check_output(path)
+        if reason:
+            problems[path] = reason
+    return problems
+
+class JobRunner:
+    def __init__(self, bams, command, output_dir, expected_outputs, manifest_path,
+                 max_cpus, max_mem_gb, cpus_per_job, mem_gb_per_job,
+                 retries=2, backoff=30, clean_names=False, shards=None):
+        self.command = command
+        self.output_dir = output_dir
+        self.expected_outputs = expected_outputs
+        self.manifest_path = manifest_path
+        self.max_cpus = max_cpus
+        self.max_mem_gb = max_mem_gb
+        self.cpus_per_job = cpus_per_job
+        self.mem_gb_per_job = mem_gb_per_job
+        self.retries = retries
+        self.backoff = backoff
+        self.log_dir = os.path.join(output_dir, 'logs')
+        # Samples whose process has exited, posted by one waiter thread per running job
+        self.exited = Queue()
+
+        duplicates = find_duplicate_samples(bams, clean_names)
+        if duplicates:
+            raise ValueError(f"Different BAM paths share the sample names: {', '.join(duplicates)}")
+        self.jobs = {}
+        for bam in bams:
+            sample = get_sample_name(bam, clean_names)
+            for shard in shards or [None]:
+                name = f"{sample}.{shard}" if shard else sample
+                fields = {'bam': bam, 'sample': sample, 'shard': shard or '',
+                          'out_prefix': os.path.join(output_dir, name)}
+                self.jobs[name] = {
+                    'bam': bam,
+                    'state': PENDING,
+                    'attempts': 0,
+                    'fields': fields,
+                    'outputs': [template.format(**fields) for template in expected_outputs],
+                }
+        self.load_manifest()
+
+    def load_manifest(self):
+        """Carry over attempt counts and timings from an earlier run of the same manifest."""
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r') as f:
+            previous = json.load(f).get('jobs', {})
+        for sample, job in self.jobs.items():
+            if sample in previous:
+                for key in ('attempts', 'start', 'end', 'duration_s', 'returncode'):
+                    if key in previous[sample]:
+                        job[key] = previous[sample][key]
+
+    def save_manifest(self):
+        """Write the manifest atomically so an interrupted run never leaves it half written."""
+        jobs = {
+            sample: {key: value for key, value in job.items() if key not in ('fields', 'process', 'log')}
+            for sample, job in self.jobs.items()
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'command': self.command, 'jobs': jobs}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def build_command(self, job):
+        """Split the command template first so paths with spaces stay one argument."""
+        return [token.format(**job['fields']) for token in shlex.split(self.command)]
+
+    def n_slots(self):
+        by_cpu = self.max_cpus // self.cpus_per_job
+        by_mem = int(self.max_mem_gb // self.mem_gb_per_job)
+        return max(1, min(by_cpu, by_mem))
+
+    def start_job(self, sample):
+        job = self.jobs[sample]
+        job['attempts'] += 1
+        job['state'] = RUNNING
+        job['start'] = time.time()
+        job.pop('error', None)
+        job.pop('bad_outputs', None)
+        job['log'] = open(os.path.join(self.log_dir, f"{sample}.log"), 'a')
+        job['log'].write(f"=== attempt {job['attempts']}: {' '.join(self.build_command(job))}\n")
+        job['log'].flush()
+        try:
+            job['process'] = subprocess.Popen(self.build_command(job), stdout=job['log'],
+                                              stderr=subprocess.STDOUT)
+        except OSError as e:
+            job['log'].write(f"Could not start command: {e}\n")
+            job['process'] = None
+            self.exited.put((sample, 127))
+        else:
+            threading.Thread(target=self.wait_job, args=(sample, job['process']), daemon=True).start()
+        print(f"Started {sample} (attempt {job['attempts']})")
+
+    def wait_job(self, sample, process):
+        self.exited.put((sample, process.wait()))
+
+    def stop_running(self, running):
+        """Terminate jobs still running when the runner stops early; they are retried on the next run."""
+        for sample in running:
+            process = self.jobs[sample].get('process')
+            if process and process.poll() is None:
+                process.terminate()
+        for sample in running:
+            job = self.jobs[sample]
+            process = job.get('process')
+            if process:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            if 'log' in job:
+                job['log'].close()
+            job.pop('process', None)
+            job.pop('log', None)
+            job['state'] = PENDING
+            job['error'] = 'interrupted'
+            print(f"Stopped {sample}")
+
+    def finish_job(self, sample, returncode):
+        """Record a finished job; returns True if it should be retried."""
+        job = self.jobs[sample]
+        job['log'].close()
+        del job['process'], job['log']
+        job['end'] = time.time()
+        job['duration_s'] = round(job['end'] - job['start'], 2)
+        job['returncode'] = returncode
+
+        problems = check_outputs(job['outputs'])
+        if returncode == 0 and not problems:
+            job['state'] = DONE
+            print(f"Successfully processed {sample} ({job['duration_s']} s)")
+            return False
+
+        job['error'] = f"exit code {returncode}" if returncode != 0 else 'bad outputs'
+        if problems:
+            job['bad_outputs'] = problems
+        if job['attempts'] <= self.retries:
+            job['state'] = PENDING
+            print(f"Error processing {sample}: {job['error']}, will retry")
+            return True
+        job['state'] = FAILED
+        print(f"Error processing {sample}: {job['error']}, giving up after {job['attempts']} attempts")
+        return False
+
+    def run(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        queue = deque()
+        for sample, job in self.jobs.items():
+            # Resume: jobs whose outputs are already complete are not run again
+            if not check_outputs(job['outputs']):
+                job['state'] = DONE
+                print(f"Skipping {sample} - complete outputs already exist")
+            else:
+                job['state'] = PENDING
+                job['attempts'] = 0
+                queue.append((0.0, sample))
+        self.save_manifest()
+
+        slots = self.n_slots()
+        print(f"Running {len(queue)} jobs, up to {slots} at a time")
+        running = set()
+        try:
+            while queue or running:
+                now = time.time()
+                # Start ready jobs while there is budget left
+                for _ in range(len(queue)):
+                    if len(running) >= slots:
+                        break
+                    ready_at, sample = queue.popleft()
+                    if ready_at > now:
+                        queue.append((ready_at, sample))
+                        continue
+                    self.start_job(sample)
+                    running.add(sample)
+                    self.save_manifest()
+
+                # Block until a job exits, or until the next retry is due if a slot is free for it
+                timeout = None
+                if queue and len(running) < slots:
+                    timeout = max(0.0, min(ready_at for ready_at, _ in queue) - time.time())
+                try:
+                    finished = [self.exited.get(timeout=timeout)]
+                except Empty:
+                    continue
+                while not self.exited.empty():
+                    finished.append(self.exited.get_nowait())
+                for sample, returncode in finished:
+                    running.discard(sample)
+                    if self.finish_job(sample, returncode):
+                        delay = self.backoff * 2 ** (self.jobs[sample]['attempts'] - 1)
+                        queue.append((time.time() + delay, sample))
+                self.save_manifest()
+        finally:
+            if running:
+                self.stop_running(running)
+                self.save_manifest()
+
+        return self.summary()
+
+    def summary(self):
+        states = [job['state'] for job in self.jobs.values()]
+        durations = [job['duration_s'] for job in self.jobs.values() if 'duration_s' in job]
+        return {
+            'total': len(self.jobs),
+            'done': states.count(DONE),
+            'failed': states.count(FAILED),
+            'failed_samples': [s for s, job in self.jobs.items() if job['state'] == FAILED],
+            'attempts': sum(job['attempts'] for job in self.jobs.values()),
+            'job_time_s': round(sum(durations), 2),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run one command per BAM file within CPU/memory budgets')
+    parser.add_argument('--bam-list', required=True, help='Text file with one BAM/CRAM path per line')
+    parser.add_argument('--output-dir', required=True, help='Output directory ({out_prefix} lives here)')
+    parser.add_argument('--command', required=True,
+                        help='Command template with {bam}, {sample}, {out_prefix} placeholders')
+    parser.add_argument('--expected-outputs', nargs='+', required=True,
+                        help='Output file templates checked for completeness after each job')
+    parser.add_argument('--clean-names', action='store_true',
+                        help="Replace '^' with '_' in sample names")
+    parser.add_argument('--max-cpus', type=int, default=os.cpu_count(),
+                        help='CPU budget for all running jobs (default: all CPUs)')
+    parser.add_argument('--max-mem-gb', type=float, default=total_memory_gb(),
+                        help='Memory budget in GB for all running jobs (default: physical memory)')
+    parser.add_argument('--cpus-per-job', type=int, default=1, help='CPUs used by one job (default: 1)')
+    parser.add_argument('--mem-gb-per-job', type=float, default=2, help='Memory in GB used by one job (default: 2)')
+    parser.add_argument('--retries', type=int, default=2, help='Retries for a failed job (default: 2)')
+    parser.add_argument('--backoff', type=float, default=30,
+                        help='Seconds before the first retry, doubled for each further retry (default: 30)')
+    parser.add_argument('--shards', nargs='+',
+                        help='Run one job per sample and shard label, all sharing the budget')
+    parser.add_argument('--manifest', help='Job state manifest (default: <output-dir>/run_manifest.json)')
+    parser.add_argument('--summary', help='Run summary JSON (default: <output-dir>/run_summary.json)')
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    setup_metrics('wdl_run_jobs', args, args.output_dir)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = args.manifest or os.path.join(args.output_dir, 'run_manifest.json')
+    summary_file = args.summary or os.path.join(args.output_dir, 'run_summary.json')
+
+    start = time.time()
+    try:
+        runner = JobRunner(
+            read_bam_list(args.bam_list), args.command, args.output_dir, args.expected_outputs, manifest,
+            args.max_cpus, args.max_mem_gb, args.cpus_per_job, args.mem_gb_per_job,
+            args.retries, args.backoff, args.clean_names, args.shards
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        summary = runner.run()
+    except KeyboardInterrupt:
+        print("\nInterrupted, running jobs were stopped; rerun to resume", file=sys.stderr)
+        sys.exit(130)
+    summary['wall_time_s'] = round(time.time() - start, 2)
+
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nJobs done: {summary['done']}/{summary['total']}, failed: {summary['failed']}, "
+          f"wall time: {summary['wall_time_s']} s")
+    if summary['failed_samples']:
+        print(f"Failed samples: {', '.join(summary['failed_samples'])}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
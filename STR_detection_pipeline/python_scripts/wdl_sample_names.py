@@ -0,0 +1,46 @@
+
+##############################################################################
+
+# Helper functions for normalizing sample names from BAM/CRAM paths,
+# EHdn profiles and EH VCFs, so every step matches samples the same way.
+# Used by wdl_combine_ehdn_eh.py and wdl_build_manifest.py
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+
+def clean_sample_name(sample_name):
+    """Standardize and clean sample names by removing file extensions and invalid chars."""
+    name = os.path.basename(sample_name)
+    name = name.replace('.bam', '').replace('.cram', '')
+    return name.replace('^', '_')
+
+def strip_suffix(name, suffix):
+    """Remove a file suffix such as '.str_profile.json' or '.vcf' from a file name."""
+    name = os.path.basename(name)
+    return name[:-len(suffix)] if suffix and name.endswith(suffix) else name
+
+def bam_sample_keys(bam_path):
+    """
+    All names a BAM path can be matched by: the BAM file name itself, every directory
+    of its path, and every '_'-separated prefix of those (e.g. /data/S1/S1_final.bam
+    is found as S1 and S1_final). All keys are normalized with clean_sample_name.
+    """
+    keys = {clean_sample_name(bam_path)}
+    for component in bam_path.split('/'):
+        component = clean_sample_name(component) if component else ''
+        parts = component.split('_')
+        keys.update('_'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    keys.discard('')
+    return keys
+
+def build_bam_index(bam_paths):
+    """Hash map from every sample key to the BAM path(s) it matches."""
+    index = {}
+    for bam_path in bam_paths:
+        for key in bam_sample_keys(bam_path):
+            index.setdefault(key, []).append(bam_path)
+    return index
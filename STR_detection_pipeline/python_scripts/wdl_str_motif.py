@@ -6,15 +6,20 @@
 
 ##############################################################################
 
+import json
+
 class STRMotif:
+    __slots__ = ('gene', 'motif', 'start', 'end', 'chrom', '_carriers')
+
     def __init__(self, gene=None, motif=None, start=None, end=None, chrom=None, carriers=None):
         self.gene = gene
-        self.motif = motif 
+        self.motif = motif
         self.start = start
         self.end = end
         self.chrom = chrom
-        self.carriers = carriers if carriers else []
-        
+        # Insertion-ordered set of carriers (dict keys) for O(1) membership checks
+        self._carriers = dict.fromkeys(carriers) if carriers else {}
+
     @classmethod
     def from_bed_line(cls, line):
         """Create STRMotif from a bed file line"""
@@ -26,23 +31,31 @@ class STRMotif:
             end=int(end),
             chrom=chrom
         )
-    
+
     @classmethod
     def from_ehdn_eh_results(cls, ehdn_eh_combined):
-        """Create STRMotif from combined EHdn and EH results"""
+        """Create STRMotif from a row of combined EHdn and EH results"""
         return cls(
-            gene=ehdn_row['gene'],
-            motif=ehdn_row['motif'],
-            start=ehdn_row['start'],
-            end=ehdn_row['end'],
-            chrom=ehdn_row['chr']
+            gene=ehdn_eh_combined['gene'],
+            motif=ehdn_eh_combined['motif'],
+            start=int(ehdn_eh_combined['start']),
+            end=int(ehdn_eh_combined['end']),
+            chrom=str(ehdn_eh_combined['chr'])
         )
-    
+
+    @property
+    def carriers(self):
+        """Carriers (bam file paths) in the order they were added"""
+        return list(self._carriers)
+
     def add_carrier(self, bam_path):
         """Add a carrier (bam file path) to this motif"""
-        if bam_path not in self.carriers:
-            self.carriers.append(bam_path)
-    
+        self._carriers.setdefault(bam_path)
+
+    def has_carrier(self, bam_path):
+        """Check whether a bam file path is already a carrier"""
+        return bam_path in self._carriers
+
     def to_dict(self):
         """Convert to dictionary for easier serialization"""
         return {
@@ -53,15 +66,52 @@ class STRMotif:
             'chrom': self.chrom,
             'carriers': self.carriers
         }
-    
+
     @classmethod
     def from_dict(cls, d):
         """Create STRMotif from dictionary"""
         return cls(**d)
-    
+
     def get_region(self):
         """Get region in format chr:start-end"""
         return f"{self.chrom}:{self.start}-{self.end}"
-    
+
     def __str__(self):
-        return f"{self.gene}_{self.motif}_{self.chrom}:{self.start}-{self.end}"
\ No newline at end of file
+        return f"{self.gene}_{self.motif}_{self.chrom}:{self.start}-{self.end}"
+
+def write_motifs_jsonl(motifs, output_file):
+    """Stream motifs to a JSON Lines file, one motif per line"""
+    count = 0
+    with open(output_file, 'w') as f:
+        for motif in motifs:
+            f.write(json.dumps(motif.to_dict()))
+            f.write('\n')
+            count += 1
+    return count
+
+def iter_motif_dicts(motif_file):
+    """Iterate motif dictionaries from a JSON Lines file, or from a legacy JSON array file"""
+    with open(motif_file, 'r') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            # Legacy json.dump output has to be loaded as a whole
+            f.seek(0)
+            yield from json.load(f)
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_motifs(motif_file):
+    """Iterate STRMotif objects from a motif file"""
+    for d in iter_motif_dicts(motif_file):
+        yield STRMotif.from_dict(d)
+
+def iter_motif_carriers(motif_file):
+    """Iterate (motif, carrier) pairs from a motif file without loading the whole file"""
+    for d in iter_motif_dicts(motif_file):
+        for carrier in d['carriers']:
+            yield d, carrier
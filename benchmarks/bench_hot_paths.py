@@ -0,0 +1,222 @@
+
+##############################################################################
+
+# Microbenchmarks of the pipeline hot paths on deterministic synthetic data
+# (synthetic_data.py): STR length scanning, BLAT scoring, RepeatMasker
+# annotation, EH INFO parsing and SIFT genotype lookup. Results are written
+# as JSON and can be saved as a named baseline and compared against later.
+#
+# Usage:
+#   python bench_hot_paths.py --save-baseline main
+#   python bench_hot_paths.py --compare main [--max-regression 0.1]
+#   python bench_hot_paths.py --only find_max_str_length --scale 4 --output results.json
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'STR_detection_pipeline', 'python_scripts'))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'Gene_annotation'))
+from wdl_query_STR_db import find_max_str_length, find_other_repeats
+from wdl_addBlatResult2db import compute_blat_score
+from wdl_filter_ehdn_results import annotate_with_repeatmasker
+from wdl_combine_ehdn_eh import process_info_field
+from processRawVariant import build_vcf_index, get_sample_genotypes, parse_xls_file, find_input
+import synthetic_data
+
+DEFAULT_BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+RESULTS_VERSION = 1
+
+def quiet(func, *args):
+    """Run func with stdout discarded (annotate_with_repeatmasker prints its counts)."""
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return func(*args)
+        finally:
+            sys.stdout = stdout
+
+# Every benchmark is setup(n, seed, work_dir) -> (run, items): run() is timed,
+# items is the number of records one run handles (for items/s).
+
+def setup_find_max_str_length(n, seed, work_dir):
+    reads = synthetic_data.make_str_reads(n['reads'], seed)
+    return (lambda: [find_max_str_length(seq, motif) for seq, motif in reads]), len(reads)
+
+def setup_find_other_repeats(n, seed, work_dir):
+    reads = synthetic_data.make_str_reads(n['reads'], seed)
+    return (lambda: [find_other_repeats(seq, len(motif), motif, None) for seq, motif in reads]), len(reads)
+
+def setup_compute_blat_score(n, seed, work_dir):
+    psl = synthetic_data.make_psl(n['psl_reads'], seed)
+    # Same per-read selection as parse_single_psl_file
+    def run():
+        return [compute_blat_score(psl[psl['Q_name'] == qname].copy(), 3) for qname in psl['Q_name'].unique()]
+    return run, n['psl_reads']
+
+def setup_annotate_with_repeatmasker(n, seed, work_dir):
+    loci, rows = synthetic_data.make_repeatmasker(n['ehdn_loci'], n['repeatmasker'], seed)
+    rmsk_file = os.path.join(work_dir, 'repeatmasker.tsv')
+    rows.to_csv(rmsk_file, sep='\t', header=False, index=False)
+    return (lambda: quiet(annotate_with_repeatmasker, loci.copy(), rmsk_file)), len(loci)
+
+def setup_process_info_field(n, seed, work_dir):
+    table = synthetic_data.eh_combined_table(
+        synthetic_data.make_eh_vcfs(n['eh_samples'], n['eh_loci'], seed))
+    return (lambda: process_info_field(table, table['INFO'])), len(table)
+
+def sift_variants(n, seed, work_dir):
+    """Predictions VCF and deleterious variants of one synthetic SIFT chromosome folder."""
+    root = os.path.join(work_dir, 'sift')
+    synthetic_data.write_sift_root(root, n['sift_variants'], n['sift_samples'], chroms=('chr1',), seed=seed)
+    chrom_path = os.path.join(root, 'chr1')
+    variants = parse_xls_file(find_input(chrom_path, '_SIFTannotations.xls'), 0.05, False)
+    return find_input(chrom_path, '_SIFTpredictions.vcf'), variants
+
+def setup_build_vcf_index(n, seed, work_dir):
+    vcf_file, variants = sift_variants(n, seed, work_dir)
+    wanted = {(v['chrom'], v['pos'], v['ref'], v['alt']) for v in variants}
+    return (lambda: build_vcf_index(vcf_file, wanted)), n['sift_variants']
+
+def setup_get_sample_genotypes(n, seed, work_dir):
+    vcf_file, variants = sift_variants(n, seed, work_dir)
+    vcf_index = build_vcf_index(vcf_file)
+    def run():
+        with open(vcf_file, 'rb') as handle:
+            return [get_sample_genotypes(vcf_file, v, vcf_index, handle) for v in variants]
+    return run, len(variants)
+
+BENCHMARKS = {
+    'find_max_str_length': setup_find_max_str_length,
+    'find_other_repeats': setup_find_other_repeats,
+    'compute_blat_score': setup_compute_blat_score,
+    'annotate_with_repeatmasker': setup_annotate_with_repeatmasker,
+    'process_info_field': setup_process_info_field,
+    'build_vcf_index': setup_build_vcf_index,
+    'get_sample_genotypes': setup_get_sample_genotypes,
+}
+
+def measure(run, rounds, warmup=1):
+    """Wall times (s) of rounds runs after warmup untimed runs."""
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names, scale, seed, rounds):
+    n = synthetic_data.sizes(scale)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='str_bench_') as work_dir:
+        for name in names:
+            run, items = BENCHMARKS[name](n, seed, work_dir)
+            times = measure(run, rounds)
+            best = min(times)
+            results[name] = {
+                'min': best, 'median': statistics.median(times), 'mean': statistics.mean(times),
+                'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+                'rounds': rounds, 'items': items, 'items_per_s': items / best if best else None,
+            }
+            print(f"{name:28s} {best * 1e3:10.2f} ms  (median {results[name]['median'] * 1e3:.2f} ms, "
+                  f"{items} items)")
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+            'python': platform.python_version(), 'machine': platform.machine(), 'node': platform.node(),
+            'scale': scale, 'seed': seed,
+        },
+        'benchmarks': results,
+    }
+
+def baseline_path(name_or_path, baseline_dir):
+    """A baseline is either a JSON file path or a name saved in baseline_dir."""
+    if name_or_path.endswith('.json') or os.sep in name_or_path:
+        return name_or_path
+    return os.path.join(baseline_dir, f"{name_or_path}.json")
+
+def compare(results, baseline, max_regression):
+    """Print min-time ratios against a baseline; returns the benchmarks slower than allowed."""
+    if baseline['meta'].get('scale') != results['meta']['scale'] or \
+            baseline['meta'].get('seed') != results['meta']['seed']:
+        print(f"Warning: baseline was run with scale {baseline['meta'].get('scale')}, "
+              f"seed {baseline['meta'].get('seed')}; times are not comparable")
+
+    print(f"\nComparison with baseline ({baseline['meta'].get('commit')}, {baseline['meta'].get('date')}):")
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            print(f"{name:28s} not in baseline")
+            continue
+        ratio = result['min'] / old['min']
+        status = ''
+        if ratio > 1 + max_regression:
+            status = 'SLOWER'
+            regressions.append(name)
+        elif ratio < 1 / (1 + max_regression):
+            status = 'faster'
+        print(f"{name:28s} {old['min'] * 1e3:10.2f} -> {result['min'] * 1e3:10.2f} ms  {ratio:6.2f}x  {status}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks of pipeline hot paths on synthetic data')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Synthetic data size multiplier (default: 1)')
+    parser.add_argument('--seed', type=int, default=synthetic_data.SEED,
+                        help=f'Synthetic data seed (default: {synthetic_data.SEED})')
+    parser.add_argument('--rounds', type=int, default=5, help='Timed runs per benchmark (default: 5)')
+    parser.add_argument('--output', help='Write the results JSON to this file')
+    parser.add_argument('--baseline-dir', default=DEFAULT_BASELINE_DIR,
+                        help='Directory of named baselines (default: benchmarks/baselines)')
+    parser.add_argument('--save-baseline', metavar='NAME', help='Save the results as baseline NAME')
+    parser.add_argument('--compare', metavar='NAME', help='Compare with baseline NAME (or a results JSON path)')
+    parser.add_argument('--max-regression', type=float, default=0.1,
+                        help='Allowed slowdown before a benchmark counts as a regression (default: 0.1 = 10%%)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only or list(BENCHMARKS), args.scale, args.seed, args.rounds)
+
+    outputs = [args.output] if args.output else []
+    if args.save_baseline:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        outputs.append(baseline_path(args.save_baseline, args.baseline_dir))
+    for output in outputs:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+    if args.compare:
+        with open(baseline_path(args.compare, args.baseline_dir), 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                  f"{args.max_regression:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
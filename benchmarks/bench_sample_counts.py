@@ -0,0 +1,117 @@
+
+##############################################################################
+
+# Benchmark: repeated sample:count string parsing vs. the long-format
+# EHdn sample-count table (wdl_ehdn_sample_counts.py).
+#
+# Usage:
+#   python bench_sample_counts.py --outlier-locus outliers_locus_hg38_annotated.tsv
+#   python bench_sample_counts.py --synthetic-loci 200000 --synthetic-samples 1700
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'STR_detection_pipeline', 'python_scripts'))
+from wdl_ehdn_sample_counts import build_sample_count_table, count_case_control_by_locus
+from wdl_sample_names import clean_sample_name
+from wdl_combine_ehdn_eh import clean_sample_column
+
+def make_synthetic_outliers(n_loci, n_samples, seed=1234):
+    """Generate a genome-wide-sized outlier table with caco-like sample:count strings."""
+    rng = np.random.default_rng(seed)
+    samples = np.array([f"PNRR{i:05d}" if i % 2 else f"CTRL^{i:05d}" for i in range(n_samples)])
+    n_carriers = rng.integers(1, 40, size=n_loci)
+
+    def sample_strings():
+        return [','.join(f"{s}:{c:.2f}" for s, c in zip(rng.choice(samples, k, replace=False),
+                                                        rng.gamma(2.0, 2.0, size=k)))
+                for k in n_carriers]
+
+    return pd.DataFrame({
+        'chr': rng.choice([str(c) for c in range(1, 23)] + ['X', 'Y'], size=n_loci),
+        'start': rng.integers(1, 240_000_000, size=n_loci),
+        'motif': rng.choice(['AAGGG', 'CAG', 'AAAAG', 'CGG', 'AT', 'GGGGCC'], size=n_loci),
+        'gene': rng.choice([f"GENE{i}" for i in range(5000)], size=n_loci),
+        'raw_data': sample_strings(),
+        'caco_raw_data': sample_strings()
+    }).assign(end=lambda d: d['start'] + 1000)
+
+def read_outliers(path):
+    """Read an annotated EHdn outlier file and use its count strings for both columns."""
+    data = pd.read_csv(path, sep='\t', header=0,
+                       names=['chr', 'start', 'end', 'motif', 'gene', 'region',
+                              'top_zscore', 'raw_data', 'all_counts'])
+    data['caco_raw_data'] = data['all_counts']
+    return data
+
+def legacy_consumers(data, n_gene_lists):
+    """Per-row string splitting as done before the long table existed."""
+    # Fisher counts were re-derived for every gene list
+    for _ in range(n_gene_lists):
+        case_counts = [sum("PNRR" in item for item in s.split(',')) for s in data['caco_raw_data']]
+        control_counts = [len(s.split(',')) - c for s, c in zip(data['caco_raw_data'], case_counts)]
+    # get_sample_sets re-parsed every raw_data string of a (gene, motif) for each EHdn row
+    raw_by_motif = data.groupby(['gene', 'motif'])['raw_data'].agg(list).to_dict()
+    for gene, motif in zip(data['gene'], data['motif']):
+        samples = set()
+        for raw_data in raw_by_motif[(gene, motif)]:
+            samples.update(clean_sample_name(s.split(':')[0]) for s in str(raw_data).split(','))
+    return case_counts, control_counts
+
+def long_table_consumers(data):
+    """Explode once, then answer the same questions from the categorical long table."""
+    table = build_sample_count_table(data)
+    counts = count_case_control_by_locus(table)
+    raw = table[table['source'] == 'raw_data'].copy()
+    raw['sample_clean'] = clean_sample_column(raw['sample'])
+    return table, counts, raw
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark long-format EHdn sample-count table')
+    parser.add_argument('--outlier-locus', help='Annotated EHdn outlier TSV (genome-wide)')
+    parser.add_argument('--synthetic-loci', type=int, default=100000,
+                        help='Number of synthetic loci when no outlier file is given (default: 100000)')
+    parser.add_argument('--synthetic-samples', type=int, default=1700,
+                        help='Number of synthetic samples (default: 1700)')
+    parser.add_argument('--gene-lists', type=int, default=4,
+                        help='Number of gene lists the legacy Fisher step was repeated for (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats per measurement (default: 3)')
+    args = parser.parse_args()
+
+    if args.outlier_locus:
+        data = read_outliers(args.outlier_locus)
+        print(f"Loaded {len(data)} loci from {args.outlier_locus}")
+    else:
+        data = make_synthetic_outliers(args.synthetic_loci, args.synthetic_samples)
+        print(f"Generated {len(data)} synthetic loci over {args.synthetic_samples} samples")
+
+    legacy_time, _ = timed(legacy_consumers, data, args.gene_lists, repeat=args.repeat)
+    table_time, (table, _, _) = timed(long_table_consumers, data, repeat=args.repeat)
+    string_mb = data[['raw_data', 'caco_raw_data']].memory_usage(deep=True).sum() / 1e6
+    table_mb = table.memory_usage(deep=True).sum() / 1e6
+
+    print(f"Long table rows: {len(table)}")
+    print(f"Legacy string parsing:  {legacy_time:.3f} s")
+    print(f"Long table (build+use): {table_time:.3f} s ({legacy_time / table_time:.1f}x)")
+    print(f"Memory: strings {string_mb:.1f} MB, long table {table_mb:.1f} MB")
+
+if __name__ == '__main__':
+    main()
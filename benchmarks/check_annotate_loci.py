@@ -0,0 +1,133 @@
+
+##############################################################################
+
+# Check of wdl_annotate_loci.py (EHDN_ANNOTATION=native) on a tiny synthetic
+# refGene model: region precedence (exonic, UTR, splicing, intronic, ncRNA),
+# both neighbour boundaries (1000 bp is upstream/downstream, 1001 bp is
+# intergenic) on + and - strands, and the NONE(dist=NONE) gene field of
+# intergenic loci. With --ehdn-dir and --annovar-dir the same table is also
+# annotated by EHdn's annotate_ehdn.sh and both outputs are compared.
+# Prints one line per locus and exits with status 1 on any mismatch.
+#
+# Usage:
+#   python check_annotate_loci.py [--ehdn-dir /ExpansionHunterDenovo --annovar-dir annovar] [--work-dir DIR]
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ANNOTATE_LOCI = os.path.join(BENCH_DIR, '..', 'STR_detection_pipeline', 'python_scripts', 'wdl_annotate_loci.py')
+
+# name, chrom, strand, txStart, txEnd, cdsStart, cdsEnd, exons (0-based half-open), gene
+GENE_MODEL = [
+    ('NM_000001', 'chr1', '+', 2000, 3000, 2100, 2800, [(2000, 2200), (2500, 3000)], 'GENEA'),
+    ('NM_000002', 'chr1', '-', 10000, 11000, 10100, 10900, [(10000, 11000)], 'GENEB'),
+    ('NM_000003', 'chr2', '+', 10000, 20000, 10100, 19900, [(10000, 10500), (19500, 20000)], 'GENEC'),
+    ('NR_000004', 'chr2', '+', 12000, 13000, 13000, 13000, [(12000, 12200), (12500, 13000)], 'GENED'),
+]
+
+# chrom, start, end (1-based closed), expected gene, expected region
+EXPECTED = [
+    ('chr1', 2150, 2160, 'GENEA', 'exonic'),
+    ('chr1', 2090, 2110, 'GENEA', 'exonic'),
+    ('chr1', 2010, 2020, 'GENEA', 'UTR5'),
+    ('chr1', 2900, 2910, 'GENEA', 'UTR3'),
+    ('chr1', 2195, 2201, 'GENEA', 'exonic;splicing'),
+    ('chr1', 2201, 2202, 'GENEA', 'splicing'),
+    ('chr1', 2499, 2500, 'GENEA', 'splicing'),
+    ('chr1', 2203, 2210, 'GENEA', 'intronic'),
+    ('chr1', 990, 1001, 'GENEA', 'upstream'),
+    ('chr1', 990, 1000, 'NONE(dist=NONE),GENEA(dist=1001)', 'intergenic'),
+    ('chr1', 4000, 4005, 'GENEA', 'downstream'),
+    ('chr1', 4001, 4005, 'GENEA(dist=1001),GENEB(dist=5996)', 'intergenic'),
+    ('chr1', 10050, 10060, 'GENEB', 'UTR3'),
+    ('chr1', 8996, 9001, 'GENEB', 'downstream'),
+    ('chr1', 12000, 12010, 'GENEB', 'upstream'),
+    ('chr1', 12001, 12010, 'GENEB(dist=1001),NONE(dist=NONE)', 'intergenic'),
+    ('chr2', 10050, 10060, 'GENEC', 'UTR5'),
+    ('chr2', 11000, 11010, 'GENEC', 'intronic'),
+    ('chr2', 12100, 12110, 'GENED', 'ncRNA_exonic'),
+    ('chr2', 12201, 12202, 'GENED', 'ncRNA_splicing'),
+    ('chr2', 12300, 12310, 'GENED', 'ncRNA_intronic'),
+    ('chr3', 100, 200, 'NONE(dist=NONE),NONE(dist=NONE)', 'intergenic'),
+]
+
+def write_gene_model(humandb):
+    """hg38_refGene.txt with the leading bin column, as in ANNOVAR's humandb."""
+    os.makedirs(humandb, exist_ok=True)
+    path = os.path.join(humandb, 'hg38_refGene.txt')
+    with open(path, 'w') as f:
+        for name, chrom, strand, tx_start, tx_end, cds_start, cds_end, exons, gene in GENE_MODEL:
+            f.write('\t'.join(map(str, [
+                0, name, chrom, strand, tx_start, tx_end, cds_start, cds_end, len(exons),
+                ''.join(f"{s}," for s, _ in exons), ''.join(f"{e}," for _, e in exons), 0, gene,
+                'cmpl', 'cmpl', ','.join('0' for _ in exons) + ','])) + '\n')
+    return path
+
+def write_loci(path):
+    """The expected loci as an EHdn outlier locus table."""
+    with open(path, 'w') as f:
+        f.write('contig\tstart\tend\tmotif\ttop_case_zscore\thigh_case_counts\tcounts\n')
+        for chrom, start, end, *_ in EXPECTED:
+            f.write(f"{chrom}\t{start}\t{end}\tAAGGG\t1.0\tS1:1.00\tS1:1.00\n")
+    return path
+
+def run_annovar(ehdn_dir, annovar_dir, loci_file, humandb, output_file):
+    subprocess.run(['bash', os.path.join(ehdn_dir, 'scripts', 'annotate_ehdn.sh'),
+                    '--ehdn-results', loci_file, '--ehdn-annotated-results', output_file,
+                    '--annovar-annotate-variation', os.path.join(annovar_dir, 'annotate_variation.pl'),
+                    '--annovar-humandb', humandb, '--annovar-buildver', 'hg38'], check=True)
+    return pd.read_csv(output_file, sep='\t', dtype=str, keep_default_na=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check of the native gene annotation on a synthetic gene model')
+    parser.add_argument('--ehdn-dir', help='ExpansionHunterDenovo checkout; also compare with annotate_ehdn.sh')
+    parser.add_argument('--annovar-dir', help='ANNOVAR directory with annotate_variation.pl (with --ehdn-dir)')
+    parser.add_argument('--work-dir', help='Directory for the gene model and outputs (default: a temporary directory)')
+    args = parser.parse_args()
+    if bool(args.ehdn_dir) != bool(args.annovar_dir):
+        parser.error("--ehdn-dir and --annovar-dir go together")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='annotate_loci_check_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    humandb = os.path.join(work_dir, 'humandb')
+    gene_model = write_gene_model(humandb)
+    loci_file = write_loci(os.path.join(work_dir, 'outliers_locus.tsv'))
+    native_file = os.path.join(work_dir, 'outliers_locus_native_annotated.tsv')
+    subprocess.run([sys.executable, ANNOTATE_LOCI, '--gene-model', gene_model,
+                    '--cache-file', os.path.join(work_dir, 'hg38_refGene.idx.pkl'),
+                    '--inputs', loci_file, '--outputs', native_file], check=True)
+    native = pd.read_csv(native_file, sep='\t', dtype=str, keep_default_na=False)
+    annovar = None
+    if args.ehdn_dir:
+        annovar = run_annovar(args.ehdn_dir, args.annovar_dir, loci_file, humandb,
+                              os.path.join(work_dir, 'outliers_locus_annovar_annotated.tsv'))
+
+    ok = len(native) == len(EXPECTED)
+    for i, (chrom, start, end, gene, region) in enumerate(EXPECTED):
+        got = (native['gene'][i], native['region'][i])
+        match = got == (gene, region)
+        detail = f"{got[0]} {got[1]}" if match else f"{got[0]} {got[1]}, expected {gene} {region}"
+        if annovar is not None:
+            annovar_got = (annovar['gene'][i], annovar['region'][i])
+            match = match and annovar_got == got
+            if annovar_got != got:
+                detail += f", annotate_ehdn.sh {annovar_got[0]} {annovar_got[1]}"
+        ok = ok and match
+        print(f"{'PASS' if match else 'FAIL'}  {chrom}:{start}-{end}  {detail}")
+
+    print(f"\n{'PASS' if ok else 'FAIL'}  native annotation vs expected regions"
+          f"{' and annotate_ehdn.sh' if annovar is not None else ''} ({work_dir})")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
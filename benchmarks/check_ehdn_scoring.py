@@ -0,0 +1,87 @@
+
+##############################################################################
+
+# Fixture check of wdl_ehdn_score_loci.py (EHDN_SCORING=native): scores the
+# small cohort in fixtures/ehdn_scoring and checks that the merged table has
+# one row per outlier locus with its case-control columns. Without
+# --ehdn-dir the tables are compared with reference_scipy_*.tsv, a
+# locus-by-locus scipy recomputation (a regression check only, not EHdn
+# parity). With --ehdn-dir they are compared with the output of EHdn's own
+# outlier.py / casecontrol.py, which is the EHdn parity check. Exits with
+# status 1 on any mismatch.
+#
+# Usage:
+#   python check_ehdn_scoring.py [--ehdn-dir /ExpansionHunterDenovo] [--work-dir DIR]
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures', 'ehdn_scoring')
+SCORE_LOCI = os.path.join(BENCH_DIR, '..', 'STR_detection_pipeline', 'python_scripts', 'wdl_ehdn_score_loci.py')
+MANIFEST = os.path.join(FIXTURE_DIR, 'manifest.tsv')
+PROFILE = os.path.join(FIXTURE_DIR, 'multisample_profile.json')
+
+def run_ehdn_scripts(ehdn_dir, work_dir):
+    """Expected tables from EHdn's locus-mode outlier.py and casecontrol.py."""
+    outputs = {}
+    for script, name in (('outlier.py', 'outliers_locus.tsv'), ('casecontrol.py', 'casecontrol_locus.tsv')):
+        outputs[name] = os.path.join(work_dir, f"ehdn_{name}")
+        subprocess.run([sys.executable, os.path.join(ehdn_dir, 'scripts', script), 'locus',
+                        '--manifest', MANIFEST, '--multisample-profile', PROFILE,
+                        '--output', outputs[name]], check=True)
+    return outputs['outliers_locus.tsv'], outputs['casecontrol_locus.tsv']
+
+def check_merged(merged_file, outlier_file, casecontrol_file):
+    """The merged table holds each outlier locus once, with its case-control values."""
+    keys = ['contig', 'start', 'end', 'motif']
+    merged = pd.read_csv(merged_file, sep='\t').rename(columns={'chr': 'contig'})
+    outliers = pd.read_csv(outlier_file, sep='\t')
+    casecontrol = pd.read_csv(casecontrol_file, sep='\t')
+    expected = outliers[keys].merge(casecontrol[keys + ['pvalue', 'counts']], on=keys, how='left')
+    joined = merged.merge(expected, on=keys, how='outer', indicator=True)
+    ok = (len(merged) == len(outliers) and (joined['_merge'] == 'both').all()
+          and (joined['p_val'] - joined['pvalue']).abs().max() < 1e-9
+          and (joined['caco_raw_data'] == joined['counts']).all())
+    print(f"Merged table: {len(merged)} rows for {len(outliers)} outlier loci, "
+          f"case-control columns {'match' if ok else 'DIFFER'}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Fixture check of the native EHdn locus scoring')
+    parser.add_argument('--ehdn-dir', help='ExpansionHunterDenovo checkout; compare with its scripts instead')
+    parser.add_argument('--work-dir', help='Directory for the native outputs (default: a temporary directory)')
+    args = parser.parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='ehdn_scoring_check_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    if args.ehdn_dir:
+        expected_outlier, expected_casecontrol = run_ehdn_scripts(args.ehdn_dir, work_dir)
+    else:
+        expected_outlier = os.path.join(FIXTURE_DIR, 'reference_scipy_outliers_locus.tsv')
+        expected_casecontrol = os.path.join(FIXTURE_DIR, 'reference_scipy_casecontrol_locus.tsv')
+
+    outlier_file = os.path.join(work_dir, 'outliers_locus.tsv')
+    casecontrol_file = os.path.join(work_dir, 'casecontrol_locus.tsv')
+    merged_file = os.path.join(work_dir, 'merged_locus.tsv')
+    proc = subprocess.run([sys.executable, SCORE_LOCI, '--manifest', MANIFEST, '--multisample-profile', PROFILE,
+                           '--outlier-output', outlier_file, '--casecontrol-output', casecontrol_file,
+                           '--merged-output', merged_file,
+                           '--compare-outlier', expected_outlier, '--compare-casecontrol', expected_casecontrol])
+
+    ok = proc.returncode == 0 and check_merged(merged_file, outlier_file, casecontrol_file)
+    print(f"\n{'PASS' if ok else 'FAIL'}  native scoring vs {'EHdn' if args.ehdn_dir else 'scipy reference'} tables "
+          f"({work_dir})")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+
+##############################################################################
+
+# Stand-in run of wdl_run_jobs.py (the parallel job runner of steps 1 and 4)
+# with standin_tools/standin_job: successful, flaky, failing and truncating
+# jobs, resume, duplicate sample names, scheduling overhead and clean-up of
+# running children on interrupt. Prints one line per check and exits 1 if
+# any check fails.
+#
+# Usage:
+#   python check_run_jobs.py [--work-dir /tmp/run_jobs_check]
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_JOBS = os.path.join(BENCH_DIR, '..', 'STR_detection_pipeline', 'python_scripts', 'wdl_run_jobs.py')
+STANDIN_JOB = os.path.join(BENCH_DIR, 'standin_tools', 'standin_job')
+
+def write_bams(path, samples):
+    with open(path, 'w') as f:
+        f.write(''.join(f"/data/{sample}.bam\n" for sample in samples))
+    return path
+
+def run_jobs_cmd(work_dir, bam_list, seconds, slots=4):
+    return [sys.executable, RUN_JOBS, '--bam-list', bam_list, '--output-dir', os.path.join(work_dir, 'out'),
+            '--command', f"{sys.executable} {STANDIN_JOB} --sample {{sample}} --out-prefix {{out_prefix}} "
+                         f"--seconds {seconds}",
+            '--expected-outputs', '{out_prefix}.vcf', '{out_prefix}.json',
+            '--max-cpus', str(slots), '--max-mem-gb', str(2 * slots), '--mem-gb-per-job', '2',
+            '--retries', '1', '--backoff', '0.2']
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie has exited but was not reaped yet
+    with open(f"/proc/{pid}/stat", 'r') as f:
+        return f.read().split(') ')[1][0] != 'Z'
+
+def check(results, name, ok, detail=''):
+    results.append(ok)
+    print(f"{'PASS' if ok else 'FAIL'}  {name}" + (f"  ({detail})" if detail else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in run of wdl_run_jobs.py')
+    parser.add_argument('--work-dir', help='Working directory (default: a temporary directory)')
+    args = parser.parse_args()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='run_jobs_check_')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    results = []
+
+    # Mixed run: 8 good jobs of 0.5 s in 4 slots, one flaky, one failing, one truncating
+    samples = [f"ok{i}" for i in range(8)] + ['flaky1', 'fail1', 'truncate1']
+    bam_list = write_bams(os.path.join(work_dir, 'bams.txt'), samples)
+    start = time.time()
+    proc = subprocess.run(run_jobs_cmd(work_dir, bam_list, 0.5), capture_output=True, text=True)
+    wall = time.time() - start
+    with open(os.path.join(work_dir, 'out', 'run_summary.json'), 'r') as f:
+        summary = json.load(f)
+    with open(os.path.join(work_dir, 'out', 'run_manifest.json'), 'r') as f:
+        jobs = json.load(f)['jobs']
+    check(results, 'exit status 1 when samples fail', proc.returncode == 1, f"exit {proc.returncode}")
+    check(results, 'good and flaky jobs done', summary['done'] == 9, f"{summary['done']} done")
+    check(results, 'failing and truncating jobs failed', sorted(summary['failed_samples']) == ['fail1', 'truncate1'],
+          ', '.join(summary['failed_samples']))
+    check(results, 'flaky job retried once', jobs['flaky1']['attempts'] == 2, f"{jobs['flaky1']['attempts']} attempts")
+    check(results, 'truncated VCF detected', 'truncated' in str(jobs['truncate1'].get('bad_outputs')),
+          str(jobs['truncate1'].get('bad_outputs')))
+    # 11 jobs of 0.5 s in 4 slots are 3 waves (1.5 s); retries add one more wave after the backoff
+    check(results, 'no polling overhead per job', wall < 3.5, f"{wall:.2f} s wall")
+
+    # Resume: only the failed samples are run again
+    proc = subprocess.run(run_jobs_cmd(work_dir, bam_list, 0), capture_output=True, text=True)
+    check(results, 'resume skips finished samples', proc.stdout.count('Skipping') == 9,
+          f"{proc.stdout.count('Skipping')} skipped")
+
+    # Different BAM paths with the same sample name are rejected
+    dup_list = os.path.join(work_dir, 'dups.txt')
+    with open(dup_list, 'w') as f:
+        f.write("/a/ok0.bam\n/b/ok0.bam\n")
+    proc = subprocess.run(run_jobs_cmd(work_dir, dup_list, 0), capture_output=True, text=True)
+    check(results, 'duplicate sample names rejected', proc.returncode == 2 and 'ok0' in proc.stderr,
+          proc.stderr.strip().splitlines()[-1] if proc.stderr else f"exit {proc.returncode}")
+
+    # Interrupt: running children are terminated
+    slow_dir = os.path.join(work_dir, 'slow')
+    os.makedirs(slow_dir)
+    slow_list = write_bams(os.path.join(slow_dir, 'bams.txt'), [f"slow{i}" for i in range(4)])
+    runner = subprocess.Popen(run_jobs_cmd(slow_dir, slow_list, 30), stdout=subprocess.DEVNULL)
+    pid_files = [os.path.join(slow_dir, 'out', f"slow{i}.pid") for i in range(4)]
+    deadline = time.time() + 10
+    while time.time() < deadline and not all(os.path.exists(p) and os.path.getsize(p) for p in pid_files):
+        time.sleep(0.05)
+    runner.send_signal(signal.SIGINT)
+    runner.wait(timeout=30)
+    time.sleep(0.2)
+    pids = [int(open(p).read()) for p in pid_files if os.path.exists(p)]
+    alive = [pid for pid in pids if pid_alive(pid)]
+    check(results, 'children terminated on interrupt', len(pids) == 4 and not alive,
+          f"{len(pids)} started, {len(alive)} still running")
+    for pid in alive:
+        os.kill(pid, signal.SIGKILL)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed ({work_dir})")
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+
+##############################################################################
+
+# End-to-end throughput harness for steps 1-9 of the STR detection pipeline.
+# Builds a synthetic cohort (placeholder BAMs, ROI bed, gene model, gene
+# lists, RepeatMasker bed) and runs 00_RunAll.sh with the stand-in EHdn, EH,
+# samtools and BLAT executables from standin_tools/, so the Python and shell
+# parts of the pipeline run for real on one Linux box. Every step is wrapped
+# by `pipeline_harness.py measure`, which records wall time, CPU time, peak
+# RSS, bytes read/written (/proc/<pid>/io, descendants included) and the
+# files added under the project directory.
+#
+# Usage:
+#   python pipeline_harness.py --work-dir /tmp/str_harness --cases 50 --controls 50
+#   python pipeline_harness.py --work-dir /tmp/str_harness --sizes 20 100 500
+#   python pipeline_harness.py measure --metrics m.jsonl --watch-dir DIR -- bash step.sh ...
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(BENCH_DIR, '..', 'STR_detection_pipeline')
+STANDIN_DIR = os.path.join(BENCH_DIR, 'standin_tools')
+
+# (gene, motif, chrom, start, end, case_freq, control_freq, strand, txStart, txEnd)
+COHORT_LOCI = [
+    ('RFC1', 'AAGGG', 'chr4', 39348424, 39348483, 0.35, 0.05, '-', 39287000, 39366000),
+    ('FGF14', 'GAA', 'chr13', 102161575, 102161726, 0.25, 0.05, '-', 101710000, 102402000),
+    ('DAB1', 'ATTTC', 'chr1', 57367043, 57367118, 0.2, 0.05, '-', 56994000, 58546000),
+]
+STEPS = ['1_EHdn_GenerateStrProfile', '2_EHdn_GenerateManifestFile', '3_EHdn_RunAnnotEHdn', '4_EH_RunEH',
+         '5_CombineEHResult', '6_CombineEHdnEH', '7_RunBLAT', '8_BuildDatabase', '9_QueryDatabase']
+GENE_LISTS = ['PNPAN_PNrelated.csv', 'NIHGene_CellFunc.csv', 'Malik_STR_genes.csv', 'high_DRGexp_genes.csv']
+
+## measure: wrap one step
+
+def read_proc_io(pid):
+    """I/O counters of a process; they include its reaped descendants."""
+    try:
+        with open(f"/proc/{pid}/io", 'r') as f:
+            return {key: int(value) for key, value in (line.split(': ') for line in f)}
+    except OSError:
+        return {}
+
+def dir_usage(path):
+    """(file count, total bytes) under path."""
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return files, size
+
+def step_name(cmd):
+    for arg in cmd:
+        if arg.endswith('.sh'):
+            return os.path.basename(arg)[:-3]
+    return os.path.basename(cmd[0])
+
+def measure(cmd, metrics_file, watch_dir):
+    """Run cmd, append its resource usage to metrics_file and return its exit status."""
+    files_before, bytes_before = dir_usage(watch_dir)
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd)
+    # Wait without reaping so /proc/<pid>/io is still readable, then reap for rusage
+    os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+    io = read_proc_io(proc.pid)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    files_after, bytes_after = dir_usage(watch_dir)
+
+    record = {
+        'step': step_name(cmd),
+        'args': cmd,
+        'returncode': proc.returncode,
+        'wall_s': round(wall, 3),
+        'user_s': round(usage.ru_utime, 3),
+        'sys_s': round(usage.ru_stime, 3),
+        # Largest single process among the step and its descendants
+        'max_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'rchar': io.get('rchar', 0),
+        'wchar': io.get('wchar', 0),
+        'read_bytes': io.get('read_bytes', 0),
+        'write_bytes': io.get('write_bytes', 0),
+        'files_added': files_after - files_before,
+        'bytes_added': bytes_after - bytes_before,
+    }
+    with open(metrics_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return proc.returncode
+
+## run: build a cohort and run the pipeline
+
+def write_cohort(project_dir, n_cases, n_controls, seed, reads_per_locus, background):
+    """Write input/, reference/ and cohort.json for a synthetic cohort; return the cohort file."""
+    input_dir = os.path.join(project_dir, 'input')
+    bam_dir = os.path.join(input_dir, 'bams')
+    ref_dir = os.path.join(project_dir, 'reference')
+    samplemaps_dir = os.path.join(ref_dir, 'Samplemaps')
+    for path in (bam_dir, os.path.join(ref_dir, 'humandb'), samplemaps_dir):
+        os.makedirs(path, exist_ok=True)
+
+    for name, prefix, n in (('cases.txt', 'PNRR', n_cases), ('controls.txt', 'CTRL', n_controls)):
+        bams = [os.path.join(bam_dir, f"{prefix}{i:05d}.bam") for i in range(1, n + 1)]
+        for bam in bams:
+            open(bam, 'w').close()
+        with open(os.path.join(input_dir, name), 'w') as f:
+            f.write('\n'.join(bams) + '\n')
+
+    with open(os.path.join(input_dir, 'roi.bed'), 'w') as f:
+        f.write('chr4\t39348424\t39348483\tRFC1\tAAGGG\n')
+
+    with open(os.path.join(ref_dir, 'Homo_sapiens_assembly38.fasta'), 'w') as f:
+        f.write('>chr4\nN\n')
+
+    # hg38_refGene.txt: bin, name, chrom, strand, txStart, txEnd, cdsStart, cdsEnd, exonCount,
+    # exonStarts, exonEnds, score, name2, cdsStartStat, cdsEndStat, exonFrames
+    with open(os.path.join(ref_dir, 'humandb', 'hg38_refGene.txt'), 'w') as f:
+        for i, (gene, _, chrom, _, _, _, _, strand, tx_start, tx_end) in enumerate(COHORT_LOCI):
+            exons = [(tx_start, tx_start + 300), (tx_end - 300, tx_end)]
+            f.write('\t'.join(map(str, [
+                i, f"NM_{i:06d}", chrom, strand, tx_start, tx_end, tx_start + 100, tx_end - 100, len(exons),
+                ''.join(f"{s}," for s, _ in exons), ''.join(f"{e}," for _, e in exons), 0, gene,
+                'cmpl', 'cmpl', '0,0,'])) + '\n')
+
+    genes = [locus[0] for locus in COHORT_LOCI]
+    for name in GENE_LISTS:
+        with open(os.path.join(samplemaps_dir, name), 'w') as f:
+            f.write('\n'.join(genes) + '\n')
+    with open(os.path.join(samplemaps_dir, 'hg38RM_simple_repeats.bed'), 'w') as f:
+        for gene, motif, chrom, start, end, *_ in COHORT_LOCI:
+            f.write('\t'.join(map(str, [
+                chrom, start, end, 20, 5.0, 0.0, 0.0, chrom, 1, end - start, -10, '+',
+                f"({motif})n", 'Simple_repeat', 1, end - start, 0, 1])) + '\n')
+
+    cohort_file = os.path.join(project_dir, 'cohort.json')
+    cohort = {
+        'seed': seed, 'depth': 30, 'read_length': 150, 'reads_per_locus': reads_per_locus,
+        'background_loci': background,
+        'loci': [{'gene': gene, 'motif': motif, 'chrom': chrom, 'start': start, 'end': end,
+                  'case_freq': case_freq, 'control_freq': control_freq}
+                 for gene, motif, chrom, start, end, case_freq, control_freq, *_ in COHORT_LOCI],
+    }
+    with open(cohort_file, 'w') as f:
+        json.dump(cohort, f, indent=2)
+    return cohort_file
+
+def run_pipeline(args, n_cases, n_controls, project_dir):
+    """Run steps 1-9 on a fresh synthetic cohort and return the per-step metrics."""
+    if os.path.exists(project_dir):
+        shutil.rmtree(project_dir)
+    os.makedirs(project_dir)
+    project_dir = os.path.abspath(project_dir)
+    cohort_file = write_cohort(project_dir, n_cases, n_controls, args.seed, args.reads_per_locus,
+                               args.background_loci)
+    metrics_file = os.path.join(project_dir, 'step_metrics.jsonl')
+    ref_dir = os.path.join(project_dir, 'reference')
+
+    env = dict(os.environ)
+    env.update({
+        'PYTHON': sys.executable,
+        'REF': os.path.join(ref_dir, 'Homo_sapiens_assembly38.fasta'),
+        'EHDN_BIN': os.path.join(STANDIN_DIR, 'ExpansionHunterDenovo'),
+        'EH_BIN': os.path.join(STANDIN_DIR, 'ExpansionHunter'),
+        'SAMTOOLS': os.path.join(STANDIN_DIR, 'samtools'),
+        'BLAT': os.path.join(STANDIN_DIR, 'blat'),
+        'STANDIN_COHORT': cohort_file,
+        'EHDN_MERGE': 'incremental',
+        'EHDN_SCORING': 'native',
+        'EHDN_ANNOTATION': 'native',
+        'EH_SOURCE': 'store',
+        'EH_GENE_LIST': os.path.join(ref_dir, 'Samplemaps', 'high_DRGexp_genes.csv'),
+        'ANNOVAR_HUMANDB': os.path.join(ref_dir, 'humandb'),
+        'SAMPLEMAPS_DIR': os.path.join(ref_dir, 'Samplemaps'),
+        'CASE_COUNT': str(n_cases),
+        'CONTROL_COUNT': str(n_controls),
+        'MAX_CPUS': str(args.max_cpus),
+        'MAX_MEM_GB': str(args.max_mem_gb),
+        # Per-stage records of the Python helpers (wdl_metrics.py)
+        'STR_METRICS_FILE': os.path.join(project_dir, 'stage_metrics.jsonl'),
+        'STEP_WRAPPER': f"{sys.executable} {os.path.abspath(__file__)} measure "
+                        f"--metrics {metrics_file} --watch-dir {project_dir} --",
+    })
+
+    print(f"Running steps 1-9 for {n_cases} cases / {n_controls} controls in {project_dir}")
+    with open(os.path.join(project_dir, 'pipeline.log'), 'w') as log:
+        subprocess.run(['bash', '00_RunAll.sh', args.subname, project_dir], cwd=PIPELINE_DIR, env=env,
+                       stdout=log, stderr=subprocess.STDOUT, check=False)
+
+    with open(metrics_file, 'r') as f:
+        steps = [json.loads(line) for line in f]
+    query_dir = os.path.join(project_dir, 'output', 'QueryResults', args.subname)
+    results = [name for name in os.listdir(query_dir)] if os.path.isdir(query_dir) else []
+    return {'cases': n_cases, 'controls': n_controls, 'project_dir': project_dir,
+            'query_results': sorted(results), 'steps': steps}
+
+def format_steps(run):
+    lines = [f"{'step':<38}{'rc':>4}{'wall_s':>9}{'cpu_s':>9}{'rss_MB':>9}{'read_MB':>9}"
+             f"{'write_MB':>10}{'files':>7}{'out_MB':>9}"]
+    for s in run['steps']:
+        label = s['step'] + (' (' + s['args'][3] + ')' if s['step'].startswith('1_') else '')
+        lines.append(f"{label:<38}{s['returncode']:>4}{s['wall_s']:>9.2f}{s['user_s'] + s['sys_s']:>9.2f}"
+                     f"{s['max_rss_mb']:>9.1f}{s['rchar'] / 1e6:>9.1f}{s['wchar'] / 1e6:>10.1f}"
+                     f"{s['files_added']:>7}{s['bytes_added'] / 1e6:>9.1f}")
+    lines.append(f"{'total':<38}{'':>4}{sum(s['wall_s'] for s in run['steps']):>9.2f}")
+    return '\n'.join(lines)
+
+def format_sweep(runs):
+    """Wall time of every step per cohort size, to spot steps that scale worse than linearly."""
+    sizes = [r['cases'] + r['controls'] for r in runs]
+    lines = [f"{'step':<38}" + ''.join(f"{f'n={n}':>11}" for n in sizes)]
+    for step in STEPS:
+        walls = [sum(s['wall_s'] for s in r['steps'] if s['step'] == step) for r in runs]
+        lines.append(f"{step:<38}" + ''.join(f"{w:>11.2f}" for w in walls))
+    lines.append(f"{'wall s / sample':<38}" + ''.join(
+        f"{sum(s['wall_s'] for s in r['steps']) / n:>11.3f}" for r, n in zip(runs, sizes)))
+    return '\n'.join(lines)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'measure':
+        parser = argparse.ArgumentParser(description='Run one pipeline step and record its resource usage')
+        parser.add_argument('--metrics', required=True, help='JSON Lines file the step record is appended to')
+        parser.add_argument('--watch-dir', required=True, help='Directory whose added files are counted')
+        parser.add_argument('cmd', nargs=argparse.REMAINDER, help='Command after --')
+        args = parser.parse_args(sys.argv[2:])
+        cmd = args.cmd[1:] if args.cmd[:1] == ['--'] else args.cmd
+        sys.exit(measure(cmd, args.metrics, args.watch_dir))
+
+    parser = argparse.ArgumentParser(description='End-to-end pipeline harness with stand-in tools')
+    parser.add_argument('--work-dir', required=True, help='Directory for the synthetic projects')
+    parser.add_argument('--cases', type=int, default=20, help='Number of cases (default: 20)')
+    parser.add_argument('--controls', type=int, default=20, help='Number of controls (default: 20)')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help='Sweep cohort sizes; each size N runs N cases and N controls')
+    parser.add_argument('--subname', default='harness', help='Pipeline subname (default: harness)')
+    parser.add_argument('--seed', type=int, default=1234, help='Random seed (default: 1234)')
+    parser.add_argument('--reads-per-locus', type=int, default=40,
+                        help='Reads samtools returns per sample and locus (default: 40)')
+    parser.add_argument('--background-loci', type=int, default=200,
+                        help='EHdn-only loci with sporadic anchored reads (default: 200)')
+    parser.add_argument('--max-cpus', type=int, default=os.cpu_count(), help='MAX_CPUS for steps 1 and 4')
+    parser.add_argument('--max-mem-gb', type=float, default=16, help='MAX_MEM_GB for steps 1 and 4')
+    parser.add_argument('--output', help='JSON report (default: <work-dir>/harness_report.json)')
+    args = parser.parse_args()
+
+    cohorts = [(n, n) for n in args.sizes] if args.sizes else [(args.cases, args.controls)]
+    runs = []
+    for n_cases, n_controls in cohorts:
+        project_dir = os.path.join(args.work_dir, f"cohort_{n_cases}x{n_controls}")
+        run = run_pipeline(args, n_cases, n_controls, project_dir)
+        runs.append(run)
+        print(format_steps(run))
+        print(f"Query results: {', '.join(run['query_results']) or 'none'}\n")
+    if len(runs) > 1:
+        print(format_sweep(runs))
+
+    output = args.output or os.path.join(args.work_dir, 'harness_report.json')
+    with open(output, 'w') as f:
+        json.dump({'seed': args.seed, 'reads_per_locus': args.reads_per_locus,
+                   'background_loci': args.background_loci, 'runs': runs}, f, indent=2)
+    print(f"Report written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+
+##############################################################################
+
+# Shared model of the synthetic cohort used by the stand-in tools. Every
+# tool derives the same carrier status, counts and reads from the cohort
+# JSON (STANDIN_COHORT) and the sample name, so EHdn, EH, samtools and BLAT
+# outputs agree with each other without any real BAM.
+# Used by the stand-in executables in this directory
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import re
+import json
+import random
+import hashlib
+
+CASE_PATTERN = 'PNRR'
+
+def load_cohort():
+    """Cohort settings written by pipeline_harness.py."""
+    path = os.environ.get('STANDIN_COHORT')
+    if not path:
+        raise SystemExit("STANDIN_COHORT is not set; run the stand-in tools through pipeline_harness.py")
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def sample_from_path(path):
+    """Sample name of a BAM/CRAM path, as the pipeline derives it."""
+    name = os.path.basename(path)
+    for ext in ('.bam', '.cram'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name
+
+def rng_for(cohort, *keys):
+    """Random generator seeded by the cohort seed and the given keys."""
+    text = ':'.join(str(k) for k in (cohort['seed'],) + keys)
+    return random.Random(int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little'))
+
+def is_case(sample):
+    return CASE_PATTERN in sample
+
+def is_carrier(cohort, sample, locus):
+    freq = locus['case_freq'] if is_case(sample) else locus['control_freq']
+    return rng_for(cohort, 'carrier', sample, locus['gene'], locus['motif']).random() < freq
+
+def background_loci(cohort):
+    """EHdn-only loci with sporadic anchored reads in every sample."""
+    rng = rng_for(cohort, 'background')
+    motifs = ['AAAG', 'AAGG', 'CCG', 'AGC', 'AAAAT', 'ATTTT', 'CAGG']
+    return [{'chrom': f"chr{rng.randint(1, 22)}", 'start': rng.randint(1_000_000, 150_000_000),
+             'motif': rng.choice(motifs)} for _ in range(cohort['background_loci'])]
+
+def parse_region(region):
+    """Split 'chr1:100-200' (or '1:100-200') into ('chr1', 100, 200)."""
+    chrom, _, span = region.rpartition(':')
+    start, _, end = span.partition('-')
+    return chrom if chrom.startswith('chr') else 'chr' + chrom, int(start), int(end)
+
+def find_locus(cohort, chrom, start, end, gene=None, motif=None):
+    """Cohort locus overlapping a region (and matching gene / motif when given)."""
+    for locus in cohort['loci']:
+        if locus['chrom'] != chrom or locus['end'] < start or locus['start'] > end:
+            continue
+        if (gene is None or gene == locus['gene']) and (motif is None or motif == locus['motif']):
+            return locus
+    return None
+
+def motif_from_structure(structure):
+    """Repeat unit of an EH LocusStructure like '(AAGGG)*'."""
+    match = re.search(r'\(([ACGTN]+)\)', structure)
+    return match.group(1) if match else structure
+
+def str_read(rng, motif, units, length):
+    """Read of the given length with a run of motif units between random flanks."""
+    repeat = (motif * units)[:length]
+    left = rng.randint(0, length - len(repeat))
+    flank = lambda n: ''.join(rng.choice('ACGT') for _ in range(n))
+    return flank(left) + repeat + flank(length - left - len(repeat))
@@ -0,0 +1,227 @@
+
+##############################################################################
+
+# Deterministic synthetic inputs for the benchmarks: STR-rich reads, BLAT
+# PSL hits, RepeatMasker rows, ExpansionHunter VCFs and SIFT annotation
+# folders. The same seed and scale always give the same data.
+#
+# Usage:
+#   python synthetic_data.py --out-dir synthetic --scale 1 [--seed 1234]
+
+## author: Zitian Tang
+## contact: tang.zitian@wustl.edu
+
+##############################################################################
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+SEED = 1234
+BASES = np.array(list('ACGT'))
+MOTIFS = ['CAG', 'CGG', 'AAGGG', 'AAAAG', 'GGGGCC', 'ATTCT', 'GAA', 'CCTG']
+CHROMS = [str(c) for c in range(1, 23)] + ['X']
+
+# Number of items per unit of --scale
+BASE_SIZES = {
+    'reads': 2000,          # STR reads of 150 bp
+    'psl_reads': 500,       # reads with BLAT hits (1-20 hits each)
+    'ehdn_loci': 200,       # EHdn loci annotated with RepeatMasker
+    'repeatmasker': 20000,  # RepeatMasker rows
+    'eh_samples': 50,       # EH VCFs, one per sample
+    'eh_loci': 40,          # loci per EH VCF
+    'sift_variants': 2000,  # variants per chromosome folder
+    'sift_samples': 100,    # samples in the SIFT VCFs
+}
+
+PSL_COLUMNS = ['match', 'mis-match', 'rep.match', 'N\'s', 'Q gap count', 'Q gap bases',
+               'T gap count', 'T gap bases', 'strand', 'Q_name', 'Q size', 'Q start',
+               'Q end', 'T_name', 'T size', 'T_start', 'T_end', 'block count',
+               'blockSizes', 'qStarts', 'tStarts']
+
+EH_FORMAT = 'GT:SO:REPCN:REPCI:ADSP:ADFL:ADIR:LC'
+SIFT_XLS_HEADER = ['CHROM', 'POS', 'REF_ALLELE', 'ALT_ALLELE', 'TRANSCRIPT_ID', 'GENE_NAME',
+                   'REGION', 'VARIANT_TYPE', 'SIFT_SCORE', 'SIFT_PREDICTION']
+
+def sizes(scale):
+    return {key: max(1, int(round(n * scale))) for key, n in BASE_SIZES.items()}
+
+def random_bases(rng, n):
+    return ''.join(rng.choice(BASES, n))
+
+def str_read(rng, motif, length=150):
+    """Random flanks around a motif run with occasional 1 bp substitutions, sometimes followed by a second repeat."""
+    units = int(rng.integers(3, length // len(motif)))
+    repeat = list(motif * units)
+    for i in rng.choice(len(repeat), size=int(rng.integers(0, 3)), replace=False):
+        repeat[i] = str(rng.choice(BASES))
+    repeat = ''.join(repeat)
+    if rng.random() < 0.3:
+        repeat += str(rng.choice(MOTIFS)) * int(rng.integers(3, 6))
+    left = int(rng.integers(0, max(1, length - len(repeat))))
+    read = random_bases(rng, left) + repeat
+    return (read + random_bases(rng, max(0, length - len(read))))[:length]
+
+def make_str_reads(n_reads, seed=SEED):
+    """[(sequence, motif)] of STR-rich reads."""
+    rng = np.random.default_rng(seed)
+    motifs = rng.choice(MOTIFS, n_reads)
+    return [(str_read(rng, str(motif)), str(motif)) for motif in motifs]
+
+def make_psl(n_reads, seed=SEED):
+    """BLAT hits of n_reads reads with the column names used by wdl_addBlatResult2db.py."""
+    rng = np.random.default_rng(seed)
+    hits = rng.integers(1, 21, n_reads)
+    n = int(hits.sum())
+    match = rng.integers(20, 151, n)
+    t_start = rng.integers(1, 240_000_000, n)
+    data = {
+        'match': match, 'mis-match': rng.integers(0, 10, n), 'rep.match': rng.integers(0, 5, n),
+        'N\'s': 0, 'Q gap count': rng.integers(0, 3, n), 'Q gap bases': rng.integers(0, 10, n),
+        'T gap count': rng.integers(0, 3, n), 'T gap bases': rng.integers(0, 10, n),
+        'strand': rng.choice(['+', '-'], n), 'Q_name': np.repeat([f"read{i:07d}" for i in range(n_reads)], hits),
+        'Q size': 150, 'Q start': 0, 'Q end': match, 'T_name': 'chr' + rng.choice(CHROMS, n),
+        'T size': 248_956_422, 'T_start': t_start, 'T_end': t_start + match, 'block count': 1,
+        'blockSizes': [f"{m}," for m in match], 'qStarts': '0,', 'tStarts': [f"{t}," for t in t_start],
+    }
+    return pd.DataFrame(data, columns=PSL_COLUMNS)
+
+def make_repeatmasker(n_loci, n_rows, seed=SEED):
+    """(EHdn loci, RepeatMasker rows); a fifth of the rows overlap a locus, the rest are scattered."""
+    rng = np.random.default_rng(seed)
+    loci = pd.DataFrame({
+        'chr': rng.choice(CHROMS, n_loci),
+        'start': rng.integers(1_000, 200_000_000, n_loci),
+        'motif': rng.choice(MOTIFS, n_loci),
+    })
+    loci['end'] = loci['start'] + rng.integers(50, 1000, n_loci)
+    loci = loci[['chr', 'start', 'end', 'motif']]
+
+    near = rng.integers(0, n_loci, n_rows)
+    overlapping = rng.random(n_rows) < 0.2
+    begin = np.where(overlapping, loci['start'].to_numpy()[near] + rng.integers(-200, 200, n_rows),
+                     rng.integers(1_000, 200_000_000, n_rows))
+    chrom = np.where(overlapping, loci['chr'].to_numpy()[near], rng.choice(CHROMS, n_rows))
+    motif = np.where(overlapping & (rng.random(n_rows) < 0.5), loci['motif'].to_numpy()[near],
+                     rng.choice(MOTIFS + ['AT', 'A', 'TTTTC'], n_rows))
+    rows = pd.DataFrame({
+        'chr': np.arange(n_rows), 'begin': begin, 'end': begin + rng.integers(10, 400, n_rows),
+        'score': rng.integers(10, 5000, n_rows), 'div': rng.uniform(0, 30, n_rows).round(1),
+        'del': rng.uniform(0, 5, n_rows).round(1), 'ins': rng.uniform(0, 5, n_rows).round(1),
+        'sequence': 'chr' + chrom, 'repeat_begin': 1, 'repeat_end': 100, 'left': 0,
+        'strand': rng.choice(['+', 'C'], n_rows), 'repeat': [f"({m})n" for m in motif],
+        'class/family': 'Simple_repeat', 'repeat_start': 1, 'repeat_finish': 100, 'left2': 0,
+        'ID': np.arange(1, n_rows + 1),
+    })
+    return loci, rows
+
+def eh_vcf_lines(rng, n_loci):
+    """Records of one ExpansionHunter VCF (without header)."""
+    lines = []
+    for i in range(n_loci):
+        motif = str(rng.choice(MOTIFS))
+        ref_units = int(rng.integers(5, 30))
+        pos = int(rng.integers(1_000, 200_000_000))
+        a1, a2 = sorted(int(a) for a in rng.integers(2, 80, 2))
+        info = (f"END={pos + ref_units * len(motif)};REF={ref_units};REPID=LOCUS{i};"
+                f"RL={ref_units * len(motif)};RU={motif};VARID=LOCUS{i}")
+        sample = (f"1/2:SPANNING/FLANKING:{a1}/{a2}:{a1}-{a1}/{a2 - 3}-{a2 + 3}:"
+                  f"{rng.integers(0, 20)}/{rng.integers(0, 20)}:{rng.integers(0, 30)}/{rng.integers(0, 30)}:"
+                  f"0/{rng.integers(0, 10)}:{rng.uniform(20, 40):.6f}")
+        lines.append('\t'.join([f"chr{rng.choice(CHROMS)}", str(pos), f"LOCUS{i}", 'C',
+                                f"<STR{a1}>,<STR{a2}>", '.', 'PASS', info, EH_FORMAT, sample]))
+    return lines
+
+def make_eh_vcfs(n_samples, n_loci, seed=SEED):
+    """{sample: VCF record lines} of ExpansionHunter calls."""
+    rng = np.random.default_rng(seed)
+    return {f"PNRR{i:05d}" if i % 2 else f"CTRL{i:05d}": eh_vcf_lines(rng, n_loci) for i in range(n_samples)}
+
+def eh_combined_table(eh_vcfs):
+    """The combined EH CSV layout read by wdl_combine_ehdn_eh.load_eh_results."""
+    rows = []
+    for sample, lines in eh_vcfs.items():
+        for line in lines:
+            chrom, pos, vid, ref, alt, _, _, info, fmt, values = line.split('\t')
+            rows.append((sample, chrom, pos, vid, ref, alt, info, fmt, values))
+    return pd.DataFrame(rows, columns=['SampleID', 'CHROM', 'POS', 'ID', 'REF', 'ALT',
+                                       'INFO', 'FORMAT', 'VARIANTS'])
+
+def write_eh_vcfs(eh_vcfs, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for sample, lines in eh_vcfs.items():
+        with open(os.path.join(out_dir, f"{sample}.vcf"), 'w') as f:
+            f.write('##fileformat=VCFv4.1\n')
+            f.write(f"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{sample}\n")
+            f.write('\n'.join(lines) + '\n')
+
+def write_sift_root(root, n_variants, n_samples, chroms=('chr1', 'chr2'), seed=SEED):
+    """SIFT4G-style chromosome folders (predictions VCF + annotations XLS) for processRawVariant.py."""
+    rng = np.random.default_rng(seed)
+    samples = [f"S{i:05d}" for i in range(n_samples)]
+    genotypes = np.array(['0/0', '0/1', '1/1', './.', '0|1'])
+    for chrom in chroms:
+        chrom_dir = os.path.join(root, chrom)
+        os.makedirs(chrom_dir, exist_ok=True)
+        pos = np.cumsum(rng.integers(1, 200, n_variants)) + 10_000
+        ref = rng.choice(BASES, n_variants)
+        alt = rng.choice(BASES, n_variants)
+        gts = rng.choice(genotypes, (n_variants, n_samples), p=[0.8, 0.1, 0.04, 0.04, 0.02])
+        depth = rng.integers(5, 60, (n_variants, n_samples))
+        with open(os.path.join(chrom_dir, f"{chrom}_synthetic_SIFTpredictions.vcf"), 'w') as f:
+            f.write('##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t'
+                    + '\t'.join(samples) + '\n')
+            for i in range(n_variants):
+                calls = '\t'.join(f"{g}:{d}" for g, d in zip(gts[i], depth[i]))
+                f.write(f"{chrom}\t{pos[i]}\t.\t{ref[i]}\t{alt[i]}\t50\tPASS\tSIFTINFO=.\tGT:DP\t{calls}\n")
+        scores = rng.choice(['NA', '0.0', '0.01', '0.04', '0.055', '0.3', '0.8'], n_variants)
+        with open(os.path.join(chrom_dir, f"{chrom}_synthetic_SIFTannotations.xls"), 'w') as f:
+            f.write('\t'.join(SIFT_XLS_HEADER) + '\n')
+            for i in range(n_variants):
+                prediction = 'NA' if scores[i] == 'NA' else ('DELETERIOUS' if float(scores[i]) <= 0.05 else 'TOLERATED')
+                f.write('\t'.join([chrom, str(pos[i]), ref[i], alt[i], f"ENST{i:011d}", f"GENE{i % 500}",
+                                   'CDS', 'NONSYNONYMOUS', scores[i], prediction]) + '\n')
+    return samples
+
+def write_all(out_dir, scale=1.0, seed=SEED):
+    """Write every synthetic input under out_dir; returns the paths."""
+    n = sizes(scale)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+
+    paths['reads'] = os.path.join(out_dir, 'str_reads.tsv')
+    pd.DataFrame(make_str_reads(n['reads'], seed), columns=['sequence', 'motif']).to_csv(
+        paths['reads'], sep='\t', index=False)
+
+    paths['psl'] = os.path.join(out_dir, 'blat_hits.psl')
+    with open(paths['psl'], 'w') as f:
+        # wdl_addBlatResult2db.py skips the 5 psLayout header lines
+        f.write('psLayout version 3\n\n' + '\t'.join(PSL_COLUMNS) + '\n\n' + '-' * 40 + '\n')
+    make_psl(n['psl_reads'], seed).to_csv(paths['psl'], sep='\t', header=False, index=False, mode='a')
+
+    loci, rows = make_repeatmasker(n['ehdn_loci'], n['repeatmasker'], seed)
+    paths['ehdn_loci'] = os.path.join(out_dir, 'ehdn_loci.tsv')
+    loci.to_csv(paths['ehdn_loci'], sep='\t', index=False)
+    paths['repeatmasker'] = os.path.join(out_dir, 'repeatmasker.tsv')
+    rows.to_csv(paths['repeatmasker'], sep='\t', header=False, index=False)
+
+    paths['eh_vcfs'] = os.path.join(out_dir, 'eh_vcfs')
+    write_eh_vcfs(make_eh_vcfs(n['eh_samples'], n['eh_loci'], seed), paths['eh_vcfs'])
+
+    paths['sift_root'] = os.path.join(out_dir, 'sift')
+    write_sift_root(paths['sift_root'], n['sift_variants'], n['sift_samples'], seed=seed)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='Write deterministic synthetic benchmark inputs')
+    parser.add_argument('--out-dir', required=True, help='Output directory')
+    parser.add_argument('--scale', type=float, default=1.0, help='Size multiplier (default: 1)')
+    parser.add_argument('--seed', type=int, default=SEED, help=f'Random seed (default: {SEED})')
+    args = parser.parse_args()
+
+    for name, path in write_all(args.out_dir, args.scale, args.seed).items():
+        print(f"{name}: {path}")
+
+if __name__ == '__main__':
+    main()